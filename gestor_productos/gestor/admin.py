@@ -1,7 +1,22 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Value
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils import timezone
 from django import forms
-from .models import Producto, CustomUser
+from .models import Producto, ProductoArchivado, RegistroAuditoria, Tarea, CustomUser, ESTADOS_STOCK
+from .forms import OperacionMasivaForm
+from . import archivo, auditoria, estadisticas, masivo
+from .expresiones import ConcatenarTexto
+from .busqueda import filtrar_queryset
+from .permisos import pertenece_a_grupo
 
 
 # Formulario personalizado para agregar productos en admin
@@ -42,6 +57,60 @@ class ProductoAdminForm(forms.ModelForm):
         }
 
 
+# Paginación con conteo estimado para tablas grandes
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Sin filtros, el total de filas se toma de una fuente O(1) en lugar de
+    COUNT(*): la tabla de estadísticas para productos o las estadísticas del
+    planificador en PostgreSQL. Con filtros se cuenta de forma exacta.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimado = estimar_conteo(self.object_list.model)
+            if estimado is not None:
+                return estimado
+        return super().count
+
+
+def estimar_conteo(model):
+    if model is Producto:
+        return estadisticas.obtener().total_productos
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [model._meta.db_table])
+            fila = cursor.fetchone()
+        # reltuples vale -1 si la tabla nunca fue analizada
+        if fila and fila[0] >= 0:
+            return fila[0]
+    return None
+
+
+# Filtro lateral por estado de stock
+
+class EstadoStockFilter(admin.SimpleListFilter):
+    """Filtra con predicados sobre stock que usan su índice (no con el CASE anotado)"""
+
+    title = 'estado de stock'
+    parameter_name = 'estado_stock'
+
+    def lookups(self, request, model_admin):
+        # Conteos de un solo GROUP BY cacheado
+        conteos = {fila['estado']: fila['productos'] for fila in estadisticas.resumen_por_estado()}
+        return [
+            (str(estado), f'{etiqueta} ({conteos.get(estado, 0)})')
+            for estado, etiqueta in ESTADOS_STOCK.items()
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() in {str(estado) for estado in ESTADOS_STOCK}:
+            return queryset.estado_stock(int(self.value()))
+        return queryset
+
+
 # Productos admin
 
 @admin.register(Producto)
@@ -54,13 +123,17 @@ class ProductoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'precio', 'stock', 'stock_status', 'fecha_creacion')
     
     # Filtros laterales
-    list_filter = ('fecha_creacion',)
+    list_filter = (EstadoStockFilter, 'descontinuado', 'fecha_creacion')
     
-    # Campos de búsqueda
+    # Campos de búsqueda (resueltos con el índice de texto completo)
     search_fields = ('nombre', 'descripcion')
     
     # Ordenamiento por defecto
-    ordering = ('-fecha_creacion',)
+    ordering = ('-fecha_creacion', '-id')
+
+    # Conteo estimado: evita COUNT(*) sobre toda la tabla en cada página
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
     
     # Campos de solo lectura
     readonly_fields = ('fecha_creacion',)
@@ -71,7 +144,7 @@ class ProductoAdmin(admin.ModelAdmin):
             'fields': ('nombre', 'descripcion')
         }),
         ('Datos Comerciales', {
-            'fields': ('precio', 'stock'),
+            'fields': ('precio', 'stock', 'descontinuado'),
             'description': 'Información sobre precio y disponibilidad del producto'
         }),
         ('Metadatos', {
@@ -80,23 +153,207 @@ class ProductoAdmin(admin.ModelAdmin):
         }),
     )
     
+    # Búsqueda con FTS5 en lugar de LIKE '%término%' sobre ambas columnas
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filtrar_queryset(queryset, search_term), False
+    
+    # Estado de stock calculado por la base de datos (CASE/WHEN), ordenable
+    def get_queryset(self, request):
+        return super().get_queryset(request).con_estado_stock()
+
     # Método personalizado para mostrar estado del stock
     def stock_status(self, obj):
         """Muestra el estado del stock con emojis"""
-        if obj.stock == 0:
-            return '🔴 Sin stock'
-        elif obj.stock < 10:
-            return '🟡 Stock bajo'
-        else:
-            return '🟢 Disponible'
+        return ESTADOS_STOCK[obj.estado_stock]
     stock_status.short_description = 'Estado'
+    stock_status.admin_order_field = 'estado_stock'
     
+    # Acciones masivas: un solo UPDATE/DELETE sobre la selección, con vista previa
+    actions = ('operacion_masiva', 'descontinuar', 'archivar', 'borrar_masivo')
+
+    def get_actions(self, request):
+        # delete_selected borra fila por fila (señales y UPDATE de estadísticas por producto)
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Cambiar precio o stock de los productos seleccionados', permissions=['change'])
+    def operacion_masiva(self, request, queryset):
+        datos = request.POST if 'aplicar' in request.POST or 'previsualizar' in request.POST else None
+        form = OperacionMasivaForm(datos, permitir_borrar=False)
+        return self.confirmar_operacion(request, queryset, form, 'operacion_masiva')
+
+    @admin.action(description='Borrar los productos seleccionados', permissions=['delete'])
+    def borrar_masivo(self, request, queryset):
+        form = OperacionMasivaForm({'operacion': 'borrar', 'redondeo': 1})
+        return self.confirmar_operacion(request, queryset, form, 'borrar_masivo')
+
+    @admin.action(description='Marcar como descontinuados (se archivan con archivar_productos)', permissions=['change'])
+    def descontinuar(self, request, queryset):
+        with auditoria.operacion(queryset, 'Marcar como descontinuados'):
+            marcados = masivo.actualizar(queryset, {'descontinuado': Value(True)})
+        self.message_user(request, f'{marcados} productos marcados como descontinuados', messages.SUCCESS)
+
+    @admin.action(description='Mover los productos seleccionados al archivo', permissions=['delete'])
+    def archivar(self, request, queryset):
+        with auditoria.operacion(queryset, 'Mover al archivo'):
+            archivados = archivo.archivar(queryset, 'manual')
+        self.message_user(request, f'{archivados} productos movidos al archivo', messages.SUCCESS)
+
+    def confirmar_operacion(self, request, queryset, form, accion):
+        """
+        Página intermedia de las acciones masivas: muestra la vista previa y,
+        al confirmar ("aplicar"), ejecuta la operación sobre la selección
+        (o sobre todo el resultado filtrado si se eligió "seleccionar todos").
+        """
+        if form.is_valid() and 'aplicar' in request.POST:
+            with auditoria.operacion(queryset, form.descripcion()):
+                afectados = masivo.aplicar(queryset, form.cambios())
+            accion_hecha = 'borrados' if form.es_borrado else 'actualizados'
+            self.message_user(request, f'{form.descripcion()}: {afectados} productos {accion_hecha}', messages.SUCCESS)
+            # None: el admin vuelve al listado
+            return None
+
+        return TemplateResponse(request, 'admin/gestor/producto/operacion_masiva.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Borrar productos' if accion == 'borrar_masivo' else 'Cambiar precio o stock',
+            'opts': self.model._meta,
+            'accion': accion,
+            'form': form,
+            'editable': accion != 'borrar_masivo',
+            'previa': masivo.vista_previa(queryset, form.cambios()) if form.is_valid() else None,
+            'seleccionados': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    # "Historial" del producto: sus registros de auditoría
+    def history_view(self, request, object_id, extra_context=None):
+        url = reverse('admin:gestor_registroauditoria_changelist')
+        return redirect(f'{url}?producto_id={int(object_id)}')
+
     # Control de permisos para eliminar
     def has_delete_permission(self, request, obj=None):
         """Solo superusuarios o miembros del grupo Administradores pueden eliminar"""
         if request.user.is_superuser:
             return True
-        return request.user.groups.filter(name='Administradores').exists()
+        return pertenece_a_grupo(request.user, 'Administradores')
+
+
+# Archivo de productos: solo lectura, búsqueda y restauración
+
+@admin.register(ProductoArchivado)
+class ProductoArchivadoAdmin(admin.ModelAdmin):
+
+    list_display = ('id', 'nombre', 'precio', 'stock', 'motivo', 'fecha_archivado', 'fecha_actualizacion')
+    list_filter = ('motivo', 'fecha_archivado')
+    # "=" busca por id exacto; el nombre con LIKE (el archivo se consulta poco)
+    search_fields = ('=id', 'nombre')
+    ordering = ('-fecha_archivado', '-id')
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    actions = ('restaurar',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_restaurar_permission(self, request):
+        return request.user.has_perms(['gestor.restore_productoarchivado', 'gestor.add_producto'])
+
+    @admin.action(description='Restaurar al catálogo los productos seleccionados', permissions=['restaurar'])
+    def restaurar(self, request, queryset):
+        restaurados, conflictos = archivo.restaurar(queryset)
+        auditoria.registrar_operacion('Restaurar del archivo', restaurados)
+        self.message_user(request, f'{restaurados} productos restaurados al catálogo', messages.SUCCESS)
+        if conflictos:
+            self.message_user(
+                request,
+                f'{len(conflictos)} productos siguen archivados porque su nombre ya existe en el catálogo '
+                f'(ids: {", ".join(map(str, sorted(conflictos)[:20]))})',
+                messages.WARNING,
+            )
+
+
+# Auditoría de productos: solo lectura
+
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(admin.ModelAdmin):
+
+    list_display = ('fecha', 'accion', 'producto_id', 'producto_nombre', 'usuario_nombre', 'origen', 'resumen_cambios')
+    list_filter = ('accion', 'origen', 'fecha')
+    search_fields = ('=producto_id', 'producto_nombre', 'usuario_nombre')
+    ordering = ('-fecha', '-id')
+    date_hierarchy = 'fecha'
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def resumen_cambios(self, obj):
+        """precio: 1000 → 1200; stock: 5 → 3"""
+        if obj.accion == 'masiva':
+            return f"{obj.cambios.get('operacion')} ({obj.cambios.get('productos')} productos)"
+        return '; '.join(
+            f'{campo}: {antes} → {despues}' if obj.accion == 'modificar' else f'{campo}: {antes if despues is None else despues}'
+            for campo, (antes, despues) in obj.cambios.items() if campo != 'descripcion'
+        ) or '-'
+    resumen_cambios.short_description = 'Cambios'
+
+
+# Tareas en segundo plano: estado y progreso, reintentar o cancelar
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+
+    list_display = ('id', 'tipo', 'estado', 'barra_progreso', 'mensaje', 'intentos', 'usuario', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('estado', 'tipo', 'fecha_creacion')
+    search_fields = ('=id', 'tipo')
+    list_select_related = ('usuario',)
+    ordering = ('-fecha_creacion', '-id')
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    actions = ('reintentar', 'cancelar')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_gestionar_permission(self, request):
+        return request.user.has_perm('gestor.change_tarea')
+
+    def barra_progreso(self, obj):
+        return format_html('<progress value="{}" max="100"></progress> {}%', obj.progreso, obj.progreso)
+    barra_progreso.short_description = 'Progreso'
+    barra_progreso.admin_order_field = 'progreso'
+
+    @admin.action(description='Reintentar las tareas fallidas seleccionadas', permissions=['gestionar'])
+    def reintentar(self, request, queryset):
+        reintentadas = queryset.filter(estado='fallida').update(
+            estado='pendiente', intentos=0, error='', fecha_fin=None, disponible_desde=timezone.now(),
+        )
+        self.message_user(request, f'{reintentadas} tareas vueltas a la cola', messages.SUCCESS)
+
+    @admin.action(description='Cancelar las tareas pendientes seleccionadas', permissions=['gestionar'])
+    def cancelar(self, request, queryset):
+        # Las que están en curso no se interrumpen
+        canceladas = queryset.filter(estado='pendiente').update(
+            estado='fallida', error=f'Cancelada por {request.user.get_username()}', fecha_fin=timezone.now(),
+        )
+        self.message_user(request, f'{canceladas} tareas canceladas', messages.SUCCESS)
 
 
 # Custom user admin
@@ -119,15 +376,21 @@ class CustomUserAdmin(UserAdmin):
     
     # Ordenamiento
     ordering = ('username',)
+
+    # Conteo estimado en tablas grandes (PostgreSQL)
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+
+    # Grupos concatenados en la misma consulta (evita una consulta por usuario)
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(grupos_nombres=ConcatenarTexto('groups__name'))
     
     # Método personalizado para mostrar grupos
     def get_groups(self, obj):
         """Muestra los grupos del usuario"""
-        groups = obj.groups.all()
-        if groups:
-            return ', '.join([group.name for group in groups])
-        return '-'
+        return obj.grupos_nombres or '-'
     get_groups.short_description = 'Grupos'
+    get_groups.admin_order_field = 'grupos_nombres'
     
     # Organización de campos en el formulario de edición
     fieldsets = (
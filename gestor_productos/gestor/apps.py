@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GestorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestor'
+
+    def ready(self):
+        # Registrar receptores de señales
+        from . import signals  # noqa: F401
@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import estadisticas
+from .models import Producto, ProductoArchivado
+
+
+# Archivo de productos (tabla caliente / tabla fría)
+#
+# gestor_producto guarda solo el catálogo vigente: lo leen el listado, el
+# admin, la API y sus cachés, y cuanto más chica es, más chicos sus índices
+# y el índice de búsqueda. Los productos descontinuados, sin stock o sin
+# cambios por mucho tiempo se mueven a gestor_productoarchivado con un
+# INSERT ... SELECT y un DELETE por lote, en una transacción corta cada uno.
+# Restaurar hace lo inverso. Las estadísticas del catálogo se ajustan en
+# bloque y los triggers de la base mantienen el índice de búsqueda.
+
+# Columnas que se copian tal cual entre ambas tablas
+COLUMNAS = (
+    'id', 'nombre', 'descripcion', 'precio', 'stock', 'fecha_creacion', 'fecha_actualizacion', 'resumen', 'descontinuado',
+)
+
+# Productos por transacción del comando archivar_productos
+TAMANO_LOTE = 1000
+
+
+def candidatos(motivo, dias=None, ahora=None):
+    """
+    Productos a archivar por `motivo`: descontinuados (sin importar la
+    fecha), sin stock hace `dias` días o sin ningún cambio hace `dias` días.
+    La fecha de la última modificación hace de "desde cuándo": cualquier
+    cambio de stock la actualiza.
+    """
+    if motivo == 'descontinuado':
+        return Producto.objects.filter(descontinuado=True)
+    limite = (ahora or timezone.now()) - timedelta(days=dias)
+    if motivo == 'sin_stock':
+        return Producto.objects.filter(stock=0, fecha_actualizacion__lt=limite)
+    if motivo == 'sin_cambios':
+        return Producto.objects.filter(fecha_actualizacion__lt=limite)
+    raise ValueError(f'Motivo de archivo desconocido: {motivo}')
+
+
+def criterios(dias_sin_stock=None, dias_sin_cambios=None, descontinuados=True):
+    """
+    [(motivo, dias)] a archivar, en orden: cada producto queda con el
+    motivo más específico que cumpla
+    """
+    resultado = []
+    if descontinuados:
+        resultado.append(('descontinuado', None))
+    if dias_sin_stock is not None:
+        resultado.append(('sin_stock', dias_sin_stock))
+    if dias_sin_cambios is not None:
+        resultado.append(('sin_cambios', dias_sin_cambios))
+    return resultado
+
+
+def _en_primaria(queryset):
+    """
+    El mismo queryset sobre la base de escritura. Sin esto, .db es el alias
+    de lectura y con réplicas configuradas el INSERT/DELETE iría a una réplica.
+    """
+    return queryset.using(router.db_for_write(queryset.model))
+
+
+def _copiar(queryset, destino, extra=None):
+    """
+    INSERT INTO destino (COLUMNAS, extra) SELECT COLUMNAS, valores FROM la
+    tabla del queryset WHERE id IN (queryset). Devuelve las filas copiadas.
+    """
+    conexion = connections[queryset.db]
+    ops = conexion.ops
+    extra = extra or {}
+    columnas = ', '.join(ops.quote_name(columna) for columna in COLUMNAS)
+    columnas_extra = ''.join(f', {ops.quote_name(columna)}' for columna in extra)
+    marcadores = ''.join(', %s' for _ in extra)
+    subconsulta, params = queryset.order_by().values('pk').query.sql_with_params()
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {ops.quote_name(destino._meta.db_table)} ({columnas}{columnas_extra}) '
+            f'SELECT {columnas}{marcadores} FROM {ops.quote_name(queryset.model._meta.db_table)} '
+            f'WHERE {ops.quote_name("id")} IN ({subconsulta})',
+            [*extra.values(), *params],
+        )
+        return cursor.rowcount
+
+
+def archivar(queryset, motivo):
+    """
+    Mueve los productos de `queryset` al archivo. Devuelve cuántos se
+    archivaron. El queryset no debe depender de columnas que cambien entre
+    la copia y el borrado (p. ej. filter(pk__in=ids)).
+    """
+    assert not Producto._meta.related_objects, 'Producto tiene relaciones: no se puede archivar con SQL directo'
+    queryset = _en_primaria(queryset)
+    ahora = connections[queryset.db].ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(using=queryset.db):
+        with estadisticas.seguimiento(queryset):
+            archivados = _copiar(queryset, ProductoArchivado, {'fecha_archivado': ahora, 'motivo': motivo})
+            queryset.order_by()._raw_delete(queryset.db)
+    return archivados
+
+
+def archivar_por_lotes(queryset, motivo, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Archiva todo `queryset` en lotes de `tamano_lote` ids, una transacción
+    por lote, para no bloquear la tabla caliente durante toda la operación.
+    """
+    queryset = _en_primaria(queryset)
+    total = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:tamano_lote])
+        if not ids:
+            return total
+        total += archivar(Producto.objects.using(queryset.db).filter(pk__in=ids), motivo)
+        if progreso:
+            progreso(total)
+
+
+def conflictos(archivados):
+    """
+    Archivados que no se pueden restaurar porque su nombre ya está en uso
+    en el catálogo (sin distinguir mayúsculas) o se repite en la selección.
+    """
+    en_uso = archivados.filter(Exists(
+        Producto.objects.alias(nombre_lower=Lower('nombre')).filter(nombre_lower=Lower(OuterRef('nombre')))
+    ))
+    ids = set(en_uso.values_list('pk', flat=True))
+    vistos = set()
+    for pk, nombre in archivados.order_by('-fecha_archivado', '-id').values_list('pk', Lower('nombre')):
+        if nombre in vistos:
+            ids.add(pk)
+        vistos.add(nombre)
+    return ids
+
+
+def restaurar(archivados):
+    """
+    Devuelve al catálogo los productos archivados (con su id original) y
+    los quita del archivo. Los que chocan con un nombre existente quedan en
+    el archivo. Devuelve (restaurados, ids con conflicto).
+
+    El producto restaurado vuelve como no descontinuado y con la fecha de
+    modificación actual, para que el próximo archivado no lo retire de nuevo.
+    """
+    archivados = _en_primaria(archivados)
+    with transaction.atomic(using=archivados.db):
+        rechazados = conflictos(archivados)
+        ids = [pk for pk in archivados.values_list('pk', flat=True) if pk not in rechazados]
+        if not ids:
+            return 0, rechazados
+        seleccion = ProductoArchivado.objects.using(archivados.db).filter(pk__in=ids)
+        restaurados_qs = Producto.objects.using(archivados.db).filter(pk__in=ids)
+        with estadisticas.seguimiento(restaurados_qs):
+            restaurados = _copiar(seleccion, Producto)
+            restaurados_qs.update(fecha_actualizacion=timezone.now(), descontinuado=False)
+        seleccion._raw_delete(seleccion.db)
+    return restaurados, rechazados
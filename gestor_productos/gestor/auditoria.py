@@ -0,0 +1,323 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, router, transaction
+from django.utils import timezone
+
+from .models import CAMPOS_AUDITADOS, Producto, RegistroAuditoria
+
+
+# Auditoría de productos
+#
+# AuditoriaMiddleware deja en una ContextVar quién hace la petición y desde
+# dónde (web, admin, api). Las señales de Producto arman un registro con las
+# diferencias campo a campo y, al confirmarse la transacción, lo ponen en una
+# cola en memoria. Un hilo la vacía con bulk_create por lotes, así la
+# petición no espera ese INSERT ni compite por el bloqueo de escritura de
+# SQLite. Si la cola se llena, el registro se escribe en la misma petición;
+# al terminar el proceso se vacía lo pendiente. Fuera de una petición (shell,
+# comandos, cargas masivas) no se audita, salvo dentro de auditoria.contexto().
+# Las operaciones masivas (un UPDATE/DELETE por selección) pasan por
+# operacion(), que lee la selección antes y después y deja un registro por
+# producto, igual que si se hubiera guardado o borrado uno por uno.
+
+logger = logging.getLogger('gestor.auditoria')
+
+# {'usuario': ..., 'origen': ...} de la petición en curso
+_contexto = ContextVar('gestor_auditoria', default=None)
+
+
+def iniciar(usuario, origen):
+    return _contexto.set({'usuario': usuario, 'origen': origen})
+
+
+def terminar(token):
+    _contexto.reset(token)
+
+
+def activa():
+    return _contexto.get() is not None
+
+
+@contextmanager
+def contexto(usuario=None, origen='sistema'):
+    """Audita lo que se haga dentro del bloque (comandos, shell)"""
+    token = iniciar(usuario, origen)
+    try:
+        yield
+    finally:
+        terminar(token)
+
+
+def origen_de(path):
+    if path.startswith('/admin/'):
+        return 'admin'
+    if path.startswith('/api/'):
+        return 'api'
+    return 'web'
+
+
+# Registros
+
+def _json(valor):
+    # Decimal no es serializable en JSON; se guarda como texto exacto
+    return str(valor) if isinstance(valor, Decimal) else valor
+
+
+def diferencias(antes, despues):
+    """{campo: [antes, después]} de los campos que cambiaron"""
+    return {
+        campo: [_json(antes.get(campo)), _json(despues.get(campo))]
+        for campo in CAMPOS_AUDITADOS
+        if antes.get(campo) != despues.get(campo)
+    }
+
+
+def valores(producto):
+    return {campo: getattr(producto, campo) for campo in CAMPOS_AUDITADOS}
+
+
+def nuevo_registro(accion, producto=None, cambios=None, producto_id=None, producto_nombre=''):
+    """Registro del `producto` (o de producto_id/producto_nombre si no hay instancia)"""
+    datos = _contexto.get() or {}
+    usuario = datos.get('usuario')
+    autenticado = usuario is not None and usuario.is_authenticated
+    if producto is not None:
+        producto_id, producto_nombre = producto.pk, producto.nombre
+    return RegistroAuditoria(
+        fecha=timezone.now(),
+        accion=accion,
+        producto_id=producto_id,
+        producto_nombre=producto_nombre,
+        usuario_id=usuario.pk if autenticado else None,
+        usuario_nombre=usuario.get_username() if autenticado else '',
+        origen=datos.get('origen', ''),
+        cambios=cambios or {},
+    )
+
+
+def _al_confirmar(registro, using=None):
+    # Si la transacción se deshace, el cambio no ocurrió y no se audita
+    transaction.on_commit(partial(escritor.encolar, registro), using=using)
+
+
+def leer_original(producto):
+    """pre_save: valores actuales en la base si el producto no se leyó completo"""
+    original = getattr(producto, '_auditoria_original', None)
+    if producto.pk is None or (original is not None and len(original) == len(CAMPOS_AUDITADOS)):
+        return
+    producto._auditoria_original = (
+        Producto.objects.filter(pk=producto.pk).values(*CAMPOS_AUDITADOS).first() or {}
+    )
+
+
+def registrar_guardado(producto, creado, using=None):
+    """post_save: encola la creación o las diferencias de una modificación"""
+    actuales = valores(producto)
+    if creado:
+        registro = nuevo_registro('crear', producto, diferencias({}, actuales))
+    else:
+        cambios = diferencias(getattr(producto, '_auditoria_original', None) or {}, actuales)
+        registro = nuevo_registro('modificar', producto, cambios) if cambios else None
+    # El siguiente save() del mismo objeto compara contra lo recién guardado
+    producto._auditoria_original = actuales
+    if registro is not None:
+        _al_confirmar(registro, using)
+
+
+def registrar_borrado(producto, using=None):
+    _al_confirmar(nuevo_registro('borrar', producto, diferencias(valores(producto), {})), using)
+
+
+def registrar_operacion(descripcion, afectados, using=None):
+    """Resumen de una operación masiva: un registro por operación"""
+    if activa():
+        _al_confirmar(nuevo_registro('masiva', cambios={'operacion': descripcion, 'productos': afectados}), using)
+
+
+# Productos leídos por consulta al comparar la selección después de la operación
+LOTE_COMPARACION = 1000
+
+
+def _filas(queryset):
+    """{id: (valores de CAMPOS_AUDITADOS)} en orden de id; tuplas, no dicts, para ocupar menos"""
+    filas = queryset.order_by('pk').values_list('pk', *CAMPOS_AUDITADOS)
+    return {fila[0]: fila[1:] for fila in filas.iterator(chunk_size=LOTE_COMPARACION)}
+
+
+def _como_dict(fila):
+    return dict(zip(CAMPOS_AUDITADOS, fila)) if fila is not None else {}
+
+
+@contextmanager
+def operacion(queryset, descripcion):
+    """
+    Audita una operación masiva sobre `queryset` (UPDATE o DELETE por
+    selección, que no disparan señales): lee los productos antes, ejecuta el
+    bloque y deja un registro 'modificar' o 'borrar' por producto con sus
+    valores anteriores y nuevos, más el resumen 'masiva'. Todo en una
+    transacción, para que nadie cambie la selección entre lectura y escritura.
+    Después del bloque se compara por lotes de ids, descartando cada lote ya
+    comparado.
+    """
+    if not activa():
+        yield
+        return
+    using = router.db_for_write(Producto)
+    with transaction.atomic(using=using):
+        antes = _filas(queryset.using(using))
+        seleccionados = len(antes)
+        yield
+        registros = []
+        while antes:
+            lote = list(islice(antes, LOTE_COMPARACION))
+            despues = _filas(Producto.objects.using(using).filter(pk__in=lote))
+            for pk in lote:
+                original, actual = antes.pop(pk), despues.get(pk)
+                cambios = diferencias(_como_dict(original), _como_dict(actual))
+                if cambios:
+                    accion = 'modificar' if actual is not None else 'borrar'
+                    nombre = original[CAMPOS_AUDITADOS.index('nombre')]
+                    registros.append(nuevo_registro(accion, cambios=cambios, producto_id=pk, producto_nombre=nombre))
+        registros.append(nuevo_registro('masiva', cambios={'operacion': descripcion, 'productos': seleccionados}))
+        transaction.on_commit(partial(escritor.encolar_varios, registros), using=using)
+
+
+# Escritura por lotes
+
+def guardar(registros):
+    RegistroAuditoria.objects.bulk_create(registros)
+
+
+_FIN = object()
+
+
+class Escritor:
+    """
+    Cola acotada con un hilo que escribe por lotes: espera el primer
+    registro y junta los que lleguen en `intervalo` segundos, hasta `lote`.
+    Un elemento de la cola es un registro o una lista de registros
+    (encolar_varios).
+    El hilo arranca con el primer registro (no en el import, ni en migrate).
+    """
+
+    def __init__(self, escribir, maximo, lote, intervalo):
+        self.escribir = escribir
+        self.cola = queue.Queue(maxsize=maximo)
+        self.lote = lote
+        self.intervalo = intervalo
+        self.hilo = None
+        self.bloqueo = threading.Lock()
+
+    def encolar(self, registro):
+        if not settings.AUDITORIA_ASINCRONA:
+            self.escribir([registro])
+            return
+        self.iniciar()
+        try:
+            self.cola.put_nowait(registro)
+        except queue.Full:
+            # La base no da abasto: se escribe en esta petición antes que perder el registro
+            logger.warning('Cola de auditoría llena (%d); escritura sincrónica', self.cola.maxsize)
+            self.escribir([registro])
+
+    def encolar_varios(self, registros):
+        """
+        Registros de una operación masiva: cada lote ocupa un solo lugar de la
+        cola, así 100.000 productos son unos cientos de elementos y el hilo
+        los escribe con un INSERT por lote, fuera de la petición.
+        """
+        lotes = [registros[inicio:inicio + self.lote] for inicio in range(0, len(registros), self.lote)]
+        if not settings.AUDITORIA_ASINCRONA:
+            for lote in lotes:
+                self.escribir(lote)
+            return
+        self.iniciar()
+        for lote in lotes:
+            try:
+                self.cola.put_nowait(lote)
+            except queue.Full:
+                logger.warning('Cola de auditoría llena (%d); escritura sincrónica', self.cola.maxsize)
+                self.escribir(lote)
+
+    def iniciar(self):
+        if self.hilo is not None and self.hilo.is_alive():
+            return
+        with self.bloqueo:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self.ejecutar, name='gestor-auditoria', daemon=True)
+                self.hilo.start()
+
+    def ejecutar(self):
+        try:
+            while True:
+                lote = [self.cola.get()]
+                limite = time.monotonic() + self.intervalo
+                while lote[-1] is not _FIN and len(lote) < self.lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(self.cola.get(timeout=restante))
+                    except queue.Empty:
+                        break
+                fin = lote[-1] is _FIN
+                registros = []
+                for elemento in lote:
+                    if isinstance(elemento, list):
+                        registros.extend(elemento)
+                    elif elemento is not _FIN:
+                        registros.append(elemento)
+                for inicio in range(0, len(registros), self.lote):
+                    self.escribir_lote(registros[inicio:inicio + self.lote])
+                for _ in lote:
+                    self.cola.task_done()
+                if fin:
+                    return
+        finally:
+            # El hilo tiene su propia conexión a la base
+            connection.close()
+
+    def escribir_lote(self, registros):
+        if not registros:
+            return
+        try:
+            self.escribir(registros)
+        except Exception:
+            logger.exception('No se pudieron guardar %d registros de auditoría', len(registros))
+
+    def vaciar(self):
+        """Espera a que se escriba todo lo encolado"""
+        if self.hilo is not None and self.hilo.is_alive():
+            self.cola.join()
+
+    def detener(self, espera=10):
+        """Escribe lo pendiente y termina el hilo (atexit, al cerrar el proceso)"""
+        hilo = self.hilo
+        if hilo is None or not hilo.is_alive():
+            return
+        try:
+            self.cola.put(_FIN, timeout=espera)
+        except queue.Full:
+            logger.error('No se pudo vaciar la cola de auditoría al terminar')
+            return
+        hilo.join(espera)
+        self.hilo = None
+
+
+escritor = Escritor(
+    guardar,
+    maximo=settings.AUDITORIA_COLA_MAX,
+    lote=settings.AUDITORIA_LOTE,
+    intervalo=settings.AUDITORIA_INTERVALO,
+)
+atexit.register(escritor.detener)
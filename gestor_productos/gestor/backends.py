@@ -0,0 +1,60 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .permisos import aguardar_permisos, aleer_permisos, guardar_permisos, leer_permisos
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend cuyos permisos resueltos viven en la caché compartida.
+
+    Django solo guarda los permisos en la instancia del usuario, que se
+    descarta al terminar cada request; aquí se reutilizan entre requests y
+    procesos hasta que una señal invalida la entrada del usuario.
+    """
+
+    def _cargar_permisos(self, user_obj):
+        """Resuelve los permisos con las consultas normales de ModelBackend"""
+        return {
+            'user': super()._get_permissions(user_obj, None, 'user'),
+            'group': super()._get_permissions(user_obj, None, 'group'),
+            'grupos': set(user_obj.groups.values_list('name', flat=True)),
+        }
+
+    async def _acargar_permisos(self, user_obj):
+        return {
+            'user': await super()._aget_permissions(user_obj, None, 'user'),
+            'group': await super()._aget_permissions(user_obj, None, 'group'),
+            'grupos': {nombre async for nombre in user_obj.groups.values_list('name', flat=True)},
+        }
+
+    def _asignar(self, user_obj, datos):
+        user_obj._user_perm_cache = datos['user']
+        user_obj._group_perm_cache = datos['group']
+        user_obj._grupos_cache = datos['grupos']
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        perm_cache_name = '_%s_perm_cache' % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            datos = leer_permisos(user_obj.pk)
+            if datos is None:
+                datos = self._cargar_permisos(user_obj)
+                guardar_permisos(user_obj.pk, datos)
+            self._asignar(user_obj, datos)
+        return getattr(user_obj, perm_cache_name)
+
+    async def _aget_permissions(self, user_obj, obj, from_name):
+        """See _get_permissions()."""
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        perm_cache_name = '_%s_perm_cache' % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            datos = await aleer_permisos(user_obj.pk)
+            if datos is None:
+                datos = await self._acargar_permisos(user_obj)
+                await aguardar_permisos(user_obj.pk, datos)
+            self._asignar(user_obj, datos)
+        return getattr(user_obj, perm_cache_name)
@@ -0,0 +1,335 @@
+import json
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+# Utilidades compartidas por los comandos de benchmark y pruebas de carga
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano; 0 si no hay valores"""
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def obtener_usuario(username=None):
+    """Usuario indicado o, si no se indica, el primer superusuario activo"""
+    User = get_user_model()
+    if username:
+        return User.objects.filter(username=username).first()
+    return User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+
+
+# Suite de benchmark de las vistas (comando `benchmark` y BenchmarkTests)
+#
+# Cada escenario es una petición a una ruta de gestor/urls.py o del admin,
+# hecha con el cliente de pruebas: primero `calentamiento` veces sin medir
+# (cachés de permisos, listado, sesión) y luego `iteraciones` veces midiendo
+# latencia y consultas SQL. La memoria pico se mide en una pasada aparte con
+# tracemalloc, que haría más lentas las pasadas cronometradas.
+#
+# El presupuesto es el máximo de consultas por petición; no depende del tamaño
+# del catálogo, así que superarlo indica un N+1 o una caché que dejó de servir.
+# No se cuentan BEGIN/COMMIT/SAVEPOINT: cambian según si la petición corre
+# dentro de la transacción de un TestCase o no.
+
+CLAVE_BENCHMARK = 'benchmark'
+ADMIN_BENCHMARK = 'benchmark_admin'
+PREFIJO_USUARIOS = 'benchmark_usuario'
+
+# Límites de intentos holgados: el benchmark repite login y registro desde la misma IP
+LIMITES_BENCHMARK = {
+    'login_ip': (10 ** 6, 60),
+    'login_usuario': (10 ** 6, 60),
+    'registro_ip': (10 ** 6, 60),
+}
+
+PALABRAS = (
+    'cable', 'adaptador', 'teclado', 'monitor', 'mouse', 'parlante', 'cargador', 'lámpara',
+    'mochila', 'cuaderno', 'silla', 'escritorio', 'audífonos', 'cámara', 'router', 'batería',
+)
+
+
+class Escenario:
+    """
+    Una petición medida. `url` y `datos` pueden ser funciones que reciben el
+    contexto (ids sembrados y número de iteración) para no repetir nombres
+    ni borrar dos veces el mismo producto. `preparar(contexto)` corre fuera
+    de la medición y puede agregar valores al contexto.
+    """
+
+    def __init__(self, nombre, url, presupuesto, metodo='get', datos=None, cliente='admin',
+                 estados=(200,), json=False, preparar=None):
+        self.nombre = nombre
+        self.url = url
+        self.presupuesto = presupuesto
+        self.metodo = metodo
+        self.datos = datos
+        self.cliente = cliente
+        self.estados = estados
+        self.json = json
+        self.preparar = preparar
+
+    def peticion(self, cliente, contexto):
+        url = self.url(contexto) if callable(self.url) else self.url
+        datos = self.datos(contexto) if callable(self.datos) else self.datos
+        if self.json:
+            respuesta = getattr(cliente, self.metodo)(url, json.dumps(datos), content_type='application/json')
+        else:
+            respuesta = getattr(cliente, self.metodo)(url, datos)
+        if respuesta.streaming:
+            # Consumir el cuerpo: la exportación trabaja mientras se lee
+            for _ in respuesta.streaming_content:
+                pass
+        return respuesta
+
+
+def _producto_temporal(contexto):
+    from .models import Producto
+
+    producto = Producto.objects.create(
+        nombre=f'Benchmark temporal {contexto["i"]}', descripcion='Producto para borrar', precio=1000, stock=5
+    )
+    return {'temporal': producto.pk}
+
+
+def _datos_producto(contexto, prefijo):
+    return {
+        'nombre': f'{prefijo} {contexto["i"]}',
+        'descripcion': 'Producto creado por el benchmark',
+        'precio': '1990',
+        'stock': str(contexto['i'] % 30),
+    }
+
+
+# Sentencias de control de transacciones que no cuentan para el presupuesto
+CONTROL_TRANSACCIONES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def contar_consultas(capturadas):
+    return sum(
+        1 for consulta in capturadas.captured_queries
+        if not consulta['sql'].lstrip().upper().startswith(CONTROL_TRANSACCIONES)
+    )
+
+
+ESCENARIOS = [
+    Escenario('index', '/', 3),
+    Escenario('login GET', '/login/', 1, cliente='anonimo'),
+    Escenario('login POST', '/login/', 6, metodo='post', cliente='anonimo', estados=(302,),
+              datos={'username': ADMIN_BENCHMARK, 'password': CLAVE_BENCHMARK}),
+    Escenario('logout', '/logout/', 3, cliente='nuevo'),
+    Escenario('register GET', '/register/', 1, cliente='anonimo'),
+    Escenario('register POST', '/register/', 11, metodo='post', cliente='anonimo', estados=(302,),
+              datos=lambda c: {
+                  'username': f'benchmark_registro_{c["i"]}', 'email': f'registro{c["i"]}@benchmark.test',
+                  'password1': 'Clave-Segura-2024', 'password2': 'Clave-Segura-2024', 'group': c['grupo'],
+              }),
+    Escenario('productos', '/productos/', 3),
+    Escenario('productos (página 2)', lambda c: f'/productos/?despues={c["cursor"]}', 3),
+    Escenario('inventario', '/productos/inventario/', 2),
+    Escenario('buscar', '/productos/buscar/?q=teclado', 3),
+    Escenario('crear GET', '/productos/crear/', 2),
+    Escenario('crear POST', '/productos/crear/', 6, metodo='post', estados=(302,),
+              datos=lambda c: _datos_producto(c, 'Benchmark creado')),
+    Escenario('importar GET', '/productos/importar/', 2),
+    Escenario('exportar', '/productos/exportar/?formato=csv', 2),
+    Escenario('stock POST', '/productos/stock/', 5, metodo='post', json=True,
+              datos=lambda c: {'movimientos': [{'id': c['producto'], 'cantidad': 1}]}),
+    Escenario('masivo vista previa', '/productos/masivo/', 4, metodo='post', datos={
+        'precio_min': '50000', 'operacion': 'precio_porcentaje', 'valor': '5', 'redondeo': '100', 'previsualizar': '',
+    }),
+    Escenario('editar GET', lambda c: f'/productos/editar/{c["producto"]}/', 2),
+    Escenario('editar POST', lambda c: f'/productos/editar/{c["producto"]}/', 7, metodo='post', estados=(302,),
+              datos=lambda c: _datos_producto(c, 'Benchmark editado')),
+    Escenario('borrar GET', lambda c: f'/productos/borrar/{c["producto"]}/', 2),
+    Escenario('borrar POST', lambda c: f'/productos/borrar/{c["temporal"]}/', 5, metodo='post', estados=(302,),
+              preparar=_producto_temporal),
+    Escenario('api listado', '/api/productos/?estado_stock=2', 3),
+    Escenario('api detalle', lambda c: f'/api/productos/{c["producto"]}/', 3),
+    Escenario('admin productos', '/admin/gestor/producto/', 8),
+    Escenario('admin usuarios', '/admin/gestor/customuser/', 8),
+    Escenario('admin archivo', '/admin/gestor/productoarchivado/?q=teclado', 4),
+    Escenario('admin grupos', '/admin/auth/group/', 5),
+]
+
+
+def sembrar(productos=1000, usuarios=100, semilla=42):
+    """
+    Catálogo y usuarios deterministas para el benchmark (mismos datos con la
+    misma semilla). Devuelve el superusuario con el que se recorren las vistas.
+    """
+    from . import estadisticas
+    from .models import Producto
+
+    User = get_user_model()
+    azar = random.Random(semilla)
+
+    lote = []
+    for numero in range(productos):
+        descripcion = ' '.join(azar.choice(PALABRAS) for _ in range(azar.randint(10, 40)))
+        lote.append(Producto(
+            nombre=f'Benchmark {numero:06d} {azar.choice(PALABRAS)}',
+            descripcion=descripcion,
+            resumen=Producto.generar_resumen(descripcion),
+            precio=Decimal(azar.randint(100, 500000)),
+            # Mezcla de los tres estados de stock
+            stock=azar.choice((0, azar.randint(1, 9), azar.randint(10, 500))),
+        ))
+    Producto.objects.bulk_create(lote, batch_size=500)
+    # bulk_create no emite post_save: totales desde la tabla
+    estadisticas.recalcular()
+
+    grupos = [Group.objects.get_or_create(name=nombre)[0] for nombre in ('Administradores', 'Gestores de Productos')]
+    # Un solo hash para todos: calcularlo por usuario dominaría la siembra
+    clave = make_password(CLAVE_BENCHMARK)
+    User.objects.bulk_create([
+        User(username=f'{PREFIJO_USUARIOS}{numero}', email=f'usuario{numero}@benchmark.test', password=clave)
+        for numero in range(usuarios)
+    ], batch_size=500)
+    Membresia = User.groups.through
+    Membresia.objects.bulk_create([
+        Membresia(customuser_id=pk, group_id=azar.choice(grupos).pk)
+        for pk in User.objects.filter(username__startswith=PREFIJO_USUARIOS).values_list('pk', flat=True)
+    ], batch_size=500)
+
+    admin = User.objects.filter(username=ADMIN_BENCHMARK).first()
+    if admin is None:
+        admin = User.objects.create_superuser(ADMIN_BENCHMARK, 'admin@benchmark.test', CLAVE_BENCHMARK)
+    return admin
+
+
+def _contexto_inicial():
+    from .models import Producto
+    from .paginacion import paginar_por_cursor
+
+    pagina = paginar_por_cursor(Producto.objects.all(), limite=settings.PRODUCTOS_POR_PAGINA)
+    return {
+        'producto': Producto.objects.order_by('id').values_list('id', flat=True).first(),
+        'cursor': pagina.siguiente or '',
+        'grupo': Group.objects.order_by('id').values_list('id', flat=True).first() or '',
+    }
+
+
+def _cliente(tipo, admin):
+    cliente = Client()
+    if tipo in ('admin', 'nuevo'):
+        cliente.force_login(admin)
+    return cliente
+
+
+class _TiempoSQL:
+    """execute_wrapper que acumula el tiempo de las consultas en segundos"""
+
+    def __init__(self):
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total += time.perf_counter() - inicio
+
+
+def medir_escenario(escenario, admin, contexto, iteraciones=20, calentamiento=3):
+    tiempos, consultas, tiempos_sql, estados = [], [], [], set()
+    cliente = _cliente(escenario.cliente, admin)
+    # Un contador global de iteraciones: nombres únicos también en el calentamiento
+    for i in range(calentamiento + iteraciones + 1):
+        contexto['i'] = contexto['n'] = contexto['n'] + 1
+        if escenario.preparar:
+            contexto.update(escenario.preparar(contexto))
+        if escenario.cliente != 'admin':
+            # Login, logout y registro cambian la sesión: un cliente nuevo por petición
+            cliente = _cliente(escenario.cliente, admin)
+
+        if i < calentamiento:
+            escenario.peticion(cliente, contexto)
+        elif i < calentamiento + iteraciones:
+            sql = _TiempoSQL()
+            with CaptureQueriesContext(connection) as capturadas, connection.execute_wrapper(sql):
+                inicio = time.perf_counter()
+                respuesta = escenario.peticion(cliente, contexto)
+                tiempos.append(time.perf_counter() - inicio)
+            consultas.append(contar_consultas(capturadas))
+            tiempos_sql.append(sql.total)
+            estados.add(respuesta.status_code)
+        else:
+            tracemalloc.start()
+            try:
+                escenario.peticion(cliente, contexto)
+                _, pico = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 3),
+        'p95_ms': round(percentil(tiempos, 95) * 1000, 3),
+        'p99_ms': round(percentil(tiempos, 99) * 1000, 3),
+        'consultas': max(consultas),
+        'sql_ms': round(percentil(tiempos_sql, 50) * 1000, 3),
+        'memoria_pico_kib': round(pico / 1024, 1),
+        'presupuesto': escenario.presupuesto,
+        'estados': sorted(estados),
+        'ok': estados <= set(escenario.estados),
+    }
+
+
+def ejecutar(admin, escenarios=None, iteraciones=20, calentamiento=3):
+    """
+    Recorre los escenarios y devuelve {nombre: métricas}. Las cachés y los
+    límites de intentos se aíslan con override_settings; los datos los debe
+    aislar quien llama (base de prueba o transacción que se deshace).
+    """
+    cache_privada = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+    resultados = {}
+    # Sesiones en la caché privada: los presupuestos miden las vistas, no el
+    # almacenamiento de sesiones (eso lo compara el comando benchmark_sesiones)
+    with override_settings(CACHES=cache_privada, LIMITES_INTENTOS=LIMITES_BENCHMARK,
+                           SESSION_ENGINE=settings.SESSION_ENGINES['cached_db'],
+                           ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[]):
+        cache.clear()
+        contexto = dict(_contexto_inicial(), n=0)
+        for escenario in escenarios or ESCENARIOS:
+            resultados[escenario.nombre] = medir_escenario(escenario, admin, contexto, iteraciones, calentamiento)
+        cache.clear()
+    return resultados
+
+
+def excedidos(resultados):
+    """Escenarios que superaron su presupuesto de consultas o respondieron mal"""
+    return [
+        (nombre, metricas) for nombre, metricas in resultados.items()
+        if metricas['consultas'] > metricas['presupuesto'] or not metricas['ok']
+    ]
+
+
+def comparar(resultados, base, tolerancia=0.2):
+    """
+    Regresiones frente a una ejecución guardada: más consultas que en la
+    base, o p95 más de `tolerancia` (fracción) por encima. Devuelve
+    [(escenario, métrica, antes, ahora)].
+    """
+    regresiones = []
+    for nombre, metricas in resultados.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        if metricas['consultas'] > anterior['consultas']:
+            regresiones.append((nombre, 'consultas', anterior['consultas'], metricas['consultas']))
+        if metricas['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            regresiones.append((nombre, 'p95_ms', anterior['p95_ms'], metricas['p95_ms']))
+    return regresiones
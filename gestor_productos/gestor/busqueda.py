@@ -0,0 +1,156 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Producto
+
+
+# Búsqueda de texto completo sobre SQLite FTS5
+#
+# La tabla virtual gestor_producto_fts es un índice "external content" de
+# gestor_producto: no duplica el texto, solo guarda el índice invertido.
+# Los triggers la mantienen al día en cada INSERT/UPDATE/DELETE, incluidas
+# las operaciones masivas que no pasan por Model.save().
+
+TABLA_FTS = 'gestor_producto_fts'
+
+# El nombre pesa más que la descripción al ordenar por relevancia (bm25)
+PESO_NOMBRE = 10.0
+PESO_DESCRIPCION = 1.0
+
+SQL_TABLA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+    nombre, descripcion,
+    content='gestor_producto', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+SQL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_ai AFTER INSERT ON gestor_producto BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_ad AFTER DELETE ON gestor_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_au AFTER UPDATE OF nombre, descripcion ON gestor_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+
+NOMBRES_TRIGGERS = ('gestor_producto_fts_ai', 'gestor_producto_fts_ad', 'gestor_producto_fts_au')
+
+
+def fts_disponible(conexion=None):
+    """FTS5 solo existe en SQLite; en otros motores se usa el filtro clásico"""
+    return (conexion or connection).vendor == 'sqlite'
+
+
+def instalar_triggers(conexion=None):
+    """
+    Crea (si faltan) la tabla FTS y sus triggers.
+
+    SQLite reconstruye la tabla gestor_producto en algunas migraciones y eso
+    borra sus triggers, por eso se vuelve a llamar después de cada migrate.
+    """
+    conexion = conexion or connection
+    if not fts_disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(SQL_TABLA)
+        for sql in SQL_TRIGGERS:
+            cursor.execute(sql)
+
+
+def quitar_triggers(conexion=None):
+    """
+    Quita los triggers (la tabla FTS queda). Para cargas masivas: se
+    insertan las filas sin mantener el índice fila por fila y luego se llama
+    a reconstruir_indice, que los vuelve a crear.
+    """
+    conexion = conexion or connection
+    if not fts_disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        for nombre in NOMBRES_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+
+
+def reconstruir_indice(conexion=None):
+    """Regenera todo el índice a partir de gestor_producto"""
+    conexion = conexion or connection
+    instalar_triggers(conexion)
+    with conexion.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+
+
+# Caracteres de control: FTS5 corta la cadena en el NUL ("unterminated string")
+CARACTERES_CONTROL = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def limpiar_termino(termino):
+    """Texto del usuario sin caracteres de control (quedan como separadores)"""
+    return CARACTERES_CONTROL.sub(' ', termino or '').strip()
+
+
+def construir_consulta(termino):
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura.
+
+    Cada palabra se cita (para que operadores como AND, NEAR o '-' no se
+    interpreten) y se busca por prefijo; todas deben aparecer.
+    """
+    palabras = [p.replace('"', '') for p in limpiar_termino(termino).split()]
+    return ' '.join(f'"{p}"*' for p in palabras if p)
+
+
+def buscar_ids(termino, limite, offset=0):
+    """Ids de productos que coinciden, ordenados por relevancia"""
+    termino = limpiar_termino(termino)
+    consulta = construir_consulta(termino)
+    if not consulta:
+        return []
+    if not fts_disponible():
+        qs = Producto.objects.filter(nombre__icontains=termino) | Producto.objects.filter(descripcion__icontains=termino)
+        return list(qs.values_list('id', flat=True)[offset:offset + limite])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+            f"ORDER BY bm25({TABLA_FTS}, %s, %s) LIMIT %s OFFSET %s",
+            [consulta, PESO_NOMBRE, PESO_DESCRIPCION, limite, offset],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar_productos(termino, limite, offset=0, campos=('id', 'nombre', 'resumen', 'fecha_creacion', 'fecha_actualizacion')):
+    """Productos ordenados por relevancia, cargando solo los campos indicados"""
+    ids = buscar_ids(termino, limite, offset)
+    productos = Producto.objects.only(*campos).in_bulk(ids)
+    return [productos[pk] for pk in ids if pk in productos]
+
+
+def filtrar_queryset(queryset, termino):
+    """Restringe un queryset de Producto a los que coinciden con `termino`"""
+    termino = limpiar_termino(termino)
+    consulta = construir_consulta(termino)
+    if not consulta:
+        return queryset
+    if not fts_disponible():
+        return queryset.filter(nombre__icontains=termino) | queryset.filter(descripcion__icontains=termino)
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [consulta])
+    )
@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    ESTADO_DISPONIBLE, ESTADO_SIN_STOCK, ESTADO_STOCK_BAJO, ESTADOS_STOCK, STOCK_BAJO_UMBRAL,
+    EstadisticaCatalogo, Producto, filtro_estado_stock,
+)
+
+
+# Agregados del catálogo
+#
+# Cada operación sobre productos calcula su "delta" (variación de cada total)
+# y la aplica con un único UPDATE ... SET campo = campo + delta sobre la fila
+# de EstadisticaCatalogo, dentro de la misma transacción que la operación.
+# El comando reconciliar_estadisticas recalcula todo desde la tabla.
+
+PK = 1
+CAMPOS = (
+    'total_productos',
+    'total_unidades',
+    'valor_inventario',
+    'productos_sin_stock',
+    'productos_stock_bajo',
+    'productos_disponibles',
+)
+
+
+def campo_estado(stock):
+    """Contador del tramo de stock al que pertenece un producto"""
+    if stock == 0:
+        return 'productos_sin_stock'
+    if stock < STOCK_BAJO_UMBRAL:
+        return 'productos_stock_bajo'
+    return 'productos_disponibles'
+
+
+def delta_vacio():
+    return dict.fromkeys(CAMPOS, 0)
+
+
+def sumar(delta, precio, stock, signo=1):
+    """Suma (o resta con signo=-1) el aporte de un producto al delta"""
+    delta['total_productos'] += signo
+    delta['total_unidades'] += signo * stock
+    delta['valor_inventario'] += signo * Decimal(precio) * stock
+    delta[campo_estado(stock)] += signo
+    return delta
+
+
+def delta_cambio(original, precio, stock):
+    """Variación por guardar un producto; `original` es (precio, stock) o None si es nuevo"""
+    delta = delta_vacio()
+    if original is not None:
+        sumar(delta, original[0], original[1], -1)
+    return sumar(delta, precio, stock)
+
+
+def aplicar_delta(delta=None):
+    """
+    Aplica la variación con un UPDATE atómico e incrementa la versión del
+    catálogo (aunque los totales no cambien, p. ej. al renombrar un producto).
+    Crea la fila si aún no existe.
+    """
+    cambios = {campo: F(campo) + valor for campo, valor in (delta or {}).items() if valor}
+    actualizadas = EstadisticaCatalogo.objects.filter(pk=PK).update(
+        version=F('version') + 1, fecha_actualizacion=timezone.now(), **cambios
+    )
+    if not actualizadas:
+        # Primera vez: los totales se calculan desde la tabla (ya incluyen el cambio)
+        recalcular()
+
+
+def version_catalogo():
+    """(versión, fecha de la última modificación) del catálogo"""
+    fila = EstadisticaCatalogo.objects.filter(pk=PK).values_list('version', 'fecha_actualizacion').first()
+    if fila is None:
+        recalcular()
+        return version_catalogo()
+    return fila
+
+
+async def aversion_catalogo():
+    """Versión asíncrona de version_catalogo"""
+    fila = await EstadisticaCatalogo.objects.filter(pk=PK).values_list('version', 'fecha_actualizacion').afirst()
+    if fila is None:
+        await sync_to_async(recalcular)()
+        return await aversion_catalogo()
+    return fila
+
+
+def valor_inventario():
+    """Expresión precio * stock calculada por la base de datos"""
+    return ExpressionWrapper(F('precio') * F('stock'), output_field=DecimalField(max_digits=20, decimal_places=2))
+
+
+def agregados(queryset):
+    """Totales de un queryset de Producto con una sola consulta agregada"""
+    valor = valor_inventario()
+    resultado = queryset.order_by().aggregate(
+        total_productos=Count('id'),
+        total_unidades=Coalesce(Sum('stock'), 0),
+        valor_inventario=Coalesce(Sum(valor), Decimal(0), output_field=DecimalField(max_digits=20, decimal_places=2)),
+        productos_sin_stock=Count('id', filter=filtro_estado_stock(ESTADO_SIN_STOCK)),
+        productos_stock_bajo=Count('id', filter=filtro_estado_stock(ESTADO_STOCK_BAJO)),
+        productos_disponibles=Count('id', filter=filtro_estado_stock(ESTADO_DISPONIBLE)),
+    )
+    resultado['valor_inventario'] = Decimal(resultado['valor_inventario'])
+    return resultado
+
+
+@contextmanager
+def seguimiento(queryset):
+    """
+    Para operaciones masivas (update/delete por queryset): mide los totales
+    de `queryset` antes y después del bloque y aplica la diferencia.
+
+    El queryset debe identificar las mismas filas antes y después (por
+    ejemplo, filtrar por pk o por columnas que la operación no modifica).
+    """
+    antes = agregados(queryset)
+    yield
+    despues = agregados(queryset)
+    aplicar_delta({campo: despues[campo] - antes[campo] for campo in CAMPOS})
+
+
+def recalcular():
+    """Recalcula todos los totales desde la tabla de productos"""
+    totales = agregados(Producto.objects.all())
+    actualizadas = EstadisticaCatalogo.objects.filter(pk=PK).update(
+        version=F('version') + 1, fecha_actualizacion=timezone.now(), **totales
+    )
+    if not actualizadas:
+        EstadisticaCatalogo.objects.create(pk=PK, fecha_actualizacion=timezone.now(), **totales)
+    return totales
+
+
+def obtener():
+    """Fila de estadísticas (O(1)); se crea desde la tabla la primera vez"""
+    estadistica = EstadisticaCatalogo.objects.filter(pk=PK).first()
+    if estadistica is None:
+        recalcular()
+        estadistica = EstadisticaCatalogo.objects.get(pk=PK)
+    return estadistica
+
+
+async def aobtener():
+    """Versión asíncrona de obtener"""
+    estadistica = await EstadisticaCatalogo.objects.filter(pk=PK).afirst()
+    if estadistica is None:
+        await sync_to_async(recalcular)()
+        estadistica = await EstadisticaCatalogo.objects.aget(pk=PK)
+    return estadistica
+
+
+# Resumen por estado de stock (dashboard de inventario)
+
+CLAVE_RESUMEN_ESTADOS = 'inventario:resumen_estados'
+
+
+def resumen_por_estado(usar_cache=True):
+    """
+    Productos, unidades y valor por estado de stock con UNA consulta
+    agrupada (CASE/WHEN en la base de datos). El resultado se cachea
+    INVENTARIO_CACHE_TTL segundos porque el panel se abre constantemente.
+    """
+    if usar_cache:
+        resumen = cache.get(CLAVE_RESUMEN_ESTADOS)
+        if resumen is not None:
+            return resumen
+
+    filas = {
+        fila['estado_stock']: fila
+        for fila in Producto.objects.con_estado_stock()
+        .order_by()
+        .values('estado_stock')
+        .annotate(productos=Count('id'), unidades=Sum('stock'), valor=Sum(valor_inventario()))
+    }
+    resumen = []
+    for estado, etiqueta in ESTADOS_STOCK.items():
+        fila = filas.get(estado, {})
+        resumen.append({
+            'estado': estado,
+            'etiqueta': etiqueta,
+            'productos': fila.get('productos', 0),
+            'unidades': fila.get('unidades') or 0,
+            'valor': Decimal(fila.get('valor') or 0),
+        })
+
+    cache.set(CLAVE_RESUMEN_ESTADOS, resumen, settings.INVENTARIO_CACHE_TTL)
+    return resumen
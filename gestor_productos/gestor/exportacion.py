@@ -0,0 +1,195 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Producto
+
+
+# Exportación del catálogo en streaming (CSV / JSON Lines)
+#
+# Las filas se leen con values_list(...).iterator(chunk_size) y se van
+# escribiendo en bloques, así la memoria no depende del tamaño de la tabla
+# y el primer byte (la cabecera) sale de inmediato. Bajo ASGI las filas se
+# leen por trozos con sync_to_async (aexportar).
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+COLUMNAS = ('id', 'nombre', 'descripcion', 'precio', 'stock', 'fecha_creacion')
+
+# Tamaño aproximado de cada bloque que se entrega al cliente
+TAMANO_BLOQUE = 64 * 1024
+
+
+def rango_fechas(desde=None, hasta=None):
+    """Filtros de fecha_creacion para un rango de días [desde, hasta] (ambos incluidos)"""
+    filtros = {}
+    if desde:
+        filtros['fecha_creacion__gte'] = timezone.make_aware(datetime.combine(desde, time.min))
+    if hasta:
+        filtros['fecha_creacion__lt'] = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return filtros
+
+
+def _filas(desde=None, hasta=None):
+    return Producto.objects.filter(**rango_fechas(desde, hasta)).order_by('id').values_list(*COLUMNAS)
+
+
+def filas_productos(desde=None, hasta=None, chunk_size=None):
+    """Tuplas de COLUMNAS en orden de id, leídas por trozos desde la base de datos"""
+    return _filas(desde, hasta).iterator(chunk_size=chunk_size or settings.EXPORTACION_CHUNK_SIZE)
+
+
+async def afilas_productos(desde=None, hasta=None, chunk_size=None):
+    """
+    Versión asíncrona de filas_productos (async for). Hace lo mismo que
+    aiterator(), que con values_list() en Django 5.2 ejecuta la consulta en
+    el hilo del event loop: cada trozo se lee con sync_to_async, y el cursor
+    se abre en ese mismo hilo.
+    """
+    chunk_size = chunk_size or settings.EXPORTACION_CHUNK_SIZE
+    filas = None
+
+    def siguiente_trozo():
+        nonlocal filas
+        if filas is None:
+            filas = filas_productos(desde, hasta, chunk_size)
+        return list(islice(filas, chunk_size))
+
+    while True:
+        trozo = await sync_to_async(siguiente_trozo)()
+        for fila in trozo:
+            yield fila
+        if len(trozo) < chunk_size:
+            break
+
+
+class _Buffer:
+    """Pseudo archivo para csv.writer que acumula el texto escrito"""
+
+    def __init__(self):
+        self.partes = []
+        self.tamano = 0
+
+    def write(self, valor):
+        self.partes.append(valor)
+        self.tamano += len(valor)
+
+    def vaciar(self):
+        texto = ''.join(self.partes)
+        self.partes = []
+        self.tamano = 0
+        return texto.encode('utf-8')
+
+
+# Cada formato escribe las filas en un _Buffer y avisa cuando hay un bloque
+# listo para enviar; así el mismo código sirve para filas síncronas
+# (comando, WSGI) y asíncronas (ASGI).
+
+class _Csv:
+
+    def __init__(self):
+        self.buffer = _Buffer()
+        self.escritor = csv.writer(self.buffer)
+        # La cabecera sale sola, antes de la primera consulta
+        self.escritor.writerow(COLUMNAS)
+
+    def escribir(self, fila):
+        self.escritor.writerow(fila[:-1] + (fila[-1].isoformat(),))
+        return self.buffer.tamano >= TAMANO_BLOQUE
+
+
+class _Jsonl:
+
+    def __init__(self):
+        self.buffer = _Buffer()
+        self.primera = True
+
+    def escribir(self, fila):
+        pk, nombre, descripcion, precio, stock, fecha = fila
+        self.buffer.write(json.dumps({
+            'id': pk,
+            'nombre': nombre,
+            'descripcion': descripcion,
+            'precio': str(precio),
+            'stock': stock,
+            'fecha_creacion': fecha.isoformat(),
+        }, ensure_ascii=False))
+        self.buffer.write('\n')
+        # La primera fila sale sola para que el cliente reciba datos de inmediato
+        listo = self.primera or self.buffer.tamano >= TAMANO_BLOQUE
+        self.primera = False
+        return listo
+
+
+CODIFICADORES = {'csv': _Csv, 'jsonl': _Jsonl}
+
+
+def generar(formato, filas):
+    codificador = CODIFICADORES[formato]()
+    if codificador.buffer.tamano:
+        yield codificador.buffer.vaciar()
+    for fila in filas:
+        if codificador.escribir(fila):
+            yield codificador.buffer.vaciar()
+    if codificador.buffer.tamano:
+        yield codificador.buffer.vaciar()
+
+
+async def agenerar(formato, filas):
+    """generar() sobre filas asíncronas"""
+    codificador = CODIFICADORES[formato]()
+    if codificador.buffer.tamano:
+        yield codificador.buffer.vaciar()
+    async for fila in filas:
+        if codificador.escribir(fila):
+            yield codificador.buffer.vaciar()
+    if codificador.buffer.tamano:
+        yield codificador.buffer.vaciar()
+
+
+def _compresor():
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+
+def comprimir_gzip(bloques):
+    """
+    Comprime al vuelo (formato gzip). Cada bloque se vacía con Z_SYNC_FLUSH
+    para que el cliente lo reciba sin esperar al final del archivo.
+    """
+    compresor = _compresor()
+    for bloque in bloques:
+        yield compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH)
+    yield compresor.flush()
+
+
+async def acomprimir_gzip(bloques):
+    """comprimir_gzip() sobre bloques asíncronos"""
+    compresor = _compresor()
+    async for bloque in bloques:
+        yield compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH)
+    yield compresor.flush()
+
+
+def exportar(formato='csv', gzip=False, desde=None, hasta=None):
+    """Generador de bytes con el catálogo en el formato pedido"""
+    bloques = generar(formato, filas_productos(desde, hasta))
+    return comprimir_gzip(bloques) if gzip else bloques
+
+
+def aexportar(formato='csv', gzip=False, desde=None, hasta=None):
+    """
+    Como exportar(), pero un generador asíncrono. Bajo ASGI un
+    StreamingHttpResponse con un iterador síncrono se consume entero con
+    sync_to_async(list) antes de enviar el primer byte; con este, cada
+    bloque sale en cuanto está listo.
+    """
+    bloques = agenerar(formato, afilas_productos(desde, hasta))
+    return acomprimir_gzip(bloques) if gzip else bloques
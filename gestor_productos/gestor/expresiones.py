@@ -0,0 +1,18 @@
+from django.db.models import Aggregate, CharField
+
+
+class ConcatenarTexto(Aggregate):
+    """
+    Concatena los valores agrupados en un texto separado por comas
+    (GROUP_CONCAT en SQLite/MySQL, STRING_AGG en PostgreSQL).
+    """
+
+    function = 'GROUP_CONCAT'
+    template = "%(function)s(%(expressions)s, ', ')"
+    output_field = CharField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="%(function)s(%(expressions)s SEPARATOR ', ')", **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='STRING_AGG', template="%(function)s(%(expressions)s::text, ', ')", **extra_context)
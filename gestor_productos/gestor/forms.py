@@ -1,7 +1,44 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
-from .models import Producto, CustomUser
+from django.db import IntegrityError, transaction
+from .models import ESTADOS_STOCK, Producto, CustomUser, filtro_estado_stock
+from . import masivo
+from .busqueda import filtrar_queryset
+
+
+# Reglas de validación de productos
+# Compartidas por ProductoForm y la importación masiva (gestor/importacion.py)
+
+def validar_precio(precio):
+    if precio is not None and precio <= 0:
+        raise ValidationError('El precio debe ser un valor positivo mayor a cero')
+    return precio
+
+
+def validar_stock(stock):
+    if stock is not None and stock < 0:
+        raise ValidationError('El stock no puede ser negativo')
+    return stock
+
+
+def normalizar_nombre(nombre):
+    nombre = nombre.strip()
+    if not nombre:
+        raise ValidationError('El nombre no puede estar vacío')
+    return nombre
+
+
+def mensaje_nombre_duplicado(nombre):
+    return f'Ya existe un producto con el nombre "{nombre}"'
+
+
+def es_nombre_duplicado(error):
+    """
+    True si el IntegrityError lo causó el índice único del nombre: SQLite,
+    PostgreSQL y MySQL incluyen el nombre del índice en el mensaje.
+    """
+    return 'producto_nombre_ci_unico' in str(error)
 
 
 class ProductoForm(forms.ModelForm):
@@ -45,19 +82,12 @@ class ProductoForm(forms.ModelForm):
     # Precio debe ser mayor a cero
 
     def clean_precio(self):
-        precio = self.cleaned_data.get('precio')
-        if precio is not None and precio <= 0:
-            raise ValidationError('El precio debe ser un valor positivo mayor a cero')
-        return precio
+        return validar_precio(self.cleaned_data.get('precio'))
 
     # Stock no puede ser negativo
 
     def clean_stock(self):
-
-        stock = self.cleaned_data.get('stock')
-        if stock is not None and stock < 0:
-            raise ValidationError('El stock no puede ser negativo')
-        return stock
+        return validar_stock(self.cleaned_data.get('stock'))
     
     # Validar unicidad del nombre
 
@@ -65,20 +95,200 @@ class ProductoForm(forms.ModelForm):
 
         nombre = self.cleaned_data.get('nombre')
         if nombre:
-            nombre = nombre.strip()
-            if not nombre:
-                raise ValidationError('El nombre no puede estar vacío')
+            nombre = normalizar_nombre(nombre)
             
             # Verificar unicidad (excluyendo la instancia actual si es edición)
-            qs = Producto.objects.filter(nombre__iexact=nombre)
+            # LOWER(nombre) = LOWER(valor) usa el índice único funcional
+            qs = Producto.objects.nombre_igual(nombre)
             if self.instance.pk:
                 qs = qs.exclude(pk=self.instance.pk)
             
             if qs.exists():
-                raise ValidationError(f'Ya existe un producto con el nombre "{nombre}"')
+                raise ValidationError(mensaje_nombre_duplicado(nombre))
         
         return nombre
 
+    def save(self, commit=True):
+        """
+        Guarda el producto. Si otro request creó el mismo nombre entre la
+        validación y el INSERT, el índice único lo rechaza: se agrega el mismo
+        error de validación al formulario y se devuelve None. Cualquier otro
+        IntegrityError se propaga.
+        """
+        if not commit:
+            return super().save(commit=False)
+        try:
+            with transaction.atomic():
+                return super().save()
+        except IntegrityError as error:
+            if not es_nombre_duplicado(error):
+                raise
+            self.add_error('nombre', mensaje_nombre_duplicado(self.instance.nombre))
+            return None
+
+# Formulario de importación masiva
+
+class ImportarProductosForm(forms.Form):
+
+    archivo = forms.FileField(
+        label='Archivo',
+        help_text='CSV o JSON Lines con las columnas nombre, descripcion, precio y stock',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
+    )
+    formato = forms.ChoiceField(
+        label='Formato',
+        choices=[('', 'Detectar por extensión'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    actualizar = forms.BooleanField(
+        label='Actualizar productos existentes',
+        required=False,
+        help_text='Si el nombre ya existe se actualizan descripción, precio y stock',
+    )
+    segundo_plano = forms.BooleanField(
+        label='Procesar en segundo plano',
+        required=False,
+        help_text='Para archivos grandes: la importación sigue aunque se cierre la página',
+    )
+
+# Parámetros de la exportación del catálogo
+
+class ExportarProductosForm(forms.Form):
+
+    formato = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False)
+    gzip = forms.BooleanField(required=False)
+    desde = forms.DateField(required=False, input_formats=['%Y-%m-%d'])
+    hasta = forms.DateField(required=False, input_formats=['%Y-%m-%d'])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde, hasta = cleaned_data.get('desde'), cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise ValidationError('La fecha "desde" no puede ser posterior a "hasta"')
+        return cleaned_data
+
+# Selección de productos para operaciones masivas (mismos filtros que la API)
+
+class FiltroProductosForm(forms.Form):
+
+    q = forms.CharField(
+        label='Búsqueda',
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre o descripción'}),
+    )
+    estado_stock = forms.TypedChoiceField(
+        label='Estado de stock',
+        choices=[('', 'Todos')] + [(estado, etiqueta) for estado, etiqueta in ESTADOS_STOCK.items()],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    precio_min = forms.DecimalField(
+        label='Precio desde', required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    precio_max = forms.DecimalField(
+        label='Precio hasta', required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    def filtrar(self, productos):
+        """Aplica los filtros validados al queryset"""
+        datos = self.cleaned_data
+        if datos.get('q', '').strip():
+            productos = filtrar_queryset(productos, datos['q'].strip())
+        if datos.get('estado_stock') is not None:
+            productos = productos.filter(filtro_estado_stock(datos['estado_stock']))
+        if datos.get('precio_min') is not None:
+            productos = productos.filter(precio__gte=datos['precio_min'])
+        if datos.get('precio_max') is not None:
+            productos = productos.filter(precio__lte=datos['precio_max'])
+        return productos
+
+# Operación masiva sobre la selección (vista productos/masivo/ y acciones del admin)
+
+OPERACIONES_MASIVAS = [
+    ('precio_porcentaje', 'Cambiar precio en %'),
+    ('precio_monto', 'Sumar o restar un monto al precio'),
+    ('stock_fijar', 'Fijar stock'),
+    ('stock_ajustar', 'Sumar o restar stock'),
+    ('borrar', 'Borrar productos'),
+]
+
+
+class OperacionMasivaForm(forms.Form):
+
+    operacion = forms.ChoiceField(
+        label='Operación',
+        choices=OPERACIONES_MASIVAS,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    valor = forms.DecimalField(
+        label='Valor',
+        required=False,
+        max_digits=12,
+        decimal_places=2,
+        help_text='Porcentaje (-10 baja un 10%), monto en CLP o unidades de stock; no se usa al borrar',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'}),
+    )
+    redondeo = forms.TypedChoiceField(
+        label='Redondeo del precio',
+        choices=list(masivo.REDONDEOS.items()),
+        coerce=int,
+        initial=1,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
+    def __init__(self, *args, permitir_borrar=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not permitir_borrar:
+            self.fields['operacion'].choices = [
+                (valor, etiqueta) for valor, etiqueta in OPERACIONES_MASIVAS if valor != 'borrar'
+            ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        operacion, valor = cleaned_data.get('operacion'), cleaned_data.get('valor')
+        if not operacion or operacion == 'borrar':
+            return cleaned_data
+        if valor is None:
+            raise ValidationError({'valor': 'Ingrese el valor de la operación'})
+        if operacion == 'precio_porcentaje' and valor <= -100:
+            raise ValidationError({'valor': 'El precio no puede bajar un 100% o más'})
+        if operacion.startswith('stock_'):
+            if valor != valor.to_integral_value():
+                raise ValidationError({'valor': 'El stock se ajusta en unidades enteras'})
+            if operacion == 'stock_fijar' and valor < 0:
+                raise ValidationError({'valor': 'El stock no puede ser negativo'})
+        return cleaned_data
+
+    @property
+    def es_borrado(self):
+        return self.cleaned_data['operacion'] == 'borrar'
+
+    def cambios(self):
+        """Expresiones para masivo.actualizar / masivo.vista_previa (None si es un borrado)"""
+        operacion, valor = self.cleaned_data['operacion'], self.cleaned_data['valor']
+        redondeo = self.cleaned_data['redondeo']
+        if operacion == 'precio_porcentaje':
+            return {'precio': masivo.expresion_precio(porcentaje=valor, redondeo=redondeo)}
+        if operacion == 'precio_monto':
+            return {'precio': masivo.expresion_precio(monto=valor, redondeo=redondeo)}
+        if operacion == 'stock_fijar':
+            return {'stock': masivo.expresion_stock(fijar=valor)}
+        if operacion == 'stock_ajustar':
+            return {'stock': masivo.expresion_stock(ajuste=valor)}
+        return None
+
+    def descripcion(self):
+        """Texto corto para mensajes: "Cambiar precio en % (-12.5)" """
+        etiqueta = dict(OPERACIONES_MASIVAS)[self.cleaned_data['operacion']]
+        if self.es_borrado:
+            return etiqueta
+        return f"{etiqueta} ({self.cleaned_data['valor'].normalize():f})"
+
 # Formulario de creación de usuario personalizado
 
 class CustomUserCreationForm(UserCreationForm):
@@ -141,7 +351,8 @@ class CustomUserCreationForm(UserCreationForm):
         """Validar que el email sea único"""
         email = self.cleaned_data.get('email')
         if email:
-            if CustomUser.objects.filter(email=email).exists():
+            # LOWER(email) = LOWER(valor) usa el índice único parcial
+            if CustomUser.objects.email_igual(email).exists():
                 raise ValidationError('Este correo electrónico ya está registrado')
         return email
 
@@ -0,0 +1,341 @@
+import math
+import random
+import re
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils.text import add_truncation_text
+
+from . import estadisticas
+from .busqueda import fts_disponible, quitar_triggers, reconstruir_indice
+from .models import RESUMEN_PALABRAS, STOCK_BAJO_UMBRAL, Producto
+
+
+# Datos sintéticos para pruebas de carga (comando generar_datos)
+#
+# Todo sale de un random.Random(semilla): con la misma semilla, la misma
+# fecha de referencia y la misma base de partida se generan las mismas filas.
+# Los productos se insertan con INSERT de varias filas (executemany sobre el
+# cursor del driver, sin el log de consultas de DEBUG) y, por defecto, con los
+# índices, la restricción única y los triggers FTS quitados durante la carga:
+# se recrean una sola vez al final, dentro de la misma transacción.
+
+SUSTANTIVOS = (
+    ('silla', 'f'), ('mesa', 'f'), ('lámpara', 'f'), ('mochila', 'f'), ('cafetera', 'f'), ('tetera', 'f'),
+    ('sartén', 'f'), ('olla', 'f'), ('bicicleta', 'f'), ('chaqueta', 'f'), ('polera', 'f'), ('toalla', 'f'),
+    ('almohada', 'f'), ('alfombra', 'f'), ('cortina', 'f'), ('batidora', 'f'), ('licuadora', 'f'),
+    ('impresora', 'f'), ('cámara', 'f'), ('carpa', 'f'), ('linterna', 'f'), ('botella', 'f'),
+    ('escritorio', 'm'), ('teclado', 'm'), ('monitor', 'm'), ('mouse', 'm'), ('parlante', 'm'),
+    ('cargador', 'm'), ('cuaderno', 'm'), ('estante', 'm'), ('sillón', 'm'), ('velador', 'm'),
+    ('hervidor', 'm'), ('ventilador', 'm'), ('calefactor', 'm'), ('termo', 'm'), ('bolso', 'm'),
+    ('zapato', 'm'), ('pantalón', 'm'), ('chaleco', 'm'), ('cojín', 'm'), ('espejo', 'm'),
+    ('reloj', 'm'), ('audífono', 'm'), ('router', 'm'), ('taladro', 'm'), ('martillo', 'm'),
+)
+
+# (masculino, femenino)
+ADJETIVOS = (
+    ('compacto', 'compacta'), ('ergonómico', 'ergonómica'), ('plegable', 'plegable'),
+    ('inalámbrico', 'inalámbrica'), ('portátil', 'portátil'), ('clásico', 'clásica'),
+    ('moderno', 'moderna'), ('reforzado', 'reforzada'), ('liviano', 'liviana'), ('premium', 'premium'),
+    ('básico', 'básica'), ('profesional', 'profesional'), ('artesanal', 'artesanal'),
+    ('recargable', 'recargable'), ('térmico', 'térmica'), ('infantil', 'infantil'),
+    ('deportivo', 'deportiva'), ('eléctrico', 'eléctrica'), ('ecológico', 'ecológica'),
+)
+
+MARCAS = (
+    'Andes', 'Pacífico', 'Austral', 'Atacama', 'Maule', 'Patagonia', 'Cordillera', 'Valdivia', 'Chiloé',
+    'Elqui', 'Aconcagua', 'Biobío', 'Lircay', 'Tolhuaca', 'Rapel', 'Petrohué', 'Llanquihue', 'Osorno',
+)
+
+MATERIALES = (
+    'madera de pino', 'roble', 'aluminio', 'acero inoxidable', 'algodón', 'lana', 'cuero', 'bambú',
+    'plástico reciclado', 'vidrio templado', 'cerámica', 'poliéster', 'fibra de carbono', 'mimbre',
+)
+
+COLORES = ('negro', 'blanco', 'gris', 'azul', 'rojo', 'verde', 'café', 'beige', 'amarillo', 'naranja')
+
+USOS = (
+    'el hogar', 'la oficina', 'exteriores', 'viajes', 'la cocina', 'el dormitorio', 'camping',
+    'uso diario', 'regalos', 'estudiantes', 'el taller', 'la terraza',
+)
+
+FRASES = (
+    'Fabricado en {material} con terminaciones de {material2}.',
+    'Ideal para {uso} y {uso2}.',
+    'Disponible en color {color}.',
+    'Diseño {adjetivo} que se adapta a cualquier espacio.',
+    'Incluye garantía de {garantia} meses y despacho a todo Chile.',
+    'Producto {adjetivo} de la línea {marca}, pensado para durar.',
+    'Fácil de limpiar y mantener; no requiere herramientas especiales.',
+    'Medidas aproximadas: {alto} x {ancho} cm.',
+    'Peso liviano de {peso} kg, cómodo de trasladar.',
+    'Recomendado por clientes que lo usan en {uso}.',
+)
+
+NOMBRES = (
+    'Camila', 'Valentina', 'Javiera', 'Catalina', 'Fernanda', 'Constanza', 'Francisca', 'Antonia', 'Isidora',
+    'Martina', 'Sofía', 'Josefa', 'Benjamín', 'Vicente', 'Matías', 'Sebastián', 'Tomás', 'Joaquín',
+    'Diego', 'Cristóbal', 'Nicolás', 'Felipe', 'Agustín', 'Ignacio', 'Andrés', 'Gabriel', 'Lucas',
+)
+
+APELLIDOS = (
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+    'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza',
+    'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro', 'Pizarro', 'Álvarez', 'Vásquez',
+)
+
+# Reparto de los usuarios generados: (grupo o None, peso)
+GRUPOS_USUARIOS = (('Gestores de Productos', 60), ('Administradores', 5), (None, 35))
+
+COLUMNAS_PRODUCTO = ('nombre', 'descripcion', 'precio', 'stock', 'fecha_creacion', 'fecha_actualizacion', 'resumen')
+
+
+def referencia_por_defecto():
+    """Medianoche UTC de hoy: la fecha de referencia fija del día"""
+    return datetime.combine(datetime.now(dt_timezone.utc).date(), time(), tzinfo=dt_timezone.utc)
+
+
+def _descripcion(azar, adjetivo, marca):
+    frases = azar.sample(FRASES, azar.randint(2, 6))
+    return ' '.join(frase.format(
+        material=azar.choice(MATERIALES), material2=azar.choice(MATERIALES),
+        uso=azar.choice(USOS), uso2=azar.choice(USOS), color=azar.choice(COLORES),
+        adjetivo=adjetivo, marca=marca, garantia=azar.choice((3, 6, 12, 24)),
+        alto=azar.randint(10, 200), ancho=azar.randint(10, 200), peso=azar.randint(1, 40),
+    ) for frase in frases)
+
+
+def _precio(azar):
+    # Log-normal: muchos productos baratos y pocos muy caros (mediana ~ $13.000),
+    # redondeado a pesos terminados en 990 o 90 como en una tienda
+    valor = min(max(azar.lognormvariate(9.5, 1.1), 500), 50_000_000)
+    if valor >= 10_000:
+        return int(valor // 1000) * 1000 + 990
+    return int(valor // 100) * 100 + 90
+
+
+def _stock(azar):
+    sorteo = azar.random()
+    if sorteo < 0.08:
+        return 0
+    if sorteo < 0.23:
+        return azar.randint(1, STOCK_BAJO_UMBRAL - 1)
+    # Cola larga: la mayoría con decenas de unidades, algunos con miles
+    return min(STOCK_BAJO_UMBRAL + int(azar.paretovariate(1.2) * 10), 100_000)
+
+
+# Variantes precalculadas: sortear índices en tablas es mucho más barato que
+# armar cada texto y muestrear cada distribución fila por fila
+TAMANO_TABLAS = 1 << 14
+
+
+def _tablas(azar):
+    prefijos = [
+        f'{sustantivo.capitalize()} {adjetivos[genero == "f"]} {marca}'
+        for sustantivo, genero in SUSTANTIVOS for adjetivos in ADJETIVOS for marca in MARCAS
+    ]
+    azar.shuffle(prefijos)
+    # Texto que agrega Truncator al cortar el resumen
+    truncado = add_truncation_text('\0')
+    textos = []
+    for _ in range(TAMANO_TABLAS):
+        sustantivo, genero = azar.choice(SUSTANTIVOS)
+        descripcion = _descripcion(azar, azar.choice(ADJETIVOS)[genero == 'f'], azar.choice(MARCAS))
+        palabras = descripcion.split()
+        if len(palabras) > RESUMEN_PALABRAS:
+            resumen = truncado.replace('\0', ' '.join(palabras[:RESUMEN_PALABRAS]))
+        else:
+            resumen = descripcion
+        textos.append((descripcion, resumen))
+    precios = [_precio(azar) for _ in range(TAMANO_TABLAS)]
+    stocks = [_stock(azar) for _ in range(TAMANO_TABLAS)]
+    return prefijos, textos, precios, stocks
+
+
+def filas_productos(cantidad, semilla=42, inicio=1, referencia=None, dias=3 * 365, conexion=None):
+    """
+    Genera tuplas con COLUMNAS_PRODUCTO. `inicio` numera los modelos: el
+    número va en el nombre y lo hace único sin distinguir mayúsculas, como
+    exige producto_nombre_ci_unico (y ProductoForm.clean_nombre).
+
+    Con `conexion`, las fechas salen ya adaptadas para insertarlas con ese
+    motor; si no, son datetime con zona horaria UTC.
+    """
+    azar = random.Random(semilla)
+    sortear = azar.random
+    prefijos, textos, precios, stocks = _tablas(azar)
+    n_prefijos = len(prefijos)
+    # Fechas en UTC sin zona: convertirlas fila por fila cuesta más que generarlas
+    referencia = (referencia or referencia_por_defecto()).astimezone(dt_timezone.utc).replace(tzinfo=None)
+    if conexion is not None:
+        adaptar = conexion.ops.adapt_datetimefield_value
+    else:
+        def adaptar(fecha):
+            return fecha.replace(tzinfo=dt_timezone.utc)
+    segundos = dias * 86400
+
+    for numero in range(inicio, inicio + cantidad):
+        descripcion, resumen = textos[int(sortear() * TAMANO_TABLAS)]
+        # Más productos recientes que antiguos (el catálogo crece)
+        antiguedad = segundos * sortear() ** 2
+        creacion = referencia - timedelta(seconds=antiguedad)
+        # La mayoría se modificó poco después de crearse
+        actualizacion = creacion + timedelta(seconds=antiguedad * sortear() ** 3)
+        yield (
+            f'{prefijos[int(sortear() * n_prefijos)]} {chr(65 + numero % 26)}{chr(65 + numero // 26 % 26)}-{numero}',
+            descripcion,
+            precios[int(sortear() * TAMANO_TABLAS)],
+            stocks[int(sortear() * TAMANO_TABLAS)],
+            adaptar(creacion),
+            adaptar(actualizacion),
+            resumen,
+        )
+
+
+def insertar_filas(tabla, columnas, filas, conexion=None):
+    """
+    INSERT de varias filas por sentencia (tantas como admite el motor) con
+    executemany sobre el cursor del driver: sin el log de consultas de DEBUG
+    ni los execute_wrapper, que con millones de filas pesan más que el INSERT.
+    """
+    conexion = conexion or connection
+    filas = list(filas)
+    if not filas:
+        return 0
+    ops = conexion.ops
+    por_sentencia = max(1, (conexion.features.max_query_params or 1000) // len(columnas))
+    fila_sql = '(' + ', '.join(['%s'] * len(columnas)) + ')'
+    inicio_sql = f'INSERT INTO {ops.quote_name(tabla)} ({", ".join(ops.quote_name(c) for c in columnas)}) VALUES '
+
+    def aplanar(bloque):
+        return [valor for fila in bloque for valor in fila]
+
+    completas = len(filas) // por_sentencia * por_sentencia
+    with conexion.cursor() as cursor:
+        if completas:
+            cursor.cursor.executemany(
+                inicio_sql + ', '.join([fila_sql] * por_sentencia),
+                [aplanar(filas[i:i + por_sentencia]) for i in range(0, completas, por_sentencia)],
+            )
+        if completas < len(filas):
+            resto = filas[completas:]
+            cursor.cursor.execute(inicio_sql + ', '.join([fila_sql] * len(resto)), aplanar(resto))
+    return len(filas)
+
+
+@contextmanager
+def indices_diferidos(modelo, conexion=None):
+    """
+    Quita los índices y restricciones de Meta (y los triggers FTS) durante
+    el bloque y los recrea al salir. Debe usarse dentro de una transacción:
+    si al recrear la restricción única aparece un duplicado, se deshace todo.
+    """
+    conexion = conexion or connection
+    # El editor solo se usa para generar el SQL: en SQLite no puede abrirse
+    # (`with`) dentro de una transacción. deferred_sql es lo único que
+    # remove_sql necesita de lo que prepara __enter__.
+    editor = conexion.schema_editor()
+    editor.deferred_sql = []
+    elementos = [*modelo._meta.indexes, *modelo._meta.constraints]
+    with conexion.cursor() as cursor:
+        for elemento in elementos:
+            cursor.execute(str(elemento.remove_sql(modelo, editor)))
+    if modelo is Producto:
+        quitar_triggers(conexion)
+    yield
+    with conexion.cursor() as cursor:
+        for elemento in elementos:
+            cursor.execute(str(elemento.create_sql(modelo, editor)))
+    if modelo is Producto and fts_disponible(conexion):
+        # Recrea los triggers e indexa todo de una vez
+        reconstruir_indice(conexion)
+
+
+def generar_productos(cantidad, semilla=42, tamano_lote=20_000, diferir=None, referencia=None, dias=3 * 365,
+                      progreso=None):
+    """
+    Inserta `cantidad` productos sintéticos y deja al día el índice de
+    búsqueda y las estadísticas del catálogo. Devuelve el número insertado.
+
+    diferir=None decide solo: quitar y recrear los índices conviene cuando se
+    inserta al menos tanto como ya hay (recrearlos recorre toda la tabla).
+    """
+    tabla = Producto._meta.db_table
+    with transaction.atomic():
+        # Numeración a continuación del último id: no choca con productos generados antes
+        inicio = (Producto.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        filas = filas_productos(cantidad, semilla, inicio, referencia, dias, conexion=connection)
+        if diferir is None:
+            diferir = cantidad >= Producto.objects.count()
+        contexto = indices_diferidos(Producto) if diferir else nullcontext()
+        insertados = 0
+        with contexto:
+            while insertados < cantidad:
+                lote = [fila for _, fila in zip(range(min(tamano_lote, cantidad - insertados)), filas)]
+                insertados += insertar_filas(tabla, COLUMNAS_PRODUCTO, lote)
+                if progreso:
+                    progreso(insertados)
+        if connection.vendor in ('sqlite', 'postgresql'):
+            # Estadísticas del planificador para el nuevo volumen
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(tabla)}')
+        # bulk: sin post_save, los totales se recalculan desde la tabla (sube la versión del catálogo)
+        estadisticas.recalcular()
+    return insertados
+
+
+def siguiente_numero_usuario(prefijo):
+    """
+    Número siguiente al mayor sufijo de los usuarios `<prefijo><número>`.
+    Contar los usuarios con el prefijo repetiría nombres tras un borrado.
+    """
+    User = get_user_model()
+    mayor = User.objects.filter(username__regex=rf'^{re.escape(prefijo)}[0-9]+$').aggregate(
+        mayor=Max(Cast(Substr('username', len(prefijo) + 1), BigIntegerField()))
+    )['mayor']
+    return 0 if mayor is None else mayor + 1
+
+
+def generar_usuarios(cantidad, semilla=42, clave='gestor1234', prefijo='usuario', tamano_lote=5_000):
+    """
+    Crea usuarios repartidos entre grupos según GRUPOS_USUARIOS, todos con la
+    misma contraseña (un solo hash). Devuelve el número creado.
+    """
+    User = get_user_model()
+    azar = random.Random(semilla)
+    grupos = {nombre: Group.objects.get_or_create(name=nombre)[0].pk for nombre, _ in GRUPOS_USUARIOS if nombre}
+    opciones = [grupos.get(nombre) for nombre, _ in GRUPOS_USUARIOS]
+    pesos = [peso for _, peso in GRUPOS_USUARIOS]
+    hash_clave = make_password(clave)
+
+    with transaction.atomic():
+        inicio = siguiente_numero_usuario(prefijo)
+        # Ancho fijo del número para que los nombres ordenen bien
+        ancho = max(6, int(math.log10(inicio + cantidad)) + 1)
+        creados = 0
+        Membresia = User.groups.through
+        while creados < cantidad:
+            lote = []
+            for numero in range(inicio + creados, inicio + min(creados + tamano_lote, cantidad)):
+                username = f'{prefijo}{numero:0{ancho}d}'
+                lote.append(User(
+                    username=username, email=f'{username}@ejemplo.test', password=hash_clave,
+                    first_name=azar.choice(NOMBRES), last_name=azar.choice(APELLIDOS),
+                ))
+            User.objects.bulk_create(lote, batch_size=1000)
+            creados += len(lote)
+            # bulk_create solo devuelve los ids en algunos motores: se leen por username
+            ids = User.objects.filter(username__in=[u.username for u in lote]).order_by('id').values_list('id', flat=True)
+            Membresia.objects.bulk_create([
+                Membresia(customuser_id=pk, group_id=grupo)
+                for pk in ids
+                for grupo in azar.choices(opciones, pesos)
+                if grupo is not None
+            ], batch_size=1000)
+    return creados
@@ -0,0 +1,269 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import estadisticas
+from .forms import es_nombre_duplicado, mensaje_nombre_duplicado, normalizar_nombre, validar_precio, validar_stock
+from .models import Producto
+
+
+# Importación masiva de productos (CSV / JSON Lines)
+#
+# El archivo se lee fila a fila y se procesa por lotes: cada lote se valida
+# con las mismas reglas de ProductoForm, la unicidad del nombre se revisa
+# contra un set en memoria más UNA consulta por lote, y las filas válidas se
+# insertan con bulk_create dentro de una transacción.
+
+FORMATOS = ('csv', 'jsonl')
+CAMPOS_ACTUALIZABLES = ('descripcion', 'resumen', 'precio', 'stock', 'fecha_actualizacion')
+NOMBRE_MAX = Producto._meta.get_field('nombre').max_length
+PRECIO_MAX = Decimal(10) ** (
+    Producto._meta.get_field('precio').max_digits - Producto._meta.get_field('precio').decimal_places
+)
+
+
+class ArchivoInvalido(Exception):
+    """
+    El archivo no se pudo leer (no está en UTF-8 o el CSV está mal formado).
+    Los lotes anteriores ya se guardaron; `resultado` tiene sus totales.
+    """
+
+    def __init__(self, mensaje, resultado):
+        super().__init__(mensaje)
+        self.resultado = resultado
+
+
+class ResultadoImportacion:
+    """Totales de una importación y una muestra de las filas rechazadas"""
+
+    MAX_ERRORES = 50
+
+    def __init__(self, rechazos=None):
+        self.rechazos = rechazos
+        self.leidas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.rechazados = 0
+        self.errores = []
+
+    def rechazar(self, linea, fila, error):
+        self.rechazados += 1
+        if len(self.errores) < self.MAX_ERRORES:
+            self.errores.append((linea, error))
+        if self.rechazos:
+            self.rechazos.escribir(linea, fila, error)
+
+
+def detectar_formato(nombre_archivo):
+    return 'jsonl' if nombre_archivo.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def leer_filas(texto, formato):
+    """Genera (número de línea, dict) a partir de un archivo de texto abierto"""
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        for fila in lector:
+            yield lector.line_num, fila
+    else:
+        for numero, linea in enumerate(texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                fila = None
+            yield numero, fila if isinstance(fila, dict) else None
+
+
+def validar_fila(fila):
+    """Convierte una fila en los datos de un Producto o lanza ValidationError"""
+    if fila is None:
+        raise ValidationError('Fila con formato inválido')
+
+    nombre = normalizar_nombre(str(fila.get('nombre') or ''))
+    if len(nombre) > NOMBRE_MAX:
+        raise ValidationError(f'El nombre no puede superar {NOMBRE_MAX} caracteres')
+
+    descripcion = str(fila.get('descripcion') or '').strip()
+    if not descripcion:
+        raise ValidationError('La descripción es obligatoria')
+
+    try:
+        precio = Decimal(str(fila.get('precio')).strip()).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise ValidationError('El precio no es un número válido')
+    if not precio.is_finite() or precio >= PRECIO_MAX:
+        raise ValidationError('El precio no es un número válido')
+    validar_precio(precio)
+
+    try:
+        stock = int(str(fila.get('stock')).strip())
+    except ValueError:
+        raise ValidationError('El stock debe ser un número entero')
+    validar_stock(stock)
+
+    return {'nombre': nombre, 'descripcion': descripcion, 'precio': precio, 'stock': stock}
+
+
+class EscritorRechazos:
+    """Escribe las filas rechazadas en un CSV aparte (línea, error, fila original)"""
+
+    def __init__(self, archivo):
+        self.escritor = csv.writer(archivo)
+        self.escritor.writerow(['linea', 'error', 'fila'])
+
+    def escribir(self, linea, fila, error):
+        self.escritor.writerow([linea, error, json.dumps(fila, ensure_ascii=False, default=str)])
+
+
+def _existentes(nombres):
+    """
+    {nombre en minúsculas: (id, precio, stock)} de los productos que ya usan
+    esos nombres. LOWER(nombre) IN (...) se resuelve con el índice único funcional.
+    """
+    return {
+        nombre_lower: (pk, precio, stock)
+        for nombre_lower, pk, precio, stock in Producto.objects.annotate(nombre_lower=Lower('nombre'))
+        .filter(nombre_lower__in=nombres)
+        .values_list('nombre_lower', 'id', 'precio', 'stock')
+    }
+
+
+def _procesar_lote(lote, vistos, actualizar, resultado):
+    existentes = _existentes([datos['nombre'].lower() for _, _, datos in lote])
+    nuevos = []
+    cambios = []
+    delta_nuevos = estadisticas.delta_vacio()
+    delta_cambios = estadisticas.delta_vacio()
+    ahora = timezone.now()
+    for linea, fila, datos in lote:
+        clave = datos['nombre'].lower()
+        if clave in existentes:
+            if not actualizar:
+                resultado.rechazar(linea, fila, mensaje_nombre_duplicado(datos['nombre']))
+                continue
+            pk, precio, stock = existentes[clave]
+            estadisticas.sumar(delta_cambios, precio, stock, -1)
+            estadisticas.sumar(delta_cambios, datos['precio'], datos['stock'])
+            cambios.append(Producto(
+                id=pk,
+                resumen=Producto.generar_resumen(datos['descripcion']),
+                fecha_actualizacion=ahora,
+                **datos,
+            ))
+        else:
+            estadisticas.sumar(delta_nuevos, datos['precio'], datos['stock'])
+            nuevos.append(Producto(resumen=Producto.generar_resumen(datos['descripcion']), **datos))
+        vistos.add(clave)
+
+    try:
+        with transaction.atomic():
+            if nuevos:
+                Producto.objects.bulk_create(nuevos, batch_size=len(nuevos))
+            if cambios:
+                Producto.objects.bulk_update(cambios, CAMPOS_ACTUALIZABLES, batch_size=len(cambios))
+            estadisticas.aplicar_delta({
+                campo: delta_nuevos[campo] + delta_cambios[campo] for campo in estadisticas.CAMPOS
+            })
+    except IntegrityError as error:
+        if not es_nombre_duplicado(error):
+            raise
+        # Otro proceso creó alguno de los nombres después de la consulta del
+        # lote: el índice único lo impidió, se reintenta fila a fila
+        _procesar_filas(lote, nuevos, cambios, delta_cambios, resultado)
+        return
+    resultado.creados += len(nuevos)
+    resultado.actualizados += len(cambios)
+
+
+def _procesar_filas(lote, nuevos, cambios, delta_cambios, resultado):
+    """Inserta un lote fila a fila con savepoints, rechazando los duplicados"""
+    lineas = {datos['nombre']: (linea, fila) for linea, fila, datos in lote}
+    for producto in nuevos:
+        try:
+            with transaction.atomic():
+                producto.save(force_insert=True)
+        except IntegrityError as error:
+            if not es_nombre_duplicado(error):
+                raise
+            linea, fila = lineas[producto.nombre]
+            resultado.rechazar(linea, fila, mensaje_nombre_duplicado(producto.nombre))
+        else:
+            resultado.creados += 1
+    if cambios:
+        with transaction.atomic():
+            Producto.objects.bulk_update(cambios, CAMPOS_ACTUALIZABLES, batch_size=len(cambios))
+            estadisticas.aplicar_delta(delta_cambios)
+        resultado.actualizados += len(cambios)
+
+
+def importar_productos(texto, formato='csv', tamano_lote=None, actualizar=False, rechazos=None, progreso=None):
+    """
+    Importa productos desde `texto` (archivo de texto abierto).
+
+    Con `actualizar=True` los nombres que ya existen actualizan el producto
+    (upsert); si no, se rechazan igual que en ProductoForm. `rechazos` es un
+    EscritorRechazos opcional para el archivo de filas rechazadas.
+    `progreso(resultado)` se llama después de cada lote.
+    """
+    tamano_lote = tamano_lote or settings.IMPORTACION_TAMANO_LOTE
+    resultado = ResultadoImportacion(rechazos)
+    vistos = set()
+    lote = []
+    en_lote = set()
+
+    filas = leer_filas(texto, formato)
+    while True:
+        try:
+            linea, fila = next(filas)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            raise ArchivoInvalido(_mensaje_error('El archivo no está codificado en UTF-8', resultado), resultado)
+        except csv.Error as error:
+            raise ArchivoInvalido(_mensaje_error(f'CSV mal formado ({error})', resultado), resultado)
+
+        resultado.leidas += 1
+        try:
+            datos = validar_fila(fila)
+        except ValidationError as error:
+            resultado.rechazar(linea, fila, '; '.join(error.messages))
+            continue
+
+        # Nombre repetido dentro del mismo archivo
+        clave = datos['nombre'].lower()
+        if clave in vistos or clave in en_lote:
+            resultado.rechazar(linea, fila, mensaje_nombre_duplicado(datos['nombre']))
+            continue
+
+        en_lote.add(clave)
+        lote.append((linea, fila, datos))
+        if len(lote) >= tamano_lote:
+            _procesar_lote(lote, vistos, actualizar, resultado)
+            lote = []
+            en_lote = set()
+            if progreso:
+                progreso(resultado)
+
+    if lote:
+        _procesar_lote(lote, vistos, actualizar, resultado)
+    return resultado
+
+
+def _mensaje_error(motivo, resultado):
+    guardados = resultado.creados + resultado.actualizados
+    if not guardados:
+        return f'{motivo}; no se importó ningún producto'
+    return f'{motivo}; se guardaron {guardados} productos de los lotes anteriores'
+
+
+def abrir_subida(archivo):
+    """Envuelve un UploadedFile en un lector de texto sin cargarlo en memoria"""
+    return io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from . import estadisticas
+from .models import Producto
+
+
+# Movimientos de stock atómicos
+#
+# Cada movimiento es un único UPDATE condicional:
+#   UPDATE gestor_producto SET stock = stock - n WHERE id = %s AND stock >= n
+# La base de datos resuelve la concurrencia: no hay actualizaciones perdidas.
+# Antes se bloquean las filas (SELECT ... FOR UPDATE en orden de id; en
+# SQLite la transacción IMMEDIATE ya tiene el bloqueo de escritura) y se leen
+# precio y stock: la variación de las estadísticas sale de esos valores y de
+# las cantidades realmente aplicadas, no de agregados leídos antes y después,
+# que en READ COMMITTED contarían dos veces un movimiento concurrente.
+
+OK = 'ok'
+STOCK_INSUFICIENTE = 'stock_insuficiente'
+NO_EXISTE = 'no_existe'
+
+
+class StockInsuficiente(Exception):
+    """Un descuento no se pudo aplicar; `resultados` trae el detalle por línea"""
+
+    def __init__(self, resultados):
+        super().__init__('Stock insuficiente')
+        self.resultados = resultados
+
+
+def _mover(producto_id, cantidad):
+    """Aplica un movimiento (positivo suma, negativo descuenta) y devuelve su estado"""
+    qs = Producto.objects.filter(pk=producto_id)
+    cambios = {'stock': F('stock') + cantidad, 'fecha_actualizacion': Now()}
+    if cantidad < 0:
+        actualizadas = qs.filter(stock__gte=-cantidad).update(**cambios)
+    else:
+        actualizadas = qs.update(**cambios)
+    if actualizadas:
+        return OK
+    return STOCK_INSUFICIENTE if cantidad < 0 and qs.exists() else NO_EXISTE
+
+
+def aplicar_movimientos(movimientos, todo_o_nada=False):
+    """
+    Aplica una lista de (producto_id, cantidad) en una sola transacción.
+
+    Devuelve [(producto_id, cantidad, estado)] en el orden recibido. Con
+    `todo_o_nada=True` (reserva), si alguna línea falla no se aplica ninguna
+    y se lanza StockInsuficiente con el detalle.
+    """
+    movimientos = list(movimientos)
+    ids = {producto_id for producto_id, _ in movimientos}
+    estados = [None] * len(movimientos)
+
+    with transaction.atomic():
+        # Orden fijo por id para que transacciones concurrentes bloqueen filas en el mismo orden
+        originales = {
+            pk: (precio, stock)
+            for pk, precio, stock in Producto.objects.select_for_update()
+            .filter(pk__in=ids).order_by('pk').values_list('pk', 'precio', 'stock')
+        }
+        aplicado = dict.fromkeys(originales, 0)
+        for indice in sorted(range(len(movimientos)), key=lambda i: movimientos[i][0]):
+            producto_id, cantidad = movimientos[indice]
+            estados[indice] = _mover(producto_id, cantidad)
+            if estados[indice] == OK:
+                aplicado[producto_id] += cantidad
+
+        resultados = [(pk, cantidad, estado) for (pk, cantidad), estado in zip(movimientos, estados)]
+        if todo_o_nada and any(estado != OK for estado in estados):
+            # Deshace todas las líneas
+            raise StockInsuficiente(resultados)
+
+        delta = estadisticas.delta_vacio()
+        for pk, (precio, stock) in originales.items():
+            if aplicado[pk]:
+                estadisticas.sumar(delta, precio, stock, -1)
+                estadisticas.sumar(delta, precio, stock + aplicado[pk])
+        if OK in estados:
+            estadisticas.aplicar_delta(delta)
+    return resultados
+
+
+def incrementar(producto_id, cantidad):
+    return aplicar_movimientos([(producto_id, abs(cantidad))])[0][2]
+
+
+def descontar(producto_id, cantidad):
+    return aplicar_movimientos([(producto_id, -abs(cantidad))])[0][2]
+
+
+def reservar(lineas):
+    """Descuenta todas las líneas (producto_id, cantidad) o ninguna"""
+    return aplicar_movimientos([(pk, -abs(cantidad)) for pk, cantidad in lineas], todo_o_nada=True)
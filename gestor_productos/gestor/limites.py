@@ -0,0 +1,145 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Límite de intentos de login y registro
+#
+# Cada intento se cuenta en la caché compartida por IP y por usuario con una
+# ventana deslizante aproximada (ventana actual + fracción de la anterior).
+# Al superar el límite se bloquea esa IP/usuario con espera exponencial:
+# BASE, 2*BASE, 4*BASE... hasta MAX segundos. La verificación ocurre antes
+# de authenticate()/crear el usuario, así un ataque no llega a calcular hashes.
+
+CLAVE_INDICE = 'limites:bloqueados'
+
+
+def configuracion(ambito):
+    """(intentos permitidos, segundos de la ventana) de un ámbito, p. ej. 'login_ip'"""
+    return settings.LIMITES_INTENTOS[ambito]
+
+
+def ip_cliente(request):
+    """
+    IP del cliente; detrás de un proxy se usa la cabecera configurada.
+
+    En X-Forwarded-For ("cliente, proxy1, proxy2") las primeras entradas las
+    escribe el cliente y puede inventarlas; solo son confiables las que
+    agregaron nuestros proxies, al final. Con LIMITES_PROXIES_CONFIABLES = N
+    se toma la N-ésima contando desde la derecha.
+    """
+    cabecera = getattr(settings, 'LIMITES_CABECERA_IP', None)
+    if cabecera and request.META.get(cabecera):
+        entradas = [entrada.strip() for entrada in request.META[cabecera].split(',') if entrada.strip()]
+        saltos = max(1, getattr(settings, 'LIMITES_PROXIES_CONFIABLES', 1))
+        if entradas:
+            return entradas[-min(saltos, len(entradas))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _id(valor):
+    # Las claves de caché no admiten cualquier carácter ni cualquier largo
+    return hashlib.sha256(valor.lower().encode()).hexdigest()[:32]
+
+
+def _clave(tipo, ambito, valor, *extra):
+    return ':'.join(['limites', tipo, ambito, _id(valor), *map(str, extra)])
+
+
+def contar(ambito, valor, ahora=None):
+    """Intentos en la ventana deslizante (sin registrar uno nuevo)"""
+    _, ventana = configuracion(ambito)
+    ahora = ahora or time.time()
+    indice = int(ahora // ventana)
+    valores = cache.get_many([_clave('n', ambito, valor, indice), _clave('n', ambito, valor, indice - 1)])
+    actual = valores.get(_clave('n', ambito, valor, indice), 0)
+    anterior = valores.get(_clave('n', ambito, valor, indice - 1), 0)
+    # Peso de la ventana anterior: la parte que aún cae dentro de los últimos `ventana` segundos
+    peso = 1 - (ahora % ventana) / ventana
+    return actual + anterior * peso
+
+
+def registrar(ambito, valor, ahora=None):
+    """Suma un intento y devuelve el total en la ventana deslizante"""
+    _, ventana = configuracion(ambito)
+    ahora = ahora or time.time()
+    clave = _clave('n', ambito, valor, int(ahora // ventana))
+    # add + incr es atómico en Redis y en LocMem; la clave vive dos ventanas
+    cache.add(clave, 0, ventana * 2)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La clave expiró entre add e incr
+        cache.set(clave, 1, ventana * 2)
+    return contar(ambito, valor, ahora)
+
+
+def bloqueo_restante(ambito, valor, ahora=None):
+    """Segundos que le quedan al bloqueo (0 si no está bloqueado)"""
+    hasta = cache.get(_clave('bloqueo', ambito, valor))
+    if not hasta:
+        return 0
+    return max(0, int(hasta - (ahora or time.time())) + 1)
+
+
+def bloquear(ambito, valor, ahora=None):
+    """Bloquea con espera exponencial según cuántas veces se bloqueó antes"""
+    ahora = ahora or time.time()
+    base, maximo = settings.LIMITES_BLOQUEO_BASE, settings.LIMITES_BLOQUEO_MAX
+    clave_nivel = _clave('nivel', ambito, valor)
+    # El nivel se olvida tras un tiempo sin bloqueos
+    cache.add(clave_nivel, 0, maximo * 4)
+    nivel = cache.incr(clave_nivel)
+    segundos = min(base * 2 ** (nivel - 1), maximo)
+    cache.set(_clave('bloqueo', ambito, valor), ahora + segundos, segundos)
+
+    # Índice de bloqueos recientes para el comando limites_intentos
+    indice = cache.get(CLAVE_INDICE, {})
+    indice[(ambito, valor)] = ahora + segundos
+    indice = {clave: hasta for clave, hasta in indice.items() if hasta > ahora}
+    cache.set(CLAVE_INDICE, indice, maximo)
+    return segundos
+
+
+def limpiar(ambito, valor):
+    """Olvida contadores, nivel y bloqueo (login correcto o desbloqueo manual)"""
+    _, ventana = configuracion(ambito)
+    indice = int(time.time() // ventana)
+    cache.delete_many([
+        _clave('n', ambito, valor, indice),
+        _clave('n', ambito, valor, indice - 1),
+        _clave('nivel', ambito, valor),
+        _clave('bloqueo', ambito, valor),
+    ])
+    bloqueados = cache.get(CLAVE_INDICE, {})
+    if bloqueados.pop((ambito, valor), None) is not None:
+        cache.set(CLAVE_INDICE, bloqueados, settings.LIMITES_BLOQUEO_MAX)
+
+
+def bloqueados():
+    """{(ámbito, valor): segundos restantes} de los bloqueos vigentes"""
+    ahora = time.time()
+    return {
+        clave: int(hasta - ahora) + 1
+        for clave, hasta in cache.get(CLAVE_INDICE, {}).items()
+        if hasta > ahora
+    }
+
+
+def verificar(intentos):
+    """
+    Verifica y registra un intento. `intentos` es una lista de
+    (ámbito, valor); valores vacíos se ignoran. Devuelve los segundos de
+    espera si alguno está bloqueado o acaba de superar su límite, o 0.
+    """
+    intentos = [(ambito, valor) for ambito, valor in intentos if valor]
+    espera = max((bloqueo_restante(ambito, valor) for ambito, valor in intentos), default=0)
+    if espera:
+        return espera
+    for ambito, valor in intentos:
+        permitidos, _ = configuracion(ambito)
+        if registrar(ambito, valor) > permitidos:
+            espera = max(espera, bloquear(ambito, valor))
+    return espera
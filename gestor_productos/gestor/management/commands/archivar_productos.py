@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve al archivo (gestor_productoarchivado) los productos descontinuados y, si se indica, '
+        'los que llevan N días sin stock o sin cambios. Se procesan en lotes, una transacción corta '
+        'por lote. Los productos archivados se buscan y restauran desde el admin. '
+        'Ejemplo: manage.py archivar_productos --dias-sin-stock 90 --dias-sin-cambios 730'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-sin-stock', type=int, help='Archivar los que llevan N días con stock 0')
+        parser.add_argument('--dias-sin-cambios', type=int, help='Archivar los que no cambian hace N días')
+        parser.add_argument(
+            '--sin-descontinuados', action='store_true',
+            help='No archivar los productos marcados como descontinuados',
+        )
+        parser.add_argument('--lote', type=int, default=archivo.TAMANO_LOTE, help='Productos por transacción')
+        parser.add_argument('--simular', action='store_true', help='Solo contar los productos que se archivarían')
+
+    def handle(self, *args, **options):
+        for opcion in ('dias_sin_stock', 'dias_sin_cambios'):
+            if options[opcion] is not None and options[opcion] < 1:
+                raise CommandError(f"--{opcion.replace('_', '-')} debe ser al menos 1")
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        criterios = archivo.criterios(
+            options['dias_sin_stock'], options['dias_sin_cambios'], descontinuados=not options['sin_descontinuados'],
+        )
+        if not criterios:
+            raise CommandError('No hay nada que archivar: indique --dias-sin-stock o --dias-sin-cambios')
+
+        total = 0
+        for motivo, dias in criterios:
+            candidatos = archivo.candidatos(motivo, dias)
+            inicio = time.perf_counter()
+            if options['simular']:
+                cantidad = candidatos.count()
+                self.stdout.write(f'{motivo}: se archivarían {cantidad} productos')
+            else:
+                cantidad = archivo.archivar_por_lotes(
+                    candidatos, motivo, tamano_lote=options['lote'],
+                    progreso=self.progreso(motivo, options['verbosity']),
+                )
+                self.stdout.write(f'{motivo}: {cantidad} productos archivados en {time.perf_counter() - inicio:.1f} s')
+            total += cantidad
+
+        accion = 'se archivarían' if options['simular'] else 'archivados'
+        self.stdout.write(self.style.SUCCESS(f'Total: {total} productos {accion}'))
+
+    def progreso(self, motivo, verbosidad):
+        def mostrar(archivados):
+            if verbosidad > 1:
+                self.stdout.write(f'  {motivo}: {archivados} archivados')
+        return mostrar
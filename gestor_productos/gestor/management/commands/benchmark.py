@@ -0,0 +1,113 @@
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from gestor import auditoria
+from gestor.benchmark import ESCENARIOS, comparar, ejecutar, excedidos, sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark reproducible de todas las vistas: crea una base de prueba, siembra '
+        'productos y usuarios con una semilla fija, recorre cada ruta con el cliente de '
+        'pruebas y reporta p50/p95/p99, consultas SQL y memoria pico. Falla si un '
+        'escenario supera su presupuesto de consultas o empeora frente a --base.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=1000)
+        parser.add_argument('--usuarios', type=int, default=100)
+        parser.add_argument('--iteraciones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=3)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument(
+            '--escenario', action='append',
+            help='Nombre (o parte del nombre) de los escenarios a medir; se puede repetir',
+        )
+        parser.add_argument('--json', help='Archivo donde guardar los resultados (sirve como --base de otra ejecución)')
+        parser.add_argument('--base', help='Resultados guardados con --json contra los que comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help='Aumento de p95 tolerado frente a la base (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        escenarios = ESCENARIOS
+        if options['escenario']:
+            escenarios = [e for e in ESCENARIOS if any(f in e.nombre for f in options['escenario'])]
+            if not escenarios:
+                raise CommandError('Ningún escenario coincide con --escenario')
+        base = None
+        if options['base']:
+            with open(options['base'], encoding='utf-8') as archivo:
+                base = json.load(archivo)['resultados']
+
+        # Base de prueba propia: la siembra y las escrituras no tocan la base configurada
+        nombre_original = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # En archivo (WAL, busy_timeout) como en producción: una base en memoria
+            # compartida no deja escribir a la vez al hilo de auditoría y a las peticiones
+            directorio = tempfile.mkdtemp(prefix='benchmark-')
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directorio, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            admin = sembrar(options['productos'], options['usuarios'], options['semilla'])
+            resultados = ejecutar(admin, escenarios, options['iteraciones'], options['calentamiento'])
+        finally:
+            # La auditoría pendiente se escribe en la base de prueba, antes de destruirla
+            auditoria.escritor.detener()
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            if connection.vendor == 'sqlite':
+                shutil.rmtree(directorio, ignore_errors=True)
+
+        self.mostrar(resultados)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as archivo:
+                json.dump({'meta': self.meta(options), 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['json']}")
+
+        fallas = [
+            f'{nombre}: {m["consultas"]} consultas (presupuesto {m["presupuesto"]}), estados {m["estados"]}'
+            for nombre, m in excedidos(resultados)
+        ]
+        if base is not None:
+            fallas += [
+                f'{nombre}: {metrica} {antes} -> {ahora}'
+                for nombre, metrica, antes, ahora in comparar(resultados, base, options['tolerancia'])
+            ]
+        if fallas:
+            raise CommandError('Benchmark fallido:\n  ' + '\n  '.join(fallas))
+        self.stdout.write(self.style.SUCCESS('Todos los escenarios dentro del presupuesto'))
+
+    def mostrar(self, resultados):
+        self.stdout.write(
+            f"{'escenario':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>9} "
+            f"{'presup.':>7} {'sql ms':>7} {'mem KiB':>8}"
+        )
+        for nombre, m in resultados.items():
+            linea = (
+                f"{nombre:<24} {m['p50_ms']:>8.2f} {m['p95_ms']:>8.2f} {m['p99_ms']:>8.2f} {m['consultas']:>9} "
+                f"{m['presupuesto']:>7} {m['sql_ms']:>7.2f} {m['memoria_pico_kib']:>8.1f}"
+            )
+            ok = m['consultas'] <= m['presupuesto'] and m['ok']
+            self.stdout.write(linea if ok else self.style.ERROR(linea))
+
+    def meta(self, options):
+        return {
+            'fecha': timezone.now().isoformat(),
+            'productos': options['productos'],
+            'usuarios': options['usuarios'],
+            'iteraciones': options['iteraciones'],
+            'calentamiento': options['calentamiento'],
+            'semilla': options['semilla'],
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'plataforma': platform.platform(),
+            'base_de_datos': connection.vendor,
+        }
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, RequestFactory
+
+from gestor.benchmark import obtener_usuario, percentil
+
+
+URLS_POR_DEFECTO = ('/', '/productos/', '/api/productos/')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el rendimiento de las vistas bajo ASGI (event loop) y WSGI (pool '
+        'de hilos) con peticiones concurrentes, llamando a los handlers en proceso'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls', help='URL a medir (se puede repetir)')
+        parser.add_argument('--peticiones', type=int, default=300, help='Peticiones por URL y modo')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Clientes simultáneos')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos del servidor WSGI simulado')
+        parser.add_argument(
+            '--latencia-cliente', type=float, default=0,
+            help='Milisegundos que tarda el cliente en recibir la respuesta (cliente lento)',
+        )
+        parser.add_argument('--usuario', help='Usuario con el que se hacen las peticiones (por defecto, un superusuario)')
+
+    def handle(self, *args, **options):
+        usuario = obtener_usuario(options['usuario'])
+        if usuario is None:
+            raise CommandError('No se encontró el usuario para el benchmark (use --usuario)')
+        cliente = Client()
+        cliente.force_login(usuario)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')), 'localhost')
+        self.latencia = options['latencia_cliente'] / 1000
+
+        self.stdout.write(
+            f"{options['peticiones']} peticiones por URL, {options['concurrencia']} clientes, "
+            f"{options['hilos']} hilos WSGI, latencia de cliente {options['latencia_cliente']:g} ms\n"
+        )
+        self.stdout.write(f"{'URL':<24} {'modo':<5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errores':>8}")
+        try:
+            for url in options['urls'] or URLS_POR_DEFECTO:
+                for modo, medir in (('WSGI', self.medir_wsgi), ('ASGI', self.medir_asgi)):
+                    duracion, tiempos, errores = medir(url, options['peticiones'], options['concurrencia'], options['hilos'])
+                    self.stdout.write(
+                        f'{url:<24} {modo:<5} {len(tiempos) / duracion:>9.1f} '
+                        f'{percentil(tiempos, 50) * 1000:>9.2f} {percentil(tiempos, 95) * 1000:>9.2f} {errores:>8}'
+                    )
+        finally:
+            cliente.logout()
+
+    # WSGI: cada petición ocupa un hilo del pool de principio a fin
+
+    def medir_wsgi(self, url, peticiones, concurrencia, hilos):
+        handler = WSGIHandler()
+        fabrica = RequestFactory(HTTP_COOKIE=self.cookie, HTTP_HOST=self.host)
+
+        def peticion(inicio):
+            estado = []
+            environ = fabrica.get(url).environ
+            respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(status))
+            for _ in respuesta:
+                # El hilo queda ocupado mientras el cliente lento recibe los datos
+                if self.latencia:
+                    time.sleep(self.latencia)
+            respuesta.close()
+            return time.perf_counter() - inicio, not estado[0].startswith(('2', '3'))
+
+        # Los clientes llegan en ráfagas de `concurrencia`; el pool atiende `hilos` a la vez
+        resultados = []
+        comienzo = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            for desde in range(0, peticiones, concurrencia):
+                inicio = time.perf_counter()
+                tareas = [pool.submit(peticion, inicio) for _ in range(min(concurrencia, peticiones - desde))]
+                resultados.extend(tarea.result() for tarea in tareas)
+        duracion = time.perf_counter() - comienzo
+        return duracion, [tiempo for tiempo, _ in resultados], sum(error for _, error in resultados)
+
+    # ASGI: las peticiones esperan a la base de datos y al cliente sin ocupar un hilo
+
+    def medir_asgi(self, url, peticiones, concurrencia, hilos):
+        return asyncio.run(self._medir_asgi(url, peticiones, concurrencia))
+
+    async def _medir_asgi(self, url, peticiones, concurrencia):
+        handler = ASGIHandler()
+        partes = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': partes.path,
+            'raw_path': partes.path.encode(),
+            'query_string': partes.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode()), (b'cookie', self.cookie.encode())],
+            'server': (self.host, 80),
+            'client': ('127.0.0.1', 0),
+        }
+
+        async def peticion(inicio):
+            estado = []
+            cuerpo_enviado = False
+
+            async def receive():
+                nonlocal cuerpo_enviado
+                if not cuerpo_enviado:
+                    cuerpo_enviado = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # El cliente no se desconecta: Django cancela esta espera al terminar
+                await asyncio.Future()
+
+            async def send(mensaje):
+                if mensaje['type'] == 'http.response.start':
+                    estado.append(mensaje['status'])
+                elif self.latencia:
+                    await asyncio.sleep(self.latencia)
+
+            await handler(dict(scope), receive, send)
+            return time.perf_counter() - inicio, estado[0] >= 400
+
+        resultados = []
+        comienzo = time.perf_counter()
+        for desde in range(0, peticiones, concurrencia):
+            inicio = time.perf_counter()
+            resultados.extend(await asyncio.gather(
+                *(peticion(inicio) for _ in range(min(concurrencia, peticiones - desde)))
+            ))
+        duracion = time.perf_counter() - comienzo
+        return duracion, [tiempo for tiempo, _ in resultados], sum(error for _, error in resultados)
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from gestor.benchmark import obtener_usuario
+
+
+ALMACENAMIENTOS_MENSAJES = {
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+}
+
+PASOS = (
+    ('GET productos/', 'get', '/productos/', None),
+    ('POST crear (mensaje)', 'post', '/productos/crear/', {
+        'nombre': 'Benchmark de sesiones', 'descripcion': 'Producto temporal', 'precio': '1000', 'stock': '5',
+    }),
+    ('GET productos/ (lee mensaje)', 'get', '/productos/', None),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Cuenta las consultas por request (y las que tocan django_session) del recorrido '
+        'listar -> crear -> listar con cada almacenamiento de sesión. Todo se hace en una '
+        'transacción que se deshace al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--almacenamiento', action='append', choices=sorted(settings.SESSION_ENGINES),
+            help='Almacenamiento a medir (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument(
+            '--mensajes', choices=sorted(ALMACENAMIENTOS_MENSAJES), default='fallback',
+            help='Almacenamiento de mensajes (session sirve para comparar con guardarlos en la sesión)',
+        )
+        parser.add_argument('--usuario', help='Usuario con permiso para crear productos (por defecto, un superusuario)')
+
+    def handle(self, *args, **options):
+        usuario = obtener_usuario(options['usuario'])
+        if usuario is None:
+            raise CommandError('No se encontró el usuario para el benchmark (use --usuario)')
+
+        self.stdout.write(f"{'almacenamiento':<16} {'paso':<30} {'consultas':>9} {'sesión':>7} {'escrituras sesión':>18}")
+        for nombre in options['almacenamiento'] or list(settings.SESSION_ENGINES):
+            totales = [0, 0, 0]
+            for paso, consultas, de_sesion, escrituras in self.medir(nombre, usuario, options['mensajes']):
+                totales = [totales[0] + consultas, totales[1] + de_sesion, totales[2] + escrituras]
+                self.stdout.write(f'{nombre:<16} {paso:<30} {consultas:>9} {de_sesion:>7} {escrituras:>18}')
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre:<16} {'total':<30} {totales[0]:>9} {totales[1]:>7} {totales[2]:>18}"
+            ))
+
+    def medir(self, nombre, usuario, mensajes):
+        # Caché privada: nada de lo que se deshace al final queda en la caché compartida
+        cache_privada = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{nombre}'}}
+        resultados = []
+        with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[nombre], CACHES=cache_privada,
+                               MESSAGE_STORAGE=ALMACENAMIENTOS_MENSAJES[mensajes], ALLOWED_HOSTS=['testserver']):
+            with transaction.atomic():
+                cliente = Client()
+                cliente.force_login(usuario)
+                # Primera visita para calentar cachés (permisos, sesión, listado)
+                cliente.get('/productos/')
+                for paso, metodo, url, datos in PASOS:
+                    with CaptureQueriesContext(connection) as capturadas:
+                        getattr(cliente, metodo)(url, datos)
+                    sql = [consulta['sql'] for consulta in capturadas.captured_queries]
+                    de_sesion = [texto for texto in sql if 'django_session' in texto]
+                    escrituras = [texto for texto in de_sesion if not texto.lstrip().upper().startswith('SELECT')]
+                    resultados.append((paso, len(sql), len(de_sesion), len(escrituras)))
+                transaction.set_rollback(True)
+        return resultados
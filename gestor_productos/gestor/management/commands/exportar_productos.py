@@ -0,0 +1,55 @@
+import codecs
+import io
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor.exportacion import FORMATOS, exportar
+
+
+def fecha(valor):
+    return date.fromisoformat(valor)
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo de productos en streaming (CSV o JSON Lines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+        parser.add_argument('--desde', type=fecha, help='Fecha de creación mínima (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=fecha, help='Fecha de creación máxima (AAAA-MM-DD)')
+        parser.add_argument('--salida', default='-', help='Archivo de salida (por defecto la salida estándar)')
+
+    def handle(self, *args, **options):
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError('La fecha "desde" no puede ser posterior a "hasta"')
+
+        bloques = exportar(options['formato'], options['gzip'], options['desde'], options['hasta'])
+        if options['salida'] == '-':
+            self.escribir_en_stdout(bloques, options['gzip'])
+            return
+
+        with open(options['salida'], 'wb') as salida:
+            for bloque in bloques:
+                salida.write(bloque)
+        self.stderr.write(self.style.SUCCESS(f'Catálogo exportado en {options["salida"]}'))
+
+    def escribir_en_stdout(self, bloques, comprimido):
+        # Por self.stdout (no sys.stdout) para que call_command(stdout=...) capture la salida
+        destino = self.stdout._out
+        if isinstance(destino, io.TextIOBase):
+            if hasattr(destino, 'buffer'):
+                destino.flush()
+                destino = destino.buffer
+            elif comprimido:
+                raise CommandError('--gzip necesita --salida o una salida binaria')
+            else:
+                decodificador = codecs.getincrementaldecoder('utf-8')()
+                for bloque in bloques:
+                    destino.write(decodificador.decode(bloque))
+                destino.write(decodificador.decode(b'', final=True))
+                return
+        for bloque in bloques:
+            destino.write(bloque)
+        destino.flush()
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor.importacion import FORMATOS, ArchivoInvalido, EscritorRechazos, detectar_formato, importar_productos
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un archivo CSV o JSON Lines por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo (columnas: nombre, descripcion, precio, stock)')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=None, help='Filas por transacción (IMPORTACION_TAMANO_LOTE)')
+        parser.add_argument('--actualizar', action='store_true', help='Actualizar los productos cuyo nombre ya existe')
+        parser.add_argument('--rechazos', help='Archivo CSV donde guardar las filas rechazadas')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or detectar_formato(options['archivo'])
+        inicio = time.monotonic()
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as texto:
+                if options['rechazos']:
+                    with open(options['rechazos'], 'w', encoding='utf-8', newline='') as salida:
+                        resultado = importar_productos(
+                            texto, formato, options['lote'], options['actualizar'], EscritorRechazos(salida)
+                        )
+                else:
+                    resultado = importar_productos(texto, formato, options['lote'], options['actualizar'])
+        except OSError as error:
+            raise CommandError(f'No se pudo abrir el archivo: {error}')
+        except ArchivoInvalido as error:
+            raise CommandError(str(error))
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.leidas} filas leídas en {duracion:.2f}s '
+            f'({resultado.leidas / max(duracion, 1e-6):.0f} filas/s): '
+            f'{resultado.creados} creados, {resultado.actualizados} actualizados, '
+            f'{resultado.rechazados} rechazados'
+        ))
+        if resultado.rechazados and not options['rechazos']:
+            for linea, error in resultado.errores[:10]:
+                self.stderr.write(f'  línea {linea}: {error}')
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import limites
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra los bloqueos vigentes y los contadores de intentos de login/registro. '
+        'Requiere una caché compartida (REDIS_URL): con la caché local cada proceso tiene la suya.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ip', help='Mostrar los contadores de una IP')
+        parser.add_argument('--usuario', help='Mostrar los contadores de un nombre de usuario')
+        parser.add_argument('--desbloquear', action='store_true', help='Borrar contadores y bloqueos de --ip / --usuario')
+
+    def handle(self, *args, **options):
+        consultas = []
+        if options['ip']:
+            consultas += [(ambito, options['ip']) for ambito in settings.LIMITES_INTENTOS if ambito.endswith('_ip')]
+        if options['usuario']:
+            consultas += [(ambito, options['usuario']) for ambito in settings.LIMITES_INTENTOS if ambito.endswith('_usuario')]
+        if options['desbloquear'] and not consultas:
+            raise CommandError('Indique --ip o --usuario para desbloquear')
+
+        if options['desbloquear']:
+            for ambito, valor in consultas:
+                limites.limpiar(ambito, valor)
+                self.stdout.write(self.style.SUCCESS(f'{ambito} {valor}: desbloqueado'))
+            return
+
+        for ambito, valor in consultas:
+            permitidos, ventana = limites.configuracion(ambito)
+            self.stdout.write(
+                f'{ambito} {valor}: {limites.contar(ambito, valor):.1f}/{permitidos} intentos en {ventana}s, '
+                f'bloqueo restante {limites.bloqueo_restante(ambito, valor)}s'
+            )
+
+        bloqueados = limites.bloqueados()
+        if not bloqueados:
+            self.stdout.write('No hay bloqueos vigentes')
+        for (ambito, valor), restante in sorted(bloqueados.items(), key=lambda item: -item[1]):
+            self.stdout.write(self.style.WARNING(f'{ambito:<15} {valor:<40} {restante}s'))
@@ -0,0 +1,123 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+
+from gestor import estadisticas, inventario
+from gestor.benchmark import percentil
+from gestor.models import Producto
+
+
+PREFIJO = 'Prueba de carga'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de lectores y escritores concurrentes sobre la base de datos '
+        'configurada. Usar con una base de prueba, por ejemplo: '
+        'DATABASE_URL=sqlite:////tmp/carga.sqlite3 (y SQLITE_AJUSTES=0 en otro archivo '
+        'para comparar con la configuración por defecto de SQLite).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lectores', type=int, default=8)
+        parser.add_argument('--escritores', type=int, default=4)
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--productos', type=int, default=100, help='Productos de trabajo que se crean y borran al final')
+
+    def handle(self, *args, **options):
+        self.mostrar_configuracion()
+        ids = self.crear_productos(options['productos'])
+        fin = time.monotonic() + options['segundos']
+        resultados = {'lectura': [], 'escritura': []}
+        errores = {'lectura': 0, 'escritura': 0}
+        bloqueo = threading.Lock()
+
+        def trabajador(tipo, numero):
+            tiempos = []
+            fallidas = 0
+            i = numero
+            try:
+                while time.monotonic() < fin:
+                    inicio = time.perf_counter()
+                    try:
+                        if tipo == 'lectura':
+                            self.leer()
+                        else:
+                            self.escribir(ids[i % len(ids)], i)
+                    except OperationalError:
+                        # "database is locked": el escritor no consiguió el bloqueo a tiempo
+                        fallidas += 1
+                    else:
+                        tiempos.append(time.perf_counter() - inicio)
+                    i += 1
+            finally:
+                connection.close()
+            with bloqueo:
+                resultados[tipo].extend(tiempos)
+                errores[tipo] += fallidas
+
+        hilos = [
+            threading.Thread(target=trabajador, args=('lectura', n)) for n in range(options['lectores'])
+        ] + [
+            threading.Thread(target=trabajador, args=('escritura', n)) for n in range(options['escritores'])
+        ]
+        comienzo = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.monotonic() - comienzo
+
+        close_old_connections()
+        self.borrar_productos()
+
+        self.stdout.write(f"\n{'operación':<10} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+        for tipo, tiempos in resultados.items():
+            self.stdout.write(
+                f'{tipo:<10} {len(tiempos) / duracion:>9.1f} {percentil(tiempos, 50) * 1000:>9.2f} '
+                f'{percentil(tiempos, 95) * 1000:>9.2f} {percentil(tiempos, 99) * 1000:>9.2f} {errores[tipo]:>8}'
+            )
+        if errores['escritura'] or errores['lectura']:
+            self.stdout.write(self.style.WARNING('Hubo operaciones rechazadas por bloqueo de la base de datos'))
+
+    def mostrar_configuracion(self):
+        self.stdout.write(f"Base de datos: {connection.vendor} {connection.settings_dict['NAME']}")
+        self.stdout.write(f"CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}, "
+                          f"transaction_mode={connection.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED')}")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                valores = []
+                for nombre in ('journal_mode', 'busy_timeout', 'synchronous', 'mmap_size', 'cache_size'):
+                    cursor.execute(f'PRAGMA {nombre}')
+                    valores.append(f'{nombre}={cursor.fetchone()[0]}')
+            self.stdout.write('PRAGMA: ' + ', '.join(valores))
+        self.stdout.write(f'Ajustes configurados: {settings.SQLITE_PRAGMAS or "ninguno"}')
+
+    def crear_productos(self, cantidad):
+        self.borrar_productos()
+        for numero in range(cantidad):
+            Producto.objects.create(
+                nombre=f'{PREFIJO} {numero}', descripcion='Producto de la prueba de carga', precio=1000, stock=100
+            )
+        return list(Producto.objects.filter(nombre__startswith=PREFIJO).values_list('id', flat=True))
+
+    def borrar_productos(self):
+        for producto in Producto.objects.filter(nombre__startswith=PREFIJO):
+            producto.delete()
+
+    def leer(self):
+        # Lo mismo que la primera página del listado y el panel de inicio
+        list(Producto.objects.only('id', 'nombre', 'resumen', 'fecha_creacion')[:settings.PRODUCTOS_POR_PAGINA])
+        estadisticas.obtener()
+
+    def escribir(self, producto_id, i):
+        # Alterna guardados completos (como ProductoUpdateView) y movimientos de stock
+        if i % 2:
+            producto = Producto.objects.get(pk=producto_id)
+            producto.descripcion = f'Producto de la prueba de carga ({i})'
+            producto.save()
+        else:
+            inventario.incrementar(producto_id, 1)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestor import estadisticas
+from gestor.models import EstadisticaCatalogo, Producto
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas del catálogo desde la tabla de productos y muestra las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-verificar', action='store_true', help='Informar diferencias sin corregirlas')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            actual = EstadisticaCatalogo.objects.select_for_update().filter(pk=estadisticas.PK).first()
+            real = estadisticas.agregados(Producto.objects.all())
+
+            diferencias = [
+                (campo, getattr(actual, campo) if actual else None, real[campo])
+                for campo in estadisticas.CAMPOS
+                if actual is None or getattr(actual, campo) != real[campo]
+            ]
+            for campo, guardado, calculado in diferencias:
+                self.stdout.write(f'  {campo}: guardado={guardado} real={calculado}')
+
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS('Las estadísticas están al día'))
+                return
+            if options['solo_verificar']:
+                self.stdout.write(self.style.WARNING(f'{len(diferencias)} diferencias encontradas'))
+                return
+            estadisticas.recalcular()
+        self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} diferencias corregidas'))
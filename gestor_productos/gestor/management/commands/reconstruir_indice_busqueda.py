@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gestor.busqueda import fts_disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo (FTS5) de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        conexion = connections[options['database']]
+        if not fts_disponible(conexion):
+            raise CommandError('El índice FTS5 solo está disponible con SQLite')
+        reconstruir_indice(conexion)
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda reconstruido'))
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gestor import tareas, trabajador
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas en segundo plano encoladas en la base de datos (importaciones, operaciones '
+        'masivas, archivo, reconciliación...) en un pool de procesos. SIGTERM o Ctrl+C dejan de tomar '
+        'tareas y esperan a que terminen las que están en curso. '
+        'Ejemplo: manage.py trabajador_tareas --procesos 4'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=settings.TAREAS_PROCESOS,
+            help='Tareas en paralelo (TAREAS_PROCESOS); 0 las ejecuta una a una en este proceso',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=settings.TAREAS_INTERVALO,
+            help='Segundos entre consultas a la cola cuando no hay tareas',
+        )
+        parser.add_argument('--tipo', action='append', choices=sorted(tareas.REGISTRO), help='Solo tareas de este tipo (repetible)')
+        parser.add_argument('--una-vez', action='store_true', help='Terminar cuando no queden tareas disponibles')
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 0:
+            raise CommandError('--procesos no puede ser negativo')
+        self.detenido = False
+        self.nombre = f'{socket.gethostname()}:{os.getpid()}'
+        anteriores = {senal: signal.signal(senal, self.detener) for senal in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(f'Trabajador {self.nombre}: {options["procesos"] or "sin"} procesos')
+        try:
+            if options['procesos'] == 0:
+                ejecutadas = self.en_linea(options)
+            else:
+                ejecutadas = self.con_pool(options)
+        finally:
+            for senal, manejador in anteriores.items():
+                signal.signal(senal, manejador)
+        self.stdout.write(self.style.SUCCESS(f'{ejecutadas} tareas ejecutadas'))
+
+    def detener(self, senal, frame):
+        if not self.detenido:
+            self.stdout.write('Deteniendo: se esperan las tareas en curso')
+        self.detenido = True
+
+    def reencolar(self):
+        vencidas = tareas.reencolar_vencidas()
+        if vencidas:
+            self.stderr.write(f'{vencidas} tareas sin latido vueltas a la cola')
+
+    def en_linea(self, options):
+        ejecutadas = 0
+        while not self.detenido:
+            self.reencolar()
+            ids = tareas.tomar(self.nombre, 1, options['tipo'])
+            if ids:
+                tareas.ejecutar(ids[0])
+                ejecutadas += 1
+            elif options['una_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
+        return ejecutadas
+
+    def nuevo_pool(self, procesos):
+        # El hijo (spawn) abre sus propias conexiones; las del padre no se heredan
+        connections.close_all()
+        return ProcessPoolExecutor(
+            procesos, mp_context=multiprocessing.get_context('spawn'), initializer=trabajador.inicializar,
+        )
+
+    def con_pool(self, options):
+        procesos = options['procesos']
+        # Las tareas que corren sin avisar progreso no deben parecer abandonadas
+        cada_latido = max(settings.TAREAS_LATIDO_VENCIDO / 5, options['intervalo'])
+        ultimo_latido = time.monotonic()
+        en_curso = {}
+        ejecutadas = 0
+        pool = self.nuevo_pool(procesos)
+        roto = False
+        try:
+            while True:
+                for futuro in [futuro for futuro in en_curso if futuro.done()]:
+                    tarea_id = en_curso.pop(futuro)
+                    ejecutadas += 1
+                    error = futuro.exception()
+                    if error is not None:
+                        # El proceso murió (memoria, señal): ejecutar() no llegó a registrar nada
+                        roto = roto or isinstance(error, BrokenProcessPool)
+                        self.stderr.write(f'Tarea #{tarea_id}: el proceso terminó de forma anormal ({error!r})')
+                        tareas.fallo_externo(tarea_id, repr(error))
+                if roto and not en_curso:
+                    pool.shutdown(wait=True)
+                    pool = self.nuevo_pool(procesos)
+                    roto = False
+
+                if en_curso and time.monotonic() - ultimo_latido >= cada_latido:
+                    tareas.latido(list(en_curso.values()))
+                    ultimo_latido = time.monotonic()
+
+                if self.detenido:
+                    if not en_curso:
+                        break
+                    wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                    continue
+
+                ids = []
+                libres = procesos - len(en_curso)
+                if libres and not roto:
+                    self.reencolar()
+                    ids = tareas.tomar(self.nombre, libres, options['tipo'])
+                for tarea_id in ids:
+                    en_curso[pool.submit(trabajador.ejecutar, tarea_id)] = tarea_id
+                if options['una_vez'] and not ids and not en_curso:
+                    break
+
+                if en_curso:
+                    wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(options['intervalo'])
+        finally:
+            pool.shutdown(wait=True)
+        return ejecutadas
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Max, Min, Sum, Value
+from django.db.models.expressions import Col, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest, Now, Round
+from django.db.models.lookups import Exact
+
+from . import estadisticas
+from .models import Producto
+
+
+# Operaciones masivas sobre productos (acciones del admin y ProductoMasivoView)
+#
+# Cada operación es un único UPDATE o DELETE sobre el queryset filtrado, en
+# una transacción, sin leer ni guardar fila por fila. Las estadísticas del
+# catálogo se ajustan en bloque con estadisticas.seguimiento o, si el filtro
+# depende de la columna que se modifica (p. ej. "precio < 1000" al subir
+# precios), con un recálculo completo. La vista previa calcula lo mismo con
+# agregados, sin modificar nada.
+
+# Redondeo de precios en pesos chilenos (sin decimales): múltiplo al que se redondea
+REDONDEOS = {
+    1: 'Al peso',
+    10: 'A la decena',
+    100: 'A la centena',
+    1000: 'Al millar',
+}
+
+# Filas de ejemplo que muestra la vista previa
+MUESTRA_VISTA_PREVIA = 10
+
+
+def _decimal(expresion):
+    return ExpressionWrapper(expresion, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def expresion_precio(porcentaje=0, monto=0, redondeo=1):
+    """
+    Nuevo precio: precio * (1 + porcentaje/100) + monto, redondeado al
+    múltiplo de `redondeo` más cercano (mitades hacia arriba) y nunca menor
+    que `redondeo` (el precio debe ser positivo).
+    """
+    factor = Decimal(1) + Decimal(porcentaje) / 100
+    nuevo = _decimal(F('precio') * Value(factor) + Value(Decimal(monto)))
+    paso = Value(Decimal(redondeo))
+    redondeado = _decimal(Round(_decimal(nuevo / paso)) * paso)
+    return Greatest(redondeado, paso, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def expresion_stock(fijar=None, ajuste=0):
+    """Stock fijo o stock + ajuste; un ajuste negativo nunca deja el stock bajo cero"""
+    if fijar is not None:
+        return Value(int(fijar), output_field=IntegerField())
+    return Greatest(F('stock') + Value(int(ajuste)), Value(0), output_field=IntegerField())
+
+
+def columnas_filtradas(queryset):
+    """Columnas de Producto que aparecen en el WHERE del queryset"""
+    columnas = set()
+    pendientes = [queryset.query.where]
+    while pendientes:
+        nodo = pendientes.pop()
+        if isinstance(nodo, Col):
+            columnas.add(nodo.target.attname)
+            continue
+        pendientes.extend(getattr(nodo, 'children', ()))
+        if hasattr(nodo, 'get_source_expressions'):
+            pendientes.extend(e for e in nodo.get_source_expressions() if e is not None)
+        # Lookups: lhs/rhs pueden ser expresiones
+        for lado in ('lhs', 'rhs'):
+            valor = getattr(nodo, lado, None)
+            if hasattr(valor, 'resolve_expression'):
+                pendientes.append(valor)
+    return columnas
+
+
+@contextmanager
+def _seguimiento(queryset, modificadas):
+    """Ajusta las estadísticas en bloque (o las recalcula si el filtro usa lo que cambia)"""
+    if columnas_filtradas(queryset) & set(modificadas):
+        yield
+        estadisticas.recalcular()
+    else:
+        with estadisticas.seguimiento(queryset):
+            yield
+
+
+def actualizar(queryset, cambios):
+    """
+    Aplica `cambios` ({'precio': expresión} y/o {'stock': expresión}) con un
+    solo UPDATE. Devuelve la cantidad de productos modificados.
+    """
+    queryset = queryset.order_by()
+    with transaction.atomic():
+        with _seguimiento(queryset, cambios):
+            return queryset.update(**cambios, fecha_actualizacion=Now())
+
+
+def borrar(queryset):
+    """
+    Borra con un solo DELETE. Sin pasar por el Collector de Django: no hay
+    modelos que apunten a Producto, y las señales por fila harían un UPDATE
+    de estadísticas por producto (aquí se ajustan una vez). Los triggers de
+    la base mantienen el índice de búsqueda.
+    """
+    assert not Producto._meta.related_objects, 'Producto tiene relaciones: usar queryset.delete()'
+    queryset = queryset.order_by()
+    with transaction.atomic():
+        with estadisticas.seguimiento(queryset):
+            return queryset._raw_delete(queryset.db)
+
+
+def aplicar(queryset, cambios):
+    """Actualiza con `cambios` o, si es None, borra la selección"""
+    if cambios is None:
+        return borrar(queryset)
+    return actualizar(queryset, cambios)
+
+
+def vista_previa(queryset, cambios=None):
+    """
+    Lo que haría la operación, sin modificar nada: totales actuales de la
+    selección, totales después del cambio y una muestra de filas con sus
+    valores nuevos. `cambios` None significa borrar.
+    """
+    queryset = queryset.order_by()
+    resumen = {'antes': estadisticas.agregados(queryset), 'despues': None}
+    precio = (cambios or {}).get('precio', F('precio'))
+    stock = (cambios or {}).get('stock', F('stock'))
+    if cambios:
+        despues = queryset.aggregate(
+            total_unidades=Coalesce(Sum(stock), 0),
+            valor_inventario=Coalesce(
+                Sum(_decimal(precio * stock)), Decimal(0), output_field=DecimalField(max_digits=20, decimal_places=2)
+            ),
+            precio_minimo=Min(precio),
+            precio_maximo=Max(precio),
+            productos_sin_stock=Count('id', filter=Exact(stock, Value(0))),
+        )
+        despues['valor_inventario'] = Decimal(despues['valor_inventario'])
+        resumen['despues'] = despues
+
+    resumen['muestra'] = list(
+        queryset.order_by('-fecha_creacion', '-id')
+        .annotate(nuevo_precio=precio, nuevo_stock=stock)
+        .values('id', 'nombre', 'precio', 'stock', 'nuevo_precio', 'nuevo_stock')[:MUESTRA_VISTA_PREVIA]
+    )
+    return resumen
@@ -0,0 +1,224 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+
+# Instrumentación por petición
+#
+# MetricasMiddleware abre una medición por petición (ContextVar, como el
+# router de réplicas) y al terminar la vuelca en:
+# - la cabecera Server-Timing (db, plantillas y total);
+# - el log "gestor.metricas" si la petición superó METRICAS_UMBRAL_LENTO_MS,
+#   con sus consultas más lentas;
+# - los histogramas por ruta que se sirven en formato Prometheus.
+#
+# El tiempo de SQL lo mide un execute_wrapper que se instala una vez en cada
+# conexión (receptor de connection_created) y que, sin medición abierta, solo
+# consulta la ContextVar. El de plantillas lo mide el backend
+# DjangoTemplatesMedidas. Los histogramas viven en memoria de cada proceso:
+# con varios workers, cada uno expone los suyos.
+
+logger = logging.getLogger('gestor.metricas')
+
+# Estado de la petición en curso. Es un dict mutable para que lo medido
+# dentro de sync_to_async (otro contexto) también se sume.
+_medicion = ContextVar('gestor_medicion', default=None)
+
+
+def iniciar():
+    """Abre la medición de una petición; devuelve el token para cerrarla"""
+    return _medicion.set({
+        'inicio': time.perf_counter(),
+        'consultas': 0,
+        'sql': 0.0,
+        'plantillas': 0.0,
+        'anidadas': 0,
+        # Montículo de (segundos, sql) con las consultas más lentas
+        'lentas': [],
+    })
+
+
+def terminar(token):
+    """Cierra la medición y la devuelve con el tiempo total"""
+    medicion = _medicion.get()
+    _medicion.reset(token)
+    medicion['total'] = time.perf_counter() - medicion['inicio']
+    return medicion
+
+
+# SQL
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper: cuenta y cronometra la consulta si hay medición abierta"""
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        medicion['consultas'] += 1
+        medicion['sql'] += duracion
+        # Se guarda solo el texto de las N más lentas; los parámetros no (pueden ser datos personales)
+        lentas = medicion['lentas']
+        if len(lentas) < settings.METRICAS_CONSULTAS_LENTAS:
+            heapq.heappush(lentas, (duracion, sql))
+        elif lentas and duracion > lentas[0][0]:
+            heapq.heapreplace(lentas, (duracion, sql))
+
+
+def instalar_en_conexion(sender, connection, **kwargs):
+    """Receptor de connection_created: agrega medir_consulta una sola vez por conexión"""
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+# Plantillas
+
+@contextmanager
+def medir_plantilla():
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    # Una plantilla renderizada dentro de otra ya está dentro del tiempo de la externa
+    medicion['anidadas'] += 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion['anidadas'] -= 1
+        if not medicion['anidadas']:
+            medicion['plantillas'] += time.perf_counter() - inicio
+
+
+class PlantillaMedida:
+    """Envuelve una plantilla del backend y mide su render"""
+
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        with medir_plantilla():
+            return self.plantilla.render(context, request)
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    """Backend de plantillas de Django que mide el tiempo de render (ver TEMPLATES)"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name))
+
+
+# Respuesta: Server-Timing y log de peticiones lentas
+
+def server_timing(medicion):
+    return ', '.join([
+        f'db;dur={medicion["sql"] * 1000:.1f};desc="{medicion["consultas"]} consultas"',
+        f'tpl;dur={medicion["plantillas"] * 1000:.1f}',
+        f'total;dur={medicion["total"] * 1000:.1f}',
+    ])
+
+
+def registrar_lenta(request, ruta, estado, medicion):
+    lentas = sorted(medicion['lentas'], reverse=True)
+    logger.warning(
+        'Petición lenta: %s %s (%s) %s en %.0f ms; %d consultas en %.0f ms, plantillas %.0f ms%s',
+        request.method, request.path, ruta, estado, medicion['total'] * 1000,
+        medicion['consultas'], medicion['sql'] * 1000, medicion['plantillas'] * 1000,
+        ''.join(f'\n  {duracion * 1000:.1f} ms: {sql[:500]}' for duracion, sql in lentas),
+    )
+
+
+# Histogramas por ruta (formato de texto de Prometheus)
+
+class Registro:
+    """Histogramas de duración y totales de SQL/plantillas por (ruta, método, estado)"""
+
+    def __init__(self, limites):
+        self.limites = tuple(sorted(limites))
+        self.bloqueo = threading.Lock()
+        self.series = {}
+
+    def observar(self, ruta, metodo, estado, medicion):
+        clave = (ruta, metodo, str(estado))
+        with self.bloqueo:
+            serie = self.series.get(clave)
+            if serie is None:
+                serie = self.series[clave] = {
+                    # Un contador por límite más el de +Inf; se acumulan al exportar
+                    'buckets': [0] * (len(self.limites) + 1),
+                    'cantidad': 0, 'segundos': 0.0, 'consultas': 0, 'sql': 0.0, 'plantillas': 0.0,
+                }
+            serie['buckets'][bisect_left(self.limites, medicion['total'])] += 1
+            serie['cantidad'] += 1
+            serie['segundos'] += medicion['total']
+            serie['consultas'] += medicion['consultas']
+            serie['sql'] += medicion['sql']
+            serie['plantillas'] += medicion['plantillas']
+
+    def limpiar(self):
+        with self.bloqueo:
+            self.series.clear()
+
+    def prometheus(self):
+        with self.bloqueo:
+            series = {clave: {**serie, 'buckets': list(serie['buckets'])} for clave, serie in self.series.items()}
+
+        lineas = [
+            '# HELP gestor_peticion_segundos Duración de las peticiones por ruta',
+            '# TYPE gestor_peticion_segundos histogram',
+        ]
+        for clave, serie in sorted(series.items()):
+            etiquetas = _etiquetas(clave)
+            acumulado = 0
+            for limite, cantidad in zip((*self.limites, '+Inf'), serie['buckets']):
+                acumulado += cantidad
+                lineas.append(f'gestor_peticion_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'gestor_peticion_segundos_sum{{{etiquetas}}} {serie["segundos"]:.6f}')
+            lineas.append(f'gestor_peticion_segundos_count{{{etiquetas}}} {serie["cantidad"]}')
+
+        for nombre, campo, descripcion in (
+            ('gestor_consultas_sql_total', 'consultas', 'Consultas SQL ejecutadas'),
+            ('gestor_sql_segundos_total', 'sql', 'Tiempo total en la base de datos'),
+            ('gestor_plantillas_segundos_total', 'plantillas', 'Tiempo total de render de plantillas'),
+        ):
+            lineas += [f'# HELP {nombre} {descripcion}', f'# TYPE {nombre} counter']
+            for clave, serie in sorted(series.items()):
+                valor = serie[campo]
+                lineas.append(f'{nombre}{{{_etiquetas(clave)}}} {valor if isinstance(valor, int) else f"{valor:.6f}"}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(clave):
+    ruta, metodo, estado = clave
+    return f'ruta="{_escapar(ruta)}",metodo="{_escapar(metodo)}",estado="{estado}"'
+
+
+registro = Registro(settings.METRICAS_BUCKETS)
+
+
+def ruta_de(request):
+    """Patrón de la URL (no la URL concreta, para no crear una serie por id)"""
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return '/' + coincidencia.route if coincidencia.route else coincidencia.view_name
@@ -0,0 +1,131 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import auditoria, metricas, routers
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    "Leer lo propio" con réplicas: si la petición escribió en el catálogo, se
+    deja una cookie que durante REPLICA_PIN_SEGUNDOS manda las lecturas de ese
+    cliente a la primaria, así no ve datos anteriores a su propio cambio
+    mientras la réplica se pone al día. Las peticiones que no son GET/HEAD
+    leen siempre de la primaria.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    COOKIE = 'gestor_primaria'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def usar_primaria(self, request):
+        return request.method not in ('GET', 'HEAD') or self.COOKIE in request.COOKIES
+
+    def procesar_respuesta(self, response, escribio):
+        if escribio and settings.DATABASE_REPLICAS and settings.REPLICA_PIN_SEGUNDOS:
+            response.set_cookie(self.COOKIE, '1', max_age=settings.REPLICA_PIN_SEGUNDOS, httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.iniciar_peticion(self.usar_primaria(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            escribio = routers.terminar_peticion(token)
+        return self.procesar_respuesta(response, escribio)
+
+    async def __acall__(self, request):
+        token = routers.iniciar_peticion(self.usar_primaria(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            escribio = routers.terminar_peticion(token)
+        return self.procesar_respuesta(response, escribio)
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición (SQL, plantillas, total; ver gestor/metricas.py):
+    agrega Server-Timing, registra las lentas y alimenta los histogramas
+    por ruta. Va primero en MIDDLEWARE para que el total incluya al resto.
+    En respuestas en streaming el total no incluye el envío del cuerpo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.METRICAS_ACTIVAS:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def procesar_respuesta(self, request, response, medicion):
+        ruta = metricas.ruta_de(request)
+        metricas.registro.observar(ruta, request.method, response.status_code, medicion)
+        if settings.METRICAS_SERVER_TIMING:
+            response['Server-Timing'] = metricas.server_timing(medicion)
+        if medicion['total'] * 1000 >= settings.METRICAS_UMBRAL_LENTO_MS:
+            metricas.registrar_lenta(request, ruta, response.status_code, medicion)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = metricas.iniciar()
+        try:
+            response = self.get_response(request)
+        finally:
+            medicion = metricas.terminar(token)
+        return self.procesar_respuesta(request, response, medicion)
+
+    async def __acall__(self, request):
+        token = metricas.iniciar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            medicion = metricas.terminar(token)
+        return self.procesar_respuesta(request, response, medicion)
+
+
+class AuditoriaMiddleware:
+    """
+    Deja el usuario y el origen de la petición a mano de la auditoría de
+    productos (gestor/auditoria.py). Va después de AuthenticationMiddleware;
+    request.user se evalúa solo si la petición cambia algún producto.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.AUDITORIA_ACTIVA:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = auditoria.iniciar(request.user, auditoria.origen_de(request.path))
+        try:
+            return self.get_response(request)
+        finally:
+            auditoria.terminar(token)
+
+    async def __acall__(self, request):
+        token = auditoria.iniciar(request.user, auditoria.origen_de(request.path))
+        try:
+            return await self.get_response(request)
+        finally:
+            auditoria.terminar(token)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:37
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def calcular_resumenes(apps, schema_editor):
+    """Precalcula el resumen de los productos existentes por lotes"""
+    Producto = apps.get_model('gestor', 'Producto')
+    lote = []
+    for producto in Producto.objects.only('id', 'descripcion').iterator(chunk_size=2000):
+        producto.resumen = Truncator(producto.descripcion or '').words(20)[:500]
+        lote.append(producto)
+        if len(lote) >= 2000:
+            Producto.objects.bulk_update(lote, ['resumen'])
+            lote = []
+    if lote:
+        Producto.objects.bulk_update(lote, ['resumen'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='producto',
+            options={'ordering': ['-fecha_creacion', '-id'], 'permissions': [('can_view_products_section', 'Puede ver la sección de productos')], 'verbose_name': 'Producto', 'verbose_name_plural': 'Productos'},
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='resumen',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='Resumen'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='producto_fecha_id_idx'),
+        ),
+        migrations.RunPython(calcular_resumenes, migrations.RunPython.noop),
+    ]
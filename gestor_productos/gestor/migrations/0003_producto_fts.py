@@ -0,0 +1,63 @@
+from django.db import migrations
+
+
+TABLA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS gestor_producto_fts USING fts5(
+    nombre, descripcion,
+    content='gestor_producto', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_ai AFTER INSERT ON gestor_producto BEGIN
+        INSERT INTO gestor_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_ad AFTER DELETE ON gestor_producto BEGIN
+        INSERT INTO gestor_producto_fts(gestor_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS gestor_producto_fts_au AFTER UPDATE OF nombre, descripcion ON gestor_producto BEGIN
+        INSERT INTO gestor_producto_fts(gestor_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO gestor_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+
+def crear_indice_fts(apps, schema_editor):
+    """Tabla FTS5 + triggers de sincronización (solo SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(TABLA)
+    for sql in TRIGGERS:
+        schema_editor.execute(sql)
+    # Indexar los productos que ya existen
+    schema_editor.execute("INSERT INTO gestor_producto_fts(gestor_producto_fts) VALUES ('rebuild')")
+
+
+def eliminar_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('gestor_producto_fts_ai', 'gestor_producto_fts_ad', 'gestor_producto_fts_au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    schema_editor.execute("DROP TABLE IF EXISTS gestor_producto_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0002_producto_resumen_indice'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fts, eliminar_indice_fts),
+    ]
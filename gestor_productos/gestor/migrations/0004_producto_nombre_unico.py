@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:43
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def verificar_duplicados(apps, schema_editor):
+    """Falla con un mensaje claro si ya hay nombres repetidos (sin distinguir mayúsculas)"""
+    Producto = apps.get_model('gestor', 'Producto')
+    duplicados = list(
+        Producto.objects.values(nombre_lower=Lower('nombre'))
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('nombre_lower', flat=True)[:20]
+    )
+    if duplicados:
+        raise RuntimeError(
+            'Hay productos con el mismo nombre; corríjalos antes de migrar: ' + ', '.join(duplicados)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0003_producto_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('nombre'), name='producto_nombre_ci_unico', violation_error_message='Ya existe un producto con ese nombre'),
+        ),
+    ]
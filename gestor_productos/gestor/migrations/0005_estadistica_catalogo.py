@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:44
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+
+def calcular_estadisticas(apps, schema_editor):
+    """Crea la fila de agregados a partir de los productos existentes"""
+    Producto = apps.get_model('gestor', 'Producto')
+    EstadisticaCatalogo = apps.get_model('gestor', 'EstadisticaCatalogo')
+    valor = ExpressionWrapper(F('precio') * F('stock'), output_field=DecimalField(max_digits=20, decimal_places=2))
+    totales = Producto.objects.order_by().aggregate(
+        total_productos=Count('id'),
+        total_unidades=Sum('stock'),
+        valor_inventario=Sum(valor),
+        productos_sin_stock=Count('id', filter=Q(stock=0)),
+        productos_stock_bajo=Count('id', filter=~Q(stock=0) & Q(stock__lt=10)),
+        productos_disponibles=Count('id', filter=Q(stock__gte=10)),
+    )
+    totales['total_unidades'] = totales['total_unidades'] or 0
+    totales['valor_inventario'] = Decimal(totales['valor_inventario'] or 0)
+    EstadisticaCatalogo.objects.create(pk=1, fecha_actualizacion=timezone.now(), **totales)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0004_producto_nombre_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_productos', models.BigIntegerField(default=0, verbose_name='Productos')),
+                ('total_unidades', models.BigIntegerField(default=0, verbose_name='Unidades en stock')),
+                ('valor_inventario', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Valor del inventario')),
+                ('productos_sin_stock', models.BigIntegerField(default=0, verbose_name='Sin stock')),
+                ('productos_stock_bajo', models.BigIntegerField(default=0, verbose_name='Stock bajo')),
+                ('productos_disponibles', models.BigIntegerField(default=0, verbose_name='Disponibles')),
+                ('fecha_actualizacion', models.DateTimeField(blank=True, null=True, verbose_name='Última actualización')),
+            ],
+            options={
+                'verbose_name': 'Estadística del catálogo',
+                'verbose_name_plural': 'Estadísticas del catálogo',
+            },
+        ),
+        migrations.RunPython(calcular_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0005_estadistica_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['stock'], name='producto_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copiar_fecha_creacion(apps, schema_editor):
+    """Los productos existentes no tienen historia: se toma su fecha de creación"""
+    Producto = apps.get_model('gestor', 'Producto')
+    Producto.objects.update(fecha_actualizacion=F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0006_producto_stock_indice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadisticacatalogo',
+            name='version',
+            field=models.BigIntegerField(default=0, verbose_name='Versión'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última modificación'),
+        ),
+        migrations.RunPython(copiar_fecha_creacion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:09
+
+import django.db.models.functions.text
+import gestor.models
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def verificar_duplicados(apps, schema_editor):
+    """Falla con un mensaje claro si ya hay emails repetidos (sin distinguir mayúsculas)"""
+    CustomUser = apps.get_model('gestor', 'CustomUser')
+    duplicados = list(
+        CustomUser.objects.exclude(email='')
+        .values(email_lower=Lower('email'))
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('email_lower', flat=True)[:20]
+    )
+    if duplicados:
+        raise RuntimeError(
+            'Hay usuarios con el mismo email; corríjalos antes de migrar: ' + ', '.join(duplicados)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('gestor', '0007_producto_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', gestor.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='usuario_email_ci_unico', violation_error_message='Este correo electrónico ya está registrado'),
+        ),
+    ]
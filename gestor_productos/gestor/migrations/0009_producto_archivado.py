@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:41
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0008_usuario_email_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Id del producto')),
+                ('nombre', models.CharField(max_length=200, verbose_name='Nombre')),
+                ('descripcion', models.TextField(verbose_name='Descripción')),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('fecha_creacion', models.DateTimeField(verbose_name='Fecha de creación')),
+                ('fecha_actualizacion', models.DateTimeField(verbose_name='Última modificación')),
+                ('resumen', models.CharField(blank=True, default='', max_length=500, verbose_name='Resumen')),
+                ('descontinuado', models.BooleanField(default=False, verbose_name='Descontinuado')),
+                ('fecha_archivado', models.DateTimeField(verbose_name='Fecha de archivo')),
+                ('motivo', models.CharField(choices=[('descontinuado', 'Descontinuado'), ('sin_stock', 'Sin stock'), ('sin_cambios', 'Sin cambios'), ('manual', 'Archivado manualmente')], max_length=20, verbose_name='Motivo')),
+            ],
+            options={
+                'verbose_name': 'Producto archivado',
+                'verbose_name_plural': 'Productos archivados',
+                'ordering': ['-fecha_archivado', '-id'],
+                'permissions': [('restore_productoarchivado', 'Puede restaurar productos archivados')],
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='descontinuado',
+            field=models.BooleanField(db_default=False, default=False, verbose_name='Descontinuado'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_actualizacion'], name='producto_actualizacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('descontinuado', True)), fields=['id'], name='producto_descontinuado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoarchivado',
+            index=models.Index(fields=['-fecha_archivado', '-id'], name='archivado_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoarchivado',
+            index=models.Index(django.db.models.functions.text.Lower('nombre'), name='archivado_nombre_ci_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0009_producto_archivado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha')),
+                ('accion', models.CharField(choices=[('crear', 'Creación'), ('modificar', 'Modificación'), ('borrar', 'Borrado'), ('masiva', 'Operación masiva')], max_length=10, verbose_name='Acción')),
+                ('producto_id', models.BigIntegerField(blank=True, null=True, verbose_name='Id del producto')),
+                ('producto_nombre', models.CharField(blank=True, max_length=200, verbose_name='Producto')),
+                ('usuario_nombre', models.CharField(blank=True, max_length=150, verbose_name='Nombre de usuario')),
+                ('origen', models.CharField(blank=True, max_length=20, verbose_name='Origen')),
+                ('cambios', models.JSONField(default=dict, verbose_name='Cambios')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de auditoría',
+                'verbose_name_plural': 'Auditoría de productos',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['-fecha', '-id'], name='auditoria_fecha_id_idx'), models.Index(fields=['producto_id', '-fecha'], name='auditoria_producto_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
 from django.utils.decorators import method_decorator
-from django.views.generic import TemplateView
+from django.http import JsonResponse
+from django.views.generic import TemplateView, View
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 
@@ -26,4 +29,81 @@ class ProtectedTemplateView(CustomLoginRequiredMixin, TemplateView):
 
 class PermissionProtectedTemplateView(CustomLoginRequiredMixin, CustomPermissionRequiredMixin, TemplateView):
     """Vista base protegida que requiere autenticación y permisos específicos"""
-    pass
\ No newline at end of file
+    pass
+
+
+# Equivalentes asíncronos
+#
+# Las vistas async no pueden tocar request.user (se resuelve con una consulta
+# síncrona): el usuario se obtiene con request.auser() y los permisos con
+# ahas_perm(). El usuario resuelto se deja en request.user para que las
+# plantillas y context processors no vuelvan a la base de datos.
+
+class AsyncLoginRequiredMixin:
+    """Versión async de CustomLoginRequiredMixin"""
+    login_url = '/login/'
+    redirect_field_name = 'next'
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.login_url, self.redirect_field_name)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncPermissionRequiredMixin:
+    """Versión async de CustomPermissionRequiredMixin (403 si falta el permiso)"""
+    permission_required = None
+
+    def get_permission_required(self):
+        if isinstance(self.permission_required, str):
+            return (self.permission_required,)
+        return self.permission_required or ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not await user.ahas_perms(self.get_permission_required()):
+            raise PermissionDenied
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncPermissionProtectedTemplateView(AsyncLoginRequiredMixin, AsyncPermissionRequiredMixin, TemplateView):
+    """Vista base async que requiere autenticación y permisos específicos"""
+    pass
+
+
+class ApiPermissionRequiredMixin:
+    """
+    Mixin para la API JSON (async): cada método HTTP exige su permiso y los
+    errores de acceso se responden en JSON (401 sin sesión, 403 sin permiso)
+    en lugar de redirigir al login.
+    """
+    permisos_por_metodo = {
+        'GET': 'gestor.view_producto',
+        'HEAD': 'gestor.view_producto',
+        'POST': 'gestor.add_producto',
+        'PUT': 'gestor.change_producto',
+        'PATCH': 'gestor.change_producto',
+        'DELETE': 'gestor.delete_producto',
+    }
+
+    async def precargar(self, request, *args, **kwargs):
+        """
+        Carga de forma asíncrona lo que necesiten las funciones de ETag y
+        Last-Modified de @condition, que se llaman de forma síncrona
+        """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+        permiso = self.permisos_por_metodo.get(request.method)
+        if permiso and not await request.user.ahas_perm(permiso):
+            return JsonResponse({'error': 'No tienes permiso para esta operación'}, status=403)
+        await self.precargar(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ApiView(ApiPermissionRequiredMixin, View):
+    """Vista base de la API JSON"""
+    pass
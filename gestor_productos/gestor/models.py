@@ -1,5 +1,59 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Lower
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.utils.text import Truncator
+
+# Cantidad de palabras del resumen que se muestra en el listado
+RESUMEN_PALABRAS = 20
+
+# Campos de Producto cuyos cambios quedan en la auditoría (gestor/auditoria.py)
+CAMPOS_AUDITADOS = ('nombre', 'descripcion', 'precio', 'stock', 'descontinuado')
+
+# Bajo este stock un producto se considera con "stock bajo"
+STOCK_BAJO_UMBRAL = 10
+
+# Estados de stock (el orden numérico permite ordenar por estado)
+ESTADO_SIN_STOCK = 0
+ESTADO_STOCK_BAJO = 1
+ESTADO_DISPONIBLE = 2
+ESTADOS_STOCK = {
+    ESTADO_SIN_STOCK: '🔴 Sin stock',
+    ESTADO_STOCK_BAJO: '🟡 Stock bajo',
+    ESTADO_DISPONIBLE: '🟢 Disponible',
+}
+
+
+def filtro_estado_stock(estado):
+    """Predicado sobre stock (usa el índice de stock) para un estado dado"""
+    if estado == ESTADO_SIN_STOCK:
+        return Q(stock=0)
+    if estado == ESTADO_STOCK_BAJO:
+        return Q(stock__lt=STOCK_BAJO_UMBRAL) & ~Q(stock=0)
+    return Q(stock__gte=STOCK_BAJO_UMBRAL)
+
+
+class ProductoQuerySet(models.QuerySet):
+
+    def nombre_igual(self, nombre):
+        """
+        Productos cuyo nombre coincide sin distinguir mayúsculas.
+        Compara LOWER(nombre) = LOWER(valor) para usar el índice único funcional.
+        """
+        return self.alias(nombre_lower=Lower('nombre')).filter(nombre_lower=Lower(Value(nombre)))
+
+    def con_estado_stock(self):
+        """Anota `estado_stock` (ESTADO_*) calculado por la base de datos con CASE/WHEN"""
+        return self.annotate(estado_stock=Case(
+            When(stock=0, then=Value(ESTADO_SIN_STOCK)),
+            When(stock__lt=STOCK_BAJO_UMBRAL, then=Value(ESTADO_STOCK_BAJO)),
+            default=Value(ESTADO_DISPONIBLE),
+            output_field=models.IntegerField(),
+        ))
+
+    def estado_stock(self, estado):
+        return self.filter(filtro_estado_stock(estado))
+
 
 class Producto(models.Model):
     nombre = models.CharField(max_length=200, verbose_name="Nombre")
@@ -7,22 +61,160 @@ class Producto(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Precio")
     stock = models.IntegerField(verbose_name="Stock")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última modificación")
+    resumen = models.CharField(max_length=500, blank=True, default='', editable=False, verbose_name="Resumen")
+    # Marcado para pasar al archivo (ver gestor/archivo.py); db_default para las cargas con SQL directo
+    descontinuado = models.BooleanField(default=False, db_default=False, verbose_name="Descontinuado")
+
+    objects = ProductoQuerySet.as_manager()
     
     def __str__(self):
         return self.nombre
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores con los que se leyó, para calcular la variación de las estadísticas
+        if 'precio' in field_names and 'stock' in field_names:
+            instance._estado_original = (instance.precio, instance.stock)
+        # Y de los campos auditados, para registrar solo lo que cambió
+        instance._auditoria_original = {campo: instance.__dict__[campo] for campo in CAMPOS_AUDITADOS if campo in field_names}
+        return instance
+
+    @staticmethod
+    def generar_resumen(descripcion):
+        """Extracto de la descripción que se guarda precalculado para el listado"""
+        return Truncator(descripcion or '').words(RESUMEN_PALABRAS)[:500]
+
+    def save(self, *args, **kwargs):
+        # Mantener el resumen sincronizado con la descripción
+        self.resumen = self.generar_resumen(self.descripcion)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'descripcion' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'resumen'}
+        # Las estadísticas del catálogo se actualizan en post_save, dentro de la misma transacción
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            self._estado_original = (self.precio, self.stock)
     
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
-        ordering = ['-fecha_creacion']
+        # El id desempata productos creados en el mismo instante (paginación por cursor)
+        ordering = ['-fecha_creacion', '-id']
+        indexes = [
+            models.Index(fields=['-fecha_creacion', '-id'], name='producto_fecha_id_idx'),
+            # Filtros por estado de stock (sin stock / bajo / disponible)
+            models.Index(fields=['stock'], name='producto_stock_idx'),
+            # Selección por lotes de productos sin cambios para archivar
+            models.Index(fields=['fecha_actualizacion'], name='producto_actualizacion_idx'),
+            # Índice parcial: solo los descontinuados, que son pocos
+            models.Index(fields=['id'], condition=Q(descontinuado=True), name='producto_descontinuado_idx'),
+        ]
+        constraints = [
+            # Unicidad sin distinguir mayúsculas garantizada por la base de datos
+            models.UniqueConstraint(
+                Lower('nombre'),
+                name='producto_nombre_ci_unico',
+                violation_error_message='Ya existe un producto con ese nombre',
+            ),
+        ]
         permissions = [
             ("can_view_products_section", "Puede ver la sección de productos"),
         ]
 
 
+# Motivos por los que un producto pasa al archivo
+MOTIVOS_ARCHIVO = {
+    'descontinuado': 'Descontinuado',
+    'sin_stock': 'Sin stock',
+    'sin_cambios': 'Sin cambios',
+    'manual': 'Archivado manualmente',
+}
+
+
+class ProductoArchivado(models.Model):
+    """
+    Productos retirados de gestor_producto (la tabla "caliente" que leen el
+    listado, el admin y la API). Conserva la fila completa con el mismo id
+    para poder restaurarla; no tiene claves foráneas hacia Producto.
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name="Id del producto")
+    nombre = models.CharField(max_length=200, verbose_name="Nombre")
+    descripcion = models.TextField(verbose_name="Descripción")
+    precio = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Precio")
+    stock = models.IntegerField(verbose_name="Stock")
+    fecha_creacion = models.DateTimeField(verbose_name="Fecha de creación")
+    fecha_actualizacion = models.DateTimeField(verbose_name="Última modificación")
+    resumen = models.CharField(max_length=500, blank=True, default='', verbose_name="Resumen")
+    descontinuado = models.BooleanField(default=False, verbose_name="Descontinuado")
+    fecha_archivado = models.DateTimeField(verbose_name="Fecha de archivo")
+    motivo = models.CharField(max_length=20, choices=MOTIVOS_ARCHIVO, verbose_name="Motivo")
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name = "Producto archivado"
+        verbose_name_plural = "Productos archivados"
+        ordering = ['-fecha_archivado', '-id']
+        indexes = [
+            models.Index(fields=['-fecha_archivado', '-id'], name='archivado_fecha_id_idx'),
+            # Conflictos de nombre al restaurar
+            models.Index(Lower('nombre'), name='archivado_nombre_ci_idx'),
+        ]
+        permissions = [
+            ("restore_productoarchivado", "Puede restaurar productos archivados"),
+        ]
+
+
+class EstadisticaCatalogo(models.Model):
+    """
+    Agregados del catálogo mantenidos al día (una sola fila, pk=1).
+
+    Se actualizan en la misma transacción que cada alta, cambio o baja de
+    productos (ver gestor/estadisticas.py), así las páginas leen los totales
+    en O(1) en lugar de recorrer la tabla con COUNT/SUM.
+    """
+
+    total_productos = models.BigIntegerField(default=0, verbose_name="Productos")
+    total_unidades = models.BigIntegerField(default=0, verbose_name="Unidades en stock")
+    valor_inventario = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="Valor del inventario")
+    productos_sin_stock = models.BigIntegerField(default=0, verbose_name="Sin stock")
+    productos_stock_bajo = models.BigIntegerField(default=0, verbose_name="Stock bajo")
+    productos_disponibles = models.BigIntegerField(default=0, verbose_name="Disponibles")
+    # Se incrementa con cada cambio del catálogo (ETag del listado, cachés)
+    version = models.BigIntegerField(default=0, verbose_name="Versión")
+    fecha_actualizacion = models.DateTimeField(null=True, blank=True, verbose_name="Última actualización")
+
+    def __str__(self):
+        return f'Estadísticas del catálogo ({self.total_productos} productos)'
+
+    class Meta:
+        verbose_name = "Estadística del catálogo"
+        verbose_name_plural = "Estadísticas del catálogo"
+
+
+class CustomUserManager(UserManager):
+
+    def email_igual(self, email):
+        """
+        Usuarios con ese email sin distinguir mayúsculas. Compara LOWER(email)
+        y excluye los emails vacíos para usar el índice único parcial.
+        """
+        return (
+            self.alias(email_lower=Lower('email'))
+            .filter(email_lower=Lower(Value(email)))
+            .exclude(email='')
+        )
+
+
 class CustomUser(AbstractUser):
     
     """Usuario personalizado que extiende el modelo de usuario de Django"""
+
+    objects = CustomUserManager()
     
     class Meta:
         verbose_name = "Usuario"
@@ -30,6 +222,113 @@ class CustomUser(AbstractUser):
         permissions = [
             ("can_access_products_section", "Puede acceder a la sección de productos"),
         ]
+        constraints = [
+            # Índice único funcional y parcial: los usuarios sin email (p. ej.
+            # superusuarios creados por consola) no compiten entre sí
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~Q(email=''),
+                name='usuario_email_ci_unico',
+                violation_error_message='Este correo electrónico ya está registrado',
+            ),
+        ]
     
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+
+# Auditoría de productos
+
+ACCIONES_AUDITORIA = {
+    'crear': 'Creación',
+    'modificar': 'Modificación',
+    'borrar': 'Borrado',
+    'masiva': 'Operación masiva',
+}
+
+
+class RegistroAuditoria(models.Model):
+    """
+    Quién cambió qué en el catálogo. Se escribe en lotes desde una cola en
+    memoria (ver gestor/auditoria.py). No tiene clave foránea a Producto:
+    el historial sobrevive al borrado y al archivo del producto.
+    """
+
+    fecha = models.DateTimeField(verbose_name="Fecha")
+    accion = models.CharField(max_length=10, choices=ACCIONES_AUDITORIA, verbose_name="Acción")
+    producto_id = models.BigIntegerField(null=True, blank=True, verbose_name="Id del producto")
+    producto_nombre = models.CharField(max_length=200, blank=True, verbose_name="Producto")
+    usuario = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name="Usuario",
+    )
+    # Copia del nombre de usuario: se conserva aunque el usuario se borre
+    usuario_nombre = models.CharField(max_length=150, blank=True, verbose_name="Nombre de usuario")
+    origen = models.CharField(max_length=20, blank=True, verbose_name="Origen")
+    # {campo: [antes, después]}; en operaciones masivas, {"operacion": ..., "productos": N}
+    cambios = models.JSONField(default=dict, verbose_name="Cambios")
+
+    def __str__(self):
+        return f'{ACCIONES_AUDITORIA[self.accion]} de {self.producto_nombre or "productos"} ({self.fecha:%Y-%m-%d %H:%M})'
+
+    class Meta:
+        verbose_name = "Registro de auditoría"
+        verbose_name_plural = "Auditoría de productos"
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['-fecha', '-id'], name='auditoria_fecha_id_idx'),
+            # Historial de un producto
+            models.Index(fields=['producto_id', '-fecha'], name='auditoria_producto_idx'),
+        ]
+
+
+# Tareas en segundo plano
+
+ESTADOS_TAREA = {
+    'pendiente': 'Pendiente',
+    'en_curso': 'En curso',
+    'terminada': 'Terminada',
+    'fallida': 'Fallida',
+}
+
+
+class Tarea(models.Model):
+    """
+    Trabajo pesado del catálogo (importaciones, reconciliación, operaciones
+    masivas...) que ejecuta fuera de la petición el comando trabajador_tareas.
+    La cola es esta misma tabla; ver gestor/tareas.py.
+    """
+
+    tipo = models.CharField(max_length=50, verbose_name="Tipo")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    estado = models.CharField(max_length=10, choices=ESTADOS_TAREA, default='pendiente', verbose_name="Estado")
+    progreso = models.PositiveSmallIntegerField(default=0, verbose_name="Progreso (%)")
+    mensaje = models.CharField(max_length=200, blank=True, verbose_name="Mensaje")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    error = models.TextField(blank=True, verbose_name="Último error")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    max_intentos = models.PositiveSmallIntegerField(default=3, verbose_name="Máximo de intentos")
+    # No se toma antes de esta fecha (espera entre reintentos)
+    disponible_desde = models.DateTimeField(verbose_name="Disponible desde")
+    usuario = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name="Usuario",
+    )
+    trabajador = models.CharField(max_length=100, blank=True, verbose_name="Trabajador")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    # Lo renueva el trabajador mientras la tarea corre; si se detiene, la tarea se reencola
+    latido = models.DateTimeField(null=True, blank=True, verbose_name="Último latido")
+
+    def __str__(self):
+        return f'{self.tipo} #{self.pk} ({ESTADOS_TAREA[self.estado]})'
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-fecha_creacion', '-id']
+        indexes = [
+            # Índices parciales: la cola solo mira las pendientes y las que están corriendo
+            models.Index(fields=['disponible_desde', 'id'], condition=Q(estado='pendiente'), name='tarea_pendiente_idx'),
+            models.Index(fields=['latido'], condition=Q(estado='en_curso'), name='tarea_en_curso_idx'),
+            models.Index(fields=['-fecha_creacion', '-id'], name='tarea_fecha_id_idx'),
+        ]
@@ -0,0 +1,98 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+# Paginación por cursor (keyset) sobre (fecha_creacion, id)
+#
+# En lugar de OFFSET, cada página se pide a partir de la clave del último
+# (o primer) producto mostrado, así el costo de una página no depende de
+# cuántas filas tenga la tabla ni de qué tan lejos se haya avanzado.
+
+def codificar_cursor(producto):
+    """Genera el cursor opaco a partir de la clave de ordenamiento del producto"""
+    valor = f'{producto.fecha_creacion.isoformat()}|{producto.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_creacion, id) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valor = base64.urlsafe_b64decode(cursor + relleno).decode()
+        fecha, pk = valor.split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class PaginaCursor:
+    """Resultado de una página: productos y cursores hacia adelante/atrás"""
+
+    def __init__(self, items, siguiente=None, anterior=None):
+        self.items = items
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _consulta_cursor(queryset, despues=None, antes=None):
+    """Queryset ordenado desde el cursor recibido y cómo armar la página con sus filas"""
+    clave_despues = decodificar_cursor(despues)
+    clave_antes = None if clave_despues else decodificar_cursor(antes)
+
+    if clave_antes:
+        fecha, pk = clave_antes
+        qs = queryset.filter(
+            Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id__gt=pk)
+        ).order_by('fecha_creacion', 'id')
+        return qs, True, False
+
+    qs = queryset
+    if clave_despues:
+        fecha, pk = clave_despues
+        qs = qs.filter(
+            Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=pk)
+        )
+    return qs.order_by('-fecha_creacion', '-id'), False, bool(clave_despues)
+
+
+def _armar_pagina(filas, limite, hacia_atras, desde_cursor):
+    hay_mas = len(filas) > limite
+    if hacia_atras:
+        items = filas[:limite][::-1]
+        anterior = codificar_cursor(items[0]) if hay_mas and items else None
+        siguiente = codificar_cursor(items[-1]) if items else None
+        return PaginaCursor(items, siguiente=siguiente, anterior=anterior)
+
+    items = filas[:limite]
+    siguiente = codificar_cursor(items[-1]) if hay_mas and items else None
+    anterior = codificar_cursor(items[0]) if desde_cursor and items else None
+    return PaginaCursor(items, siguiente=siguiente, anterior=anterior)
+
+
+def paginar_por_cursor(queryset, limite, despues=None, antes=None):
+    """
+    Pagina `queryset` en orden descendente por (fecha_creacion, id).
+
+    `despues` pide la página siguiente a un cursor y `antes` la anterior.
+    Se lee una fila extra para saber si existe otra página sin hacer COUNT(*).
+    """
+    qs, hacia_atras, desde_cursor = _consulta_cursor(queryset, despues, antes)
+    return _armar_pagina(list(qs[:limite + 1]), limite, hacia_atras, desde_cursor)
+
+
+async def apaginar_por_cursor(queryset, limite, despues=None, antes=None):
+    """Versión asíncrona de paginar_por_cursor para vistas async"""
+    qs, hacia_atras, desde_cursor = _consulta_cursor(queryset, despues, antes)
+    filas = [producto async for producto in qs[:limite + 1]]
+    return _armar_pagina(filas, limite, hacia_atras, desde_cursor)
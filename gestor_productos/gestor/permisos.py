@@ -0,0 +1,93 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Caché compartida de permisos por usuario
+#
+# Guarda en la caché de Django (compartida entre procesos) los permisos
+# resueltos de cada usuario y los nombres de sus grupos. Las señales de
+# gestor/signals.py borran la entrada cuando cambian los grupos del usuario,
+# los permisos de esos grupos o los permisos directos del usuario.
+
+def clave_permisos(user_id):
+    return f'permisos:usuario:{user_id}'
+
+
+def timeout_permisos():
+    return getattr(settings, 'PERMISOS_CACHE_TIMEOUT', 3600)
+
+
+def leer_permisos(user_id):
+    """Entrada cacheada {'user': set, 'group': set, 'grupos': set} o None"""
+    return cache.get(clave_permisos(user_id))
+
+
+async def aleer_permisos(user_id):
+    return await cache.aget(clave_permisos(user_id))
+
+
+def guardar_permisos(user_id, datos):
+    cache.set(clave_permisos(user_id), datos, timeout_permisos())
+
+
+async def aguardar_permisos(user_id, datos):
+    await cache.aset(clave_permisos(user_id), datos, timeout_permisos())
+
+
+# Opciones de grupo del registro: se leen en cada visita y casi nunca cambian
+
+CLAVE_OPCIONES_GRUPOS = 'grupos:opciones'
+
+
+def opciones_grupos():
+    """[(id, nombre)] de todos los grupos ordenados por nombre, desde la caché"""
+    opciones = cache.get(CLAVE_OPCIONES_GRUPOS)
+    if opciones is None:
+        from django.contrib.auth.models import Group
+
+        opciones = list(Group.objects.order_by('name').values_list('id', 'name'))
+        cache.set(CLAVE_OPCIONES_GRUPOS, opciones, timeout_permisos())
+    return opciones
+
+
+def resolver_grupo(valor):
+    """(id, nombre) del grupo indicado por id o por nombre, o None si no existe"""
+    for grupo_id, nombre in opciones_grupos():
+        if str(grupo_id) == valor or nombre == valor:
+            return grupo_id, nombre
+    return None
+
+
+def invalidar_opciones_grupos():
+    cache.delete(CLAVE_OPCIONES_GRUPOS)
+
+
+def invalidar_permisos(user_ids):
+    """
+    Borra la caché de permisos de los usuarios indicados, ahora y al
+    confirmarse la transacción: mientras tanto otra petición puede volver a
+    cachear los permisos leídos antes del COMMIT (un permiso ya revocado)
+    """
+    claves = [clave_permisos(pk) for pk in user_ids if pk is not None]
+    if claves:
+        cache.delete_many(claves)
+        transaction.on_commit(partial(cache.delete_many, claves))
+
+
+def pertenece_a_grupo(user, nombre):
+    """
+    Indica si el usuario pertenece al grupo `nombre` usando la caché de
+    permisos en lugar de consultar auth_group en cada llamada.
+    """
+    if not user.is_authenticated:
+        return False
+    # Forzar la carga de la caché a través del backend de autenticación
+    user.get_all_permissions()
+    grupos = getattr(user, '_grupos_cache', None)
+    if grupos is None:
+        grupos = set(user.groups.values_list('name', flat=True))
+        user._grupos_cache = grupos
+    return nombre in grupos
@@ -0,0 +1,78 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Router de réplicas de lectura
+#
+# Las lecturas de los modelos del catálogo van a una réplica elegida al azar
+# (settings.DATABASE_REPLICAS); las escrituras y el resto de los modelos
+# (usuarios, grupos, permisos, sesiones) van siempre a la primaria.
+#
+# Lecturas que deben ir a la primaria aunque sean del catálogo:
+# - dentro de una transacción abierta en la primaria (deben ver lo escrito);
+# - durante la ventana de "leer lo propio" de un usuario que acaba de
+#   escribir (ver PrimariaTrasEscrituraMiddleware).
+
+MODELOS_CATALOGO = {('gestor', 'producto'), ('gestor', 'estadisticacatalogo')}
+
+# Estado de la petición en curso: {'primaria': bool, 'escritura': bool}.
+# Es un dict mutable para que las escrituras hechas dentro de sync_to_async
+# (otro contexto) también queden registradas.
+_estado = ContextVar('gestor_estado_replicas', default=None)
+
+
+def iniciar_peticion(usar_primaria=False):
+    """Abre el estado de una petición; devuelve el token para restaurarlo"""
+    return _estado.set({'primaria': usar_primaria, 'escritura': False})
+
+
+def terminar_peticion(token):
+    """Cierra el estado y devuelve True si durante la petición hubo escrituras"""
+    estado = _estado.get()
+    _estado.reset(token)
+    return bool(estado and estado['escritura'])
+
+
+def fijar_primaria():
+    """Las lecturas que queden en esta petición van a la primaria"""
+    estado = _estado.get()
+    if estado is not None:
+        estado['primaria'] = True
+        estado['escritura'] = True
+
+
+def usando_primaria():
+    estado = _estado.get()
+    return bool(estado and estado['primaria'])
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label, model._meta.model_name) not in MODELOS_CATALOGO:
+            return DEFAULT_DB_ALIAS
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or usando_primaria() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if (model._meta.app_label, model._meta.model_name) in MODELOS_CATALOGO:
+            fijar_primaria()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        bases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # El esquema de las réplicas llega por replicación
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,157 @@
+from django.contrib.auth.models import Group, Permission
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import auditoria, estadisticas, metricas
+from .busqueda import instalar_triggers
+from .models import CustomUser, Producto
+from .permisos import invalidar_opciones_grupos, invalidar_permisos
+from gestor_productos.database import configurar_conexion
+
+
+# Conexiones: PRAGMA de SQLite en cada conexión nueva
+
+connection_created.connect(configurar_conexion, dispatch_uid='gestor_configurar_conexion')
+connection_created.connect(metricas.instalar_en_conexion, dispatch_uid='gestor_metricas_sql')
+
+
+# Búsqueda
+
+@receiver(post_migrate)
+def asegurar_indice_busqueda(sender, using='default', **kwargs):
+    """Reinstala los triggers FTS si una migración reconstruyó la tabla"""
+    if sender.name == 'gestor':
+        instalar_triggers(connections[using])
+
+
+# Estadísticas del catálogo
+
+@receiver(pre_save, sender=Producto)
+def leer_estado_original(sender, instance, **kwargs):
+    """Si el producto no se leyó completo, obtener precio/stock previos"""
+    if instance.pk is None or hasattr(instance, '_estado_original'):
+        return
+    instance._estado_original = (
+        Producto.objects.filter(pk=instance.pk).values_list('precio', 'stock').first()
+    )
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, created, **kwargs):
+    original = None if created else getattr(instance, '_estado_original', None)
+    estadisticas.aplicar_delta(estadisticas.delta_cambio(original, instance.precio, instance.stock))
+
+
+@receiver(pre_delete, sender=Producto)
+def producto_por_borrar(sender, instance, **kwargs):
+    # Leer los valores mientras la fila todavía existe
+    instance._estado_borrado = (instance.precio, instance.stock)
+
+
+@receiver(post_delete, sender=Producto)
+def producto_borrado(sender, instance, **kwargs):
+    precio, stock = instance._estado_borrado
+    estadisticas.aplicar_delta(estadisticas.sumar(estadisticas.delta_vacio(), precio, stock, -1))
+
+
+# Auditoría (solo dentro de una petición o de auditoria.contexto)
+
+@receiver(pre_save, sender=Producto)
+def auditoria_leer_original(sender, instance, **kwargs):
+    if auditoria.activa():
+        auditoria.leer_original(instance)
+
+
+@receiver(post_save, sender=Producto)
+def auditoria_producto_guardado(sender, instance, created, using, **kwargs):
+    if auditoria.activa():
+        auditoria.registrar_guardado(instance, created, using)
+
+
+@receiver(post_delete, sender=Producto)
+def auditoria_producto_borrado(sender, instance, using, **kwargs):
+    if auditoria.activa():
+        auditoria.registrar_borrado(instance, using)
+
+
+# Caché de permisos
+
+def usuarios_de_grupos(group_ids):
+    return CustomUser.objects.filter(groups__in=group_ids).values_list('id', flat=True).distinct()
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def grupos_de_usuario_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    """user.groups.add(...) o group.user_set.add(...)"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidar_permisos([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidar_permisos(pk_set)
+    elif action == 'pre_clear':
+        invalidar_permisos(usuarios_de_grupos([instance.pk]))
+
+
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def permisos_de_usuario_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    """user.user_permissions.add(...) o permission.user_set.add(...)"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidar_permisos([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidar_permisos(pk_set)
+    elif action == 'pre_clear':
+        invalidar_permisos(instance.user_set.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permisos_de_grupo_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    """group.permissions.add(...) o permission.group_set.add(...)"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidar_permisos(usuarios_de_grupos([instance.pk]))
+    elif action == 'pre_clear':
+        invalidar_permisos(usuarios_de_grupos(instance.group_set.values_list('id', flat=True)))
+    else:
+        invalidar_permisos(usuarios_de_grupos(pk_set))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def usuario_cambiado(sender, instance, update_fields=None, **kwargs):
+    # login() solo actualiza last_login, que no afecta los permisos
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidar_permisos([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def grupo_cambiado(sender, instance, **kwargs):
+    """Renombrar o borrar un grupo cambia los grupos cacheados de sus miembros"""
+    invalidar_permisos(usuarios_de_grupos([instance.pk]))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def opciones_grupos_cambiadas(sender, **kwargs):
+    """Crear, renombrar o borrar un grupo cambia las opciones del registro"""
+    invalidar_opciones_grupos()
+
+
+@receiver(post_save, sender=Permission)
+def permiso_creado(sender, instance, created, **kwargs):
+    # Los superusuarios tienen todos los permisos, incluidos los nuevos
+    if created:
+        invalidar_permisos(CustomUser.objects.filter(is_superuser=True).values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Permission)
+def permiso_borrado(sender, instance, **kwargs):
+    afectados = set(instance.user_set.values_list('id', flat=True))
+    afectados.update(usuarios_de_grupos(instance.group_set.values_list('id', flat=True)))
+    afectados.update(CustomUser.objects.filter(is_superuser=True).values_list('id', flat=True))
+    invalidar_permisos(afectados)
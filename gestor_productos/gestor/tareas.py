@@ -0,0 +1,332 @@
+import inspect
+import io
+import logging
+import os
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import archivo, auditoria, busqueda, masivo
+from .forms import FiltroProductosForm, OperacionMasivaForm
+from .importacion import ArchivoInvalido, importar_productos
+from .models import Producto, Tarea
+
+
+# Tareas en segundo plano
+#
+# La cola es la tabla gestor_tarea: no hace falta un broker aparte. Una vista
+# (o la API) llama a encolar() y responde enseguida con el id; el comando
+# trabajador_tareas toma las pendientes con un UPDATE ... WHERE estado =
+# 'pendiente' (si dos trabajadores compiten por la misma, solo a uno le
+# afecta una fila) y las ejecuta en un pool de procesos. Cada tarea informa
+# su avance con progreso(), que además renueva el latido; si el trabajador
+# muere, reencolar_vencidas() la devuelve a la cola. Los errores se
+# reintentan con espera exponencial hasta max_intentos.
+
+logger = logging.getLogger('gestor.tareas')
+
+# Segundos mínimos entre dos escrituras de progreso de una misma tarea
+INTERVALO_PROGRESO = 1.0
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando (argumentos inválidos, archivo inexistente)"""
+
+
+class TipoTarea:
+
+    def __init__(self, nombre, funcion, max_intentos=None, permiso=None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.max_intentos = max_intentos
+        # Permiso para encolarla desde la API; None: solo desde el código (vistas, comandos)
+        self.permiso = permiso
+
+    def validar(self, argumentos):
+        """TypeError si `argumentos` no coincide con los parámetros de la función"""
+        inspect.signature(self.funcion).bind(None, **argumentos)
+
+
+REGISTRO = {}
+
+
+def tarea(nombre, max_intentos=None, permiso=None):
+    """
+    Registra una función como tipo de tarea. Recibe un Ejecucion y los
+    argumentos encolados; lo que devuelve (serializable a JSON) queda en
+    Tarea.resultado.
+    """
+    def registrar(funcion):
+        REGISTRO[nombre] = TipoTarea(nombre, funcion, max_intentos, permiso)
+        return funcion
+    return registrar
+
+
+class Ejecucion:
+    """Lo que ve la función de una tarea mientras corre"""
+
+    def __init__(self, tarea):
+        self.tarea = tarea
+        self.ultimo_progreso = 0.0
+
+    @property
+    def usuario(self):
+        return self.tarea.usuario
+
+    def progreso(self, porcentaje, mensaje=''):
+        # Como mucho una escritura por INTERVALO_PROGRESO, para no competir con las peticiones
+        ahora = time.monotonic()
+        if ahora - self.ultimo_progreso < INTERVALO_PROGRESO:
+            return
+        self.ultimo_progreso = ahora
+        Tarea.objects.filter(pk=self.tarea.pk, estado='en_curso', intentos=self.tarea.intentos).update(
+            progreso=max(0, min(int(porcentaje), 99)),
+            mensaje=mensaje[:200],
+            latido=timezone.now(),
+        )
+
+
+# Cola
+
+def encolar(tipo, argumentos=None, usuario=None, max_intentos=None, espera=0):
+    """
+    Crea una tarea pendiente y la devuelve. Dentro de una transacción, el
+    trabajador no la ve hasta que se confirma (y no existe si se deshace).
+    """
+    if tipo not in REGISTRO:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+    argumentos = argumentos or {}
+    REGISTRO[tipo].validar(argumentos)
+    return Tarea.objects.create(
+        tipo=tipo,
+        argumentos=argumentos,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        max_intentos=max_intentos or REGISTRO[tipo].max_intentos or settings.TAREAS_MAX_INTENTOS,
+        disponible_desde=timezone.now() + timedelta(seconds=espera),
+    )
+
+
+def estado(tarea):
+    """Representación JSON para la API y el sondeo desde las vistas"""
+    return {
+        'id': tarea.pk,
+        'tipo': tarea.tipo,
+        'estado': tarea.estado,
+        'progreso': tarea.progreso,
+        'mensaje': tarea.mensaje,
+        'resultado': tarea.resultado,
+        'error': tarea.error.strip().splitlines()[-1] if tarea.error else '',
+        'intentos': tarea.intentos,
+        'max_intentos': tarea.max_intentos,
+        'fecha_creacion': tarea.fecha_creacion.isoformat(),
+        'fecha_inicio': tarea.fecha_inicio.isoformat() if tarea.fecha_inicio else None,
+        'fecha_fin': tarea.fecha_fin.isoformat() if tarea.fecha_fin else None,
+    }
+
+
+def tomar(trabajador, limite=1, tipos=None):
+    """
+    Marca como en curso hasta `limite` tareas disponibles, las más antiguas
+    primero, y devuelve sus ids. Las que otro trabajador tomó entre la
+    lectura y el UPDATE simplemente no se cuentan.
+    """
+    ahora = timezone.now()
+    disponibles = Tarea.objects.filter(estado='pendiente', disponible_desde__lte=ahora)
+    if tipos:
+        disponibles = disponibles.filter(tipo__in=tipos)
+    tomadas = []
+    for pk in disponibles.order_by('disponible_desde', 'id').values_list('pk', flat=True)[:limite * 2]:
+        actualizadas = Tarea.objects.filter(pk=pk, estado='pendiente').update(
+            estado='en_curso',
+            trabajador=trabajador,
+            intentos=F('intentos') + 1,
+            progreso=0,
+            mensaje='',
+            fecha_inicio=ahora,
+            latido=ahora,
+        )
+        if actualizadas:
+            tomadas.append(pk)
+            if len(tomadas) == limite:
+                break
+    return tomadas
+
+
+def latido(ids):
+    """El trabajador avisa que sigue ejecutando estas tareas"""
+    if ids:
+        Tarea.objects.filter(pk__in=ids, estado='en_curso').update(latido=timezone.now())
+
+
+def espera_reintento(intento):
+    """Segundos antes del reintento número `intento` + 1: exponencial, con tope y algo de azar"""
+    espera = min(settings.TAREAS_REINTENTO_BASE * 2 ** (intento - 1), settings.TAREAS_REINTENTO_MAX)
+    # El azar evita que muchas tareas que fallaron juntas se reintenten juntas
+    return espera * random.uniform(0.75, 1.0)
+
+
+def registrar_fallo(tarea, error, reintentar=True):
+    """
+    Devuelve la tarea a la cola con espera creciente o, si agotó sus
+    intentos (o el error es permanente), la deja como fallida
+    """
+    ahora = timezone.now()
+    if reintentar and tarea.intentos < tarea.max_intentos:
+        cambios = {'estado': 'pendiente', 'disponible_desde': ahora + timedelta(seconds=espera_reintento(tarea.intentos))}
+    else:
+        cambios = {'estado': 'fallida', 'fecha_fin': ahora}
+    # Solo si sigue siendo esta ejecución: no pisa un reintento que ya tomó otro trabajador
+    return Tarea.objects.filter(pk=tarea.pk, estado='en_curso', intentos=tarea.intentos).update(
+        error=error, latido=None, **cambios
+    )
+
+
+def reencolar_vencidas():
+    """Tareas en curso cuyo trabajador dejó de dar señales (murió, se reinició el equipo)"""
+    limite = timezone.now() - timedelta(seconds=settings.TAREAS_LATIDO_VENCIDO)
+    vencidas = 0
+    for tarea in Tarea.objects.filter(estado='en_curso', latido__lt=limite):
+        vencidas += registrar_fallo(tarea, f'El trabajador {tarea.trabajador} dejó de responder')
+    return vencidas
+
+
+def ejecutar(tarea_id):
+    """Ejecuta una tarea ya tomada (en el proceso del pool o, con --procesos 0, en el mismo)"""
+    close_old_connections()
+    try:
+        tarea = Tarea.objects.select_related('usuario').get(pk=tarea_id)
+        tipo = REGISTRO.get(tarea.tipo)
+        try:
+            if tipo is None:
+                raise ErrorPermanente(f'Tipo de tarea desconocido: {tarea.tipo}')
+            resultado = tipo.funcion(Ejecucion(tarea), **tarea.argumentos)
+            Tarea.objects.filter(pk=tarea.pk, estado='en_curso', intentos=tarea.intentos).update(
+                estado='terminada',
+                progreso=100,
+                resultado=resultado,
+                error='',
+                fecha_fin=timezone.now(),
+                latido=None,
+            )
+        except Exception as error:
+            logger.warning('Tarea %s #%s falló (intento %d de %d)', tarea.tipo, tarea.pk, tarea.intentos, tarea.max_intentos)
+            registrar_fallo(tarea, traceback.format_exc(), reintentar=not isinstance(error, ErrorPermanente))
+    finally:
+        # Los procesos del pool no ejecutan atexit: la auditoría se escribe al terminar cada tarea
+        auditoria.escritor.vaciar()
+        close_old_connections()
+
+
+def fallo_externo(tarea_id, error):
+    """El proceso que ejecutaba la tarea terminó de forma anormal"""
+    tarea = Tarea.objects.filter(pk=tarea_id).first()
+    if tarea is not None:
+        registrar_fallo(tarea, error)
+
+
+# Tipos de tarea
+
+@tarea('reconciliar_estadisticas', permiso='gestor.change_producto')
+def reconciliar_estadisticas(ejecucion, solo_verificar=False):
+    salida = io.StringIO()
+    call_command('reconciliar_estadisticas', solo_verificar=solo_verificar, stdout=salida, no_color=True)
+    return {'salida': salida.getvalue()}
+
+
+@tarea('reconstruir_indice_busqueda', permiso='gestor.change_producto')
+def reconstruir_indice_busqueda(ejecucion):
+    if not busqueda.fts_disponible():
+        raise ErrorPermanente('El índice FTS5 solo está disponible con SQLite')
+    busqueda.reconstruir_indice()
+    return {}
+
+
+# Sin permiso de API: `ruta` es un archivo del servidor, solo la encola ProductoImportarView
+@tarea('importar_productos', max_intentos=1)
+def importar(ejecucion, ruta, formato='csv', actualizar=False, temporal=False):
+    try:
+        tamano = os.path.getsize(ruta)
+        with open(ruta, encoding='utf-8-sig', newline='') as texto:
+            def avance(resultado):
+                ejecucion.progreso(
+                    100 * texto.buffer.tell() / max(tamano, 1),
+                    f'{resultado.leidas} filas leídas',
+                )
+            resultado = importar_productos(texto, formato, actualizar=actualizar, progreso=avance)
+    except FileNotFoundError:
+        raise ErrorPermanente(f'No existe el archivo {ruta}')
+    except ArchivoInvalido as error:
+        raise ErrorPermanente(str(error))
+    finally:
+        if temporal and os.path.exists(ruta):
+            os.remove(ruta)
+    return {
+        'leidas': resultado.leidas,
+        'creados': resultado.creados,
+        'actualizados': resultado.actualizados,
+        'rechazados': resultado.rechazados,
+        'errores': resultado.errores,
+    }
+
+
+@tarea('operacion_masiva', permiso='gestor.change_producto')
+def operacion_masiva(ejecucion, filtro, operacion):
+    """Igual que ProductoMasivoView "Aplicar"; se valida otra vez con los permisos de quien la encoló"""
+    usuario = ejecucion.usuario
+    puede_borrar = usuario is not None and usuario.has_perm('gestor.delete_producto')
+    filtro_form = FiltroProductosForm(filtro)
+    form = OperacionMasivaForm(operacion, permitir_borrar=puede_borrar)
+    if not (filtro_form.is_valid() and form.is_valid()):
+        raise ErrorPermanente(f'Operación inválida: {filtro_form.errors.as_text()} {form.errors.as_text()}'.strip())
+    productos = filtro_form.filtrar(Producto.objects.all())
+    with auditoria.contexto(usuario, origen='tarea'), auditoria.operacion(productos, form.descripcion()):
+        afectados = masivo.aplicar(productos, form.cambios())
+    return {'operacion': form.descripcion(), 'afectados': afectados}
+
+
+def entero_positivo(nombre, valor):
+    """Argumento entero >= 1 (acepta "90" desde JSON); ErrorPermanente si no lo es"""
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ErrorPermanente(f'{nombre} debe ser un entero, no {valor!r}')
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErrorPermanente(f'{nombre} debe ser un entero, no {valor!r}')
+    if valor < 1:
+        raise ErrorPermanente(f'{nombre} debe ser al menos 1')
+    return valor
+
+
+@tarea('archivar_productos', permiso='gestor.delete_producto')
+def archivar_productos(ejecucion, dias_sin_stock=None, dias_sin_cambios=None, descontinuados=True,
+                       lote=archivo.TAMANO_LOTE):
+    if dias_sin_stock is not None:
+        dias_sin_stock = entero_positivo('dias_sin_stock', dias_sin_stock)
+    if dias_sin_cambios is not None:
+        dias_sin_cambios = entero_positivo('dias_sin_cambios', dias_sin_cambios)
+    lote = entero_positivo('lote', lote)
+    if not isinstance(descontinuados, bool):
+        raise ErrorPermanente(f'descontinuados debe ser true o false, no {descontinuados!r}')
+    criterios = archivo.criterios(dias_sin_stock, dias_sin_cambios, descontinuados)
+    if not criterios:
+        raise ErrorPermanente('No hay nada que archivar: indique dias_sin_stock o dias_sin_cambios')
+    # Los criterios se superponen: el total es una cota y el progreso, aproximado
+    estimado = sum(archivo.candidatos(motivo, dias).count() for motivo, dias in criterios)
+    archivados = {}
+    for motivo, dias in criterios:
+        def avance(cantidad, motivo=motivo):
+            ejecucion.progreso(
+                100 * (sum(archivados.values()) + cantidad) / max(estimado, 1),
+                f'{motivo}: {cantidad} archivados',
+            )
+        archivados[motivo] = archivo.archivar_por_lotes(
+            archivo.candidatos(motivo, dias), motivo, tamano_lote=lote, progreso=avance,
+        )
+    return {'archivados': archivados, 'total': sum(archivados.values())}
@@ -1,3 +1,1421 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestor_productos import database
+from . import archivo, auditoria, benchmark, estadisticas, generacion, importacion, inventario, limites, masivo, metricas, paginacion, routers, tareas
+from .busqueda import buscar_ids
+from .forms import ProductoForm
+from .middleware import PrimariaTrasEscrituraMiddleware
+from .permisos import guardar_permisos, leer_permisos, opciones_grupos, resolver_grupo
+from .models import (
+    ESTADO_DISPONIBLE, ESTADO_SIN_STOCK, ESTADO_STOCK_BAJO, ESTADOS_STOCK,
+    CustomUser, EstadisticaCatalogo, Producto, ProductoArchivado, RegistroAuditoria, Tarea,
+)
+
+
+# Admin: consultas por página del changelist
+
+class AdminChangelistQueryTests(TestCase):
+    """El número de consultas de cada changelist no depende del tamaño de la página"""
+
+    # Consultas máximas por página: sesión, usuario, conteo, resultados y filtros laterales
+    PRESUPUESTO = 8
+
+    def setUp(self):
+        cache.clear()
+        self.superuser = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.client.force_login(self.superuser)
+        self.grupos = [Group.objects.create(name=nombre) for nombre in ('Administradores', 'Gestores de Productos')]
+
+    def crear_productos(self, cantidad):
+        inicio = Producto.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='Descripción', precio=1000, stock=i % 15)
+
+    def crear_usuarios(self, cantidad):
+        inicio = CustomUser.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            usuario = CustomUser.objects.create_user(f'usuario{i}', f'usuario{i}@ejemplo.com', 'clave')
+            usuario.groups.set(self.grupos)
+
+    def contar_consultas(self, url):
+        # Primera visita para calentar cachés (permisos, resumen de estados)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def test_changelist_productos(self):
+        url = '/admin/gestor/producto/'
+        self.crear_productos(5)
+        pocos = self.contar_consultas(url)
+        self.crear_productos(45)
+        muchos = self.contar_consultas(url)
+        self.assertEqual(pocos, muchos)
+        self.assertLessEqual(muchos, self.PRESUPUESTO)
+
+    def test_changelist_usuarios(self):
+        url = '/admin/gestor/customuser/'
+        self.crear_usuarios(5)
+        pocos = self.contar_consultas(url)
+        self.crear_usuarios(45)
+        muchos = self.contar_consultas(url)
+        self.assertEqual(pocos, muchos)
+        self.assertLessEqual(muchos, self.PRESUPUESTO)
+
+    def test_columnas_anotadas(self):
+        self.crear_usuarios(1)
+        Producto.objects.create(nombre='Sin stock', descripcion='d', precio=1000, stock=0)
+        response = self.client.get('/admin/gestor/customuser/?o=7')
+        self.assertContains(response, 'Administradores')
+        response = self.client.get('/admin/gestor/producto/?o=4')
+        self.assertContains(response, '🔴 Sin stock')
+
+
+# Paginación por cursor del listado
+
+class PaginacionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+        for i in range(7):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='d', precio=1000, stock=i)
+        # Empates en la clave de orden: cinco productos creados en el mismo instante
+        misma_fecha = timezone.now()
+        Producto.objects.filter(stock__in=[1, 2, 3, 4, 5]).update(fecha_creacion=misma_fecha)
+        self.orden = list(Producto.objects.order_by('-fecha_creacion', '-id').values_list('pk', flat=True))
+
+    def recorrer(self, limite):
+        paginas = [paginacion.paginar_por_cursor(Producto.objects.all(), limite)]
+        while paginas[-1].siguiente:
+            paginas.append(paginacion.paginar_por_cursor(Producto.objects.all(), limite, despues=paginas[-1].siguiente))
+        return paginas
+
+    def test_hacia_adelante_y_hacia_atras(self):
+        paginas = self.recorrer(3)
+        self.assertEqual([[p.pk for p in pagina] for pagina in paginas], [self.orden[0:3], self.orden[3:6], self.orden[6:]])
+        self.assertIsNone(paginas[0].anterior)
+
+        # Volver desde la última página reproduce las mismas páginas
+        atras = [paginas[-1]]
+        while atras[-1].anterior:
+            atras.append(paginacion.paginar_por_cursor(Producto.objects.all(), 3, antes=atras[-1].anterior))
+        self.assertEqual([[p.pk for p in pagina] for pagina in atras], [self.orden[6:], self.orden[3:6], self.orden[0:3]])
+
+    def test_orden_estable_con_empates(self):
+        for limite in (1, 2, 4):
+            vistos = [p.pk for pagina in self.recorrer(limite) for p in pagina]
+            self.assertEqual(vistos, self.orden)
+
+    def test_cursor_adulterado_o_invalido(self):
+        for cursor in ('no-es-un-cursor!', 'eHx5', base64.urlsafe_b64encode(b'2024-01-01T00:00:00|abc').decode(), '%00'):
+            self.assertIsNone(paginacion.decodificar_cursor(cursor))
+            pagina = paginacion.paginar_por_cursor(Producto.objects.all(), 3, despues=cursor)
+            self.assertEqual([p.pk for p in pagina], self.orden[:3])
+            response = self.client.get('/productos/', {'despues': cursor, 'limite': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['listado']['siguiente'], pagina.siguiente)
+
+        # Un cursor bien formado más allá del último producto da una página vacía
+        self.assertEqual(len(paginacion.paginar_por_cursor(Producto.objects.all(), 3, despues=paginacion.codificar_cursor(
+            Producto.objects.order_by('fecha_creacion', 'id').first()))), 0)
+
+
+# Caché del listado (página y fragmentos por producto)
+
+class ListadoCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(nombre='Mesa', descripcion='d', precio=1000, stock=1)
+        self.superusuario = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.lector = CustomUser.objects.create_user('lector', 'lector@ejemplo.com', 'clave')
+        self.lector.user_permissions.add(Permission.objects.get(codename='view_producto'))
+
+    def listado(self, usuario):
+        self.client.force_login(usuario)
+        return self.client.get('/productos/', {'fragmento': '1'}).content.decode()
+
+    def test_nueva_version_del_catalogo_invalida_la_pagina(self):
+        self.assertIn('Mesa', self.listado(self.superusuario))
+        Producto.objects.create(nombre='Silla', descripcion='d', precio=1000, stock=1)
+        self.assertIn('Silla', self.listado(self.superusuario))
+
+        # Editar cambia la versión y la fecha del producto: ni la página ni su fragmento quedan viejos
+        self.producto.nombre = 'Mesa de roble'
+        self.producto.save()
+        html = self.listado(self.superusuario)
+        self.assertIn('Mesa de roble', html)
+        self.assertNotIn('<h5>Mesa</h5>', html)
+
+    def test_la_clave_depende_de_los_permisos(self):
+        editar = f'/productos/editar/{self.producto.pk}/'
+        self.assertIn(editar, self.listado(self.superusuario))
+        # Misma versión y mismo cursor: el lector no recibe la página cacheada del superusuario
+        self.assertNotIn(editar, self.listado(self.lector))
+        self.assertIn('Mesa', self.listado(self.lector))
+        self.assertIn(editar, self.listado(self.superusuario))
+
+
+# Caché de permisos
+
+@override_settings(AUTHENTICATION_BACKENDS=['gestor.backends.CachedModelBackend'])
+class PermisosCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.grupo = Group.objects.create(name='Gestores de Productos')
+        self.grupo.permissions.add(Permission.objects.get(codename='change_producto'))
+        self.usuario = CustomUser.objects.create_user('gestor', 'gestor@ejemplo.com', 'clave')
+        self.usuario.groups.add(self.grupo)
+
+    def test_revocar_invalida_tambien_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grupo.permissions.clear()
+            # Una petición concurrente cachea lo que leyó antes del COMMIT
+            guardar_permisos(self.usuario.pk, {'user': set(), 'group': {'gestor.change_producto'}, 'grupos': set()})
+        self.assertIsNone(leer_permisos(self.usuario.pk))
+        self.assertFalse(CustomUser.objects.get(pk=self.usuario.pk).has_perm('gestor.change_producto'))
+
+
+    def test_cambiar_grupos_del_usuario_invalida(self):
+        otro = Group.objects.create(name='Lectores')
+        usuario = CustomUser.objects.get(pk=self.usuario.pk)
+        usuario.get_all_permissions()
+        self.assertIsNotNone(leer_permisos(usuario.pk))
+        usuario.groups.add(otro)
+        self.assertIsNone(leer_permisos(usuario.pk))
+
+        # Desde el lado del grupo (m2m_changed inverso)
+        usuario.get_all_permissions()
+        self.grupo.user_set.clear()
+        self.assertIsNone(leer_permisos(usuario.pk))
+        self.assertFalse(CustomUser.objects.get(pk=usuario.pk).has_perm('gestor.change_producto'))
+
+
+# Registro: opciones de grupo cacheadas y email único sin distinguir mayúsculas
+
+class RegistroGruposTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lectores = Group.objects.create(name='Lectores')
+
+    def test_opciones_de_grupo_desde_la_cache(self):
+        self.assertEqual(opciones_grupos(), [(self.lectores.pk, 'Lectores')])
+        with self.assertNumQueries(0):
+            opciones_grupos()
+            self.assertEqual(resolver_grupo('Lectores'), (self.lectores.pk, 'Lectores'))
+
+    def test_crear_renombrar_y_borrar_grupos_invalida(self):
+        opciones_grupos()
+        gestores = Group.objects.create(name='Gestores')
+        self.assertEqual(opciones_grupos(), [(gestores.pk, 'Gestores'), (self.lectores.pk, 'Lectores')])
+        gestores.name = 'Administradores'
+        gestores.save()
+        self.assertEqual(resolver_grupo(str(gestores.pk)), (gestores.pk, 'Administradores'))
+        gestores.delete()
+        self.assertIsNone(resolver_grupo('Administradores'))
+        self.assertEqual(opciones_grupos(), [(self.lectores.pk, 'Lectores')])
+
+    def test_email_duplicado_sin_distinguir_mayusculas(self):
+        CustomUser.objects.create_user('ana', 'ana@ejemplo.com', 'clave')
+        self.assertTrue(CustomUser.objects.email_igual('ANA@Ejemplo.com').exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CustomUser.objects.create_user('otra', 'Ana@Ejemplo.COM', 'clave')
+        # Los emails vacíos no cuentan para la unicidad
+        CustomUser.objects.create_user('sin_email_1', '', 'clave')
+        CustomUser.objects.create_user('sin_email_2', '', 'clave')
+
+
+# Límite de intentos
+
+class IpClienteTests(SimpleTestCase):
+
+    def peticion(self, reenviado):
+        return RequestFactory().get('/login/', HTTP_X_FORWARDED_FOR=reenviado, REMOTE_ADDR='10.0.0.1')
+
+    @override_settings(LIMITES_CABECERA_IP='HTTP_X_FORWARDED_FOR', LIMITES_PROXIES_CONFIABLES=1)
+    def test_no_confia_en_lo_que_escribe_el_cliente(self):
+        # El cliente inventa la primera entrada; el proxy agrega la IP real al final
+        self.assertEqual(limites.ip_cliente(self.peticion('1.2.3.4, 203.0.113.7')), '203.0.113.7')
+        self.assertEqual(limites.ip_cliente(self.peticion('203.0.113.7')), '203.0.113.7')
+        with override_settings(LIMITES_PROXIES_CONFIABLES=2):
+            self.assertEqual(limites.ip_cliente(self.peticion('1.2.3.4, 203.0.113.7, 10.0.0.2')), '203.0.113.7')
+
+    def test_sin_cabecera_configurada(self):
+        self.assertEqual(limites.ip_cliente(self.peticion('1.2.3.4')), '10.0.0.1')
+
+
+@override_settings(
+    LIMITES_INTENTOS={'login_ip': (100, 60), 'login_usuario': (3, 60), 'registro_ip': (2, 3600)},
+    LIMITES_BLOQUEO_BASE=30, LIMITES_BLOQUEO_MAX=100,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LimitesIntentosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        CustomUser.objects.create_user('ana', 'ana@ejemplo.com', 'clave-correcta')
+
+    def login(self, clave):
+        return self.client.post('/login/', {'username': 'ana', 'password': clave})
+
+    def test_ventana_deslizante(self):
+        inicio = 60 * 1_000_000
+        for _ in range(4):
+            limites.registrar('login_usuario', 'ana', ahora=inicio + 10)
+        self.assertEqual(limites.contar('login_usuario', 'ana', ahora=inicio + 59), 4)
+        # 10 s dentro de la ventana siguiente: la anterior pesa 50/60
+        self.assertAlmostEqual(limites.contar('login_usuario', 'ana', ahora=inicio + 70), 4 * 50 / 60)
+        self.assertEqual(limites.contar('login_usuario', 'ana', ahora=inicio + 130), 0)
+
+    def test_bloqueo_con_429_y_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(self.login('mala').status_code, 200)
+        with mock.patch('gestor.views.authenticate') as autenticar:
+            response = self.login('clave-correcta')
+            # Bloqueado aunque la clave sea correcta, y sin calcular el hash
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertFalse(autenticar.called)
+
+    def test_espera_exponencial_con_maximo(self):
+        self.assertEqual([limites.bloquear('login_usuario', 'ana') for _ in range(4)], [30, 60, 100, 100])
+        self.assertIn(('login_usuario', 'ana'), limites.bloqueados())
+
+    def test_login_correcto_reinicia_el_contador(self):
+        self.login('mala')
+        self.login('mala')
+        self.assertEqual(self.login('clave-correcta').status_code, 302)
+        self.assertEqual(limites.contar('login_usuario', 'ana'), 0)
+        self.client.logout()
+        for _ in range(3):
+            self.assertEqual(self.login('mala').status_code, 200)
+
+    def test_registro_por_ip(self):
+        datos = {'username': 'nuevo', 'email': 'x', 'password1': 'a', 'password2': 'b'}
+        self.assertEqual([self.client.post('/register/', datos).status_code for _ in range(3)], [200, 200, 429])
+
+
+# Búsqueda
+
+class BusquedaTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+        self.producto = Producto.objects.create(nombre='Casco abc', descripcion='Casco de ciclismo', precio=1000, stock=1)
+
+    def test_caracteres_de_control_en_el_termino(self):
+        self.assertEqual(buscar_ids('abc\x00', 10), [self.producto.pk])
+        self.assertEqual(buscar_ids('casco\x00\x01ciclismo', 10), [self.producto.pk])
+        self.assertEqual(buscar_ids('\x00', 10), [])
+        response = self.client.get('/productos/buscar/', {'q': 'abc\x00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.pk for p in response.context['productos']], [self.producto.pk])
+        self.assertEqual(self.client.get('/api/productos/', {'q': 'abc\x00'}).status_code, 200)
+
+
+# API JSON: respuestas condicionales y validación
+
+class ProductoApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.client.force_login(self.usuario)
+        self.producto = Producto.objects.create(nombre='Mesa', descripcion='De pino', precio=5000, stock=2)
+        self.url = f'/api/productos/{self.producto.pk}/'
+
+    def test_etag_e_if_none_match(self):
+        listado = self.client.get('/api/productos/', {'limite': 5})
+        self.assertEqual(self.client.get('/api/productos/', {'limite': 5}, HTTP_IF_NONE_MATCH=listado['ETag']).status_code, 304)
+        # Otra consulta u otro estado del catálogo no reutilizan el ETag
+        self.assertEqual(self.client.get('/api/productos/', {'limite': 6}, HTTP_IF_NONE_MATCH=listado['ETag']).status_code, 200)
+        Producto.objects.create(nombre='Silla', descripcion='d', precio=1000, stock=1)
+        self.assertEqual(self.client.get('/api/productos/', {'limite': 5}, HTTP_IF_NONE_MATCH=listado['ETag']).status_code, 200)
+
+        detalle = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detalle['ETag']).status_code, 304)
+
+    def test_last_modified_e_if_modified_since(self):
+        detalle = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=detalle['Last-Modified']).status_code, 304)
+        Producto.objects.filter(pk=self.producto.pk).update(fecha_actualizacion=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=detalle['Last-Modified']).status_code, 200)
+
+    def test_if_match_desactualizado_responde_412(self):
+        etag = self.client.get(self.url)['ETag']
+        Producto.objects.filter(pk=self.producto.pk).update(fecha_actualizacion=timezone.now() + timedelta(seconds=5))
+        response = self.client.patch(self.url, json.dumps({'stock': 9}), content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH=etag).status_code, 412)
+
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, json.dumps({'stock': 9}), content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()['stock']), (200, 9))
+        self.assertNotEqual(response['ETag'], etag)
+
+    async def test_errores_de_validacion_al_escribir(self):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.post(
+            '/api/productos/', {'nombre': 'MESA', 'descripcion': 'd', 'precio': '0', 'stock': '-1'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errores']), {'nombre', 'precio', 'stock'})
+
+        response = await self.async_client.post('/api/productos/', '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.patch(self.url, {'precio': 'abc'}, content_type='application/json')
+        self.assertEqual((response.status_code, list(response.json()['errores'])), (400, ['precio']))
+        self.assertEqual(await Producto.objects.filter(pk=self.producto.pk).values_list('precio', flat=True).aget(), Decimal('5000.00'))
+
+
+# Réplicas de lectura: router y ventana de "leer lo propio"
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'], REPLICA_PIN_SEGUNDOS=5)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.token = routers.iniciar_peticion()
+
+    def tearDown(self):
+        routers.terminar_peticion(self.token)
+
+    def test_configuracion_desde_entorno(self):
+        urls = 'sqlite:////tmp/replica_a.sqlite3, sqlite:///replica_b.sqlite3'
+        with mock.patch.dict(os.environ, {'DATABASE_REPLICAS': urls}):
+            replicas = database.configuracion_replicas('/proyecto')
+        self.assertEqual(list(replicas), ['replica_1', 'replica_2'])
+        self.assertEqual(replicas['replica_1']['NAME'], '/tmp/replica_a.sqlite3')
+        self.assertEqual(replicas['replica_2']['NAME'], '/proyecto/replica_b.sqlite3')
+        self.assertEqual(replicas['replica_2']['TEST'], {'MIRROR': 'default'})
+
+    def test_configuracion_por_defecto(self):
+        with mock.patch.dict(os.environ, clear=True):
+            configuracion = database.configuracion_por_defecto('/proyecto')
+            pragmas = database.pragmas_sqlite()
+        self.assertEqual(configuracion['NAME'], '/proyecto/db.sqlite3')
+        self.assertEqual(configuracion['CONN_MAX_AGE'], 0)
+        self.assertEqual(configuracion['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual((pragmas['journal_mode'], pragmas['synchronous']), ('WAL', 'NORMAL'))
+
+    def test_lecturas_del_catalogo_van_a_las_replicas(self):
+        for modelo in (Producto, EstadisticaCatalogo):
+            self.assertIn(self.router.db_for_read(modelo), ['replica_1', 'replica_2'])
+
+    def test_autenticacion_y_escrituras_van_a_la_primaria(self):
+        for modelo in (CustomUser, Group, Permission):
+            self.assertEqual(self.router.db_for_read(modelo), 'default')
+        self.assertEqual(self.router.db_for_write(Producto), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'gestor'))
+
+    def test_despues_de_escribir_se_lee_de_la_primaria(self):
+        self.router.db_for_write(CustomUser)
+        self.assertNotEqual(self.router.db_for_read(Producto), 'default')
+        self.router.db_for_write(Producto)
+        self.assertEqual(self.router.db_for_read(Producto), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sin_replicas(self):
+        self.assertEqual(self.router.db_for_read(Producto), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_PIN_SEGUNDOS=5)
+class PrimariaTrasEscrituraMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = routers.ReplicaRouter()
+
+    def ejecutar(self, request, escribir=False):
+        lecturas = []
+
+        def vista(request):
+            if escribir:
+                self.router.db_for_write(Producto)
+            lecturas.append(self.router.db_for_read(Producto))
+            return HttpResponse()
+
+        response = PrimariaTrasEscrituraMiddleware(vista)(request)
+        return response, lecturas[0]
+
+    def test_escritura_fija_la_primaria_por_un_tiempo(self):
+        response, _ = self.ejecutar(self.factory.post('/productos/crear/'), escribir=True)
+        cookie = response.cookies[PrimariaTrasEscrituraMiddleware.COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        # La siguiente lectura del mismo cliente va a la primaria
+        request = self.factory.get('/productos/')
+        request.COOKIES[PrimariaTrasEscrituraMiddleware.COOKIE] = cookie.value
+        _, base = self.ejecutar(request)
+        self.assertEqual(base, 'default')
+
+    def test_lectura_sin_escrituras_usa_la_replica(self):
+        response, base = self.ejecutar(self.factory.get('/productos/'))
+        self.assertEqual(base, 'replica_1')
+        self.assertNotIn(PrimariaTrasEscrituraMiddleware.COOKIE, response.cookies)
+
+
+# Nombre único de productos
+
+class ProductoFormTests(TestCase):
+
+    DATOS = {'nombre': 'Silla', 'descripcion': 'De madera', 'precio': '1000', 'stock': '1'}
+
+    def test_nombre_tomado_entre_la_validacion_y_el_insert(self):
+        form = ProductoForm(self.DATOS)
+        self.assertTrue(form.is_valid())
+        # Otra petición crea el mismo nombre después de clean_nombre
+        Producto.objects.create(nombre='SILLA', descripcion='d', precio=1000, stock=1)
+        self.assertIsNone(form.save())
+        self.assertEqual(form.errors['nombre'], ['Ya existe un producto con el nombre "Silla"'])
+        self.assertEqual(Producto.objects.count(), 1)
+
+    def test_otros_errores_de_integridad_se_propagan(self):
+        form = ProductoForm(self.DATOS)
+        self.assertTrue(form.is_valid())
+        with mock.patch('django.forms.ModelForm.save', side_effect=IntegrityError('CHECK constraint failed: otro')):
+            with self.assertRaises(IntegrityError):
+                form.save()
+
+
+# Importación por lotes
+
+class ImportacionTests(TestCase):
+
+    CABECERA = 'nombre,descripcion,precio,stock\n'
+
+    def setUp(self):
+        cache.clear()
+        self.existente = Producto.objects.create(nombre='Mesa', descripcion='De pino', precio=5000, stock=2)
+
+    def importar(self, filas, **opciones):
+        return importacion.importar_productos(StringIO(self.CABECERA + filas), 'csv', **opciones)
+
+    def test_validacion_de_filas(self):
+        resultado = self.importar(
+            'Silla,De madera,1500.555,3\n'
+            ',Sin nombre,100,1\n'
+            'Banco,,100,1\n'
+            'Banco,Largo,abc,1\n'
+            'Banco,Largo,0,1\n'
+            'Banco,Largo,100,-1\n'
+            'Banco,Largo,100,1.5\n'
+        )
+        self.assertEqual((resultado.leidas, resultado.creados, resultado.rechazados), (7, 1, 6))
+        self.assertEqual([linea for linea, _ in resultado.errores], [3, 4, 5, 6, 7, 8])
+        self.assertIn('descripción es obligatoria', resultado.errores[1][1])
+        self.assertIn('no puede ser negativo', resultado.errores[4][1])
+        self.assertEqual(Producto.objects.get(nombre='Silla').precio, Decimal('1500.56'))
+
+    def test_nombres_repetidos_en_el_archivo(self):
+        # En el mismo lote y en lotes distintos, sin distinguir mayúsculas
+        for tamano_lote in (100, 1):
+            Producto.objects.exclude(pk=self.existente.pk).delete()
+            resultado = self.importar('Silla,a,100,1\nSILLA,b,100,1\nmesa,c,100,1\nsilla ,d,100,1\n', tamano_lote=tamano_lote)
+            self.assertEqual((resultado.creados, resultado.rechazados), (1, 3))
+            self.assertEqual(sorted(linea for linea, _ in resultado.errores), [3, 4, 5])
+            self.assertEqual(Producto.objects.get(nombre__iexact='silla').descripcion, 'a')
+
+    def test_actualizar_productos_existentes(self):
+        resultado = self.importar('MESA,De roble,7000,9\nSilla,Nueva,100,1\n', actualizar=True)
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.rechazados), (1, 1, 0))
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nombre, self.existente.descripcion, self.existente.precio, self.existente.stock),
+                         ('Mesa', 'De roble', Decimal('7000.00'), 9))
+        guardadas = estadisticas.obtener()
+        for campo, valor in estadisticas.agregados(Producto.objects.all()).items():
+            self.assertEqual(getattr(guardadas, campo), valor, campo)
+
+    def test_archivo_ilegible(self):
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+        latin1 = SimpleUploadedFile('productos.csv', (self.CABECERA + 'Sillón,d,100,1\n').encode('latin-1'))
+        response = self.client.post('/productos/importar/', {'archivo': latin1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('UTF-8', response.context['form'].errors['archivo'][0])
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'productos.csv')
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.write(self.CABECERA + 'Silla,"' + 'x' * (csv.field_size_limit() + 1) + '",100,1\n')
+            with self.assertRaisesMessage(CommandError, 'CSV mal formado'):
+                call_command('importar_productos', ruta, stdout=StringIO())
+        self.assertEqual(list(Producto.objects.values_list('nombre', flat=True)), ['Mesa'])
+
+
+# Exportación desde la línea de comandos
+
+class ExportacionTests(TestCase):
+
+    def setUp(self):
+        Producto.objects.create(nombre='Sillín ñandú', descripcion='d', precio=1000, stock=2)
+
+    def test_la_salida_estandar_se_puede_capturar(self):
+        salida = StringIO()
+        call_command('exportar_productos', '--formato', 'jsonl', stdout=salida)
+        self.assertIn('Sillín ñandú', salida.getvalue())
+
+    def test_gzip_sin_salida_binaria(self):
+        with self.assertRaises(CommandError):
+            call_command('exportar_productos', '--gzip', stdout=StringIO())
+
+    @override_settings(EXPORTACION_CHUNK_SIZE=1)
+    async def test_bajo_asgi_el_contenido_es_asincrono(self):
+        await self.async_client.aforce_login(await CustomUser.objects.acreate(username='root', is_superuser=True))
+        for parametros in ({'formato': 'jsonl'}, {'formato': 'csv', 'gzip': '1'}):
+            response = await self.async_client.get('/productos/exportar/', parametros)
+            self.assertTrue(response.is_async)
+            contenido = b''.join([bloque async for bloque in response.streaming_content])
+            if 'gzip' in parametros:
+                contenido = gzip.decompress(contenido)
+            self.assertIn('Sillín ñandú', contenido.decode())
+
+
+# Sesiones y mensajes: consultas a django_session
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SesionesTests(TestCase):
+
+    def medir(self, almacenamiento):
+        from .management.commands.benchmark_sesiones import Command
+        usuario = CustomUser.objects.create_superuser(f'root_{almacenamiento}', f'{almacenamiento}@ejemplo.com', 'clave')
+        return {paso: (de_sesion, escrituras) for paso, _, de_sesion, escrituras in Command().medir(almacenamiento, usuario, 'fallback')}
+
+    def test_cached_db_no_lee_django_session(self):
+        # Ni leer ni crear (el mensaje va en la cookie) tocan la tabla de sesiones
+        self.assertEqual(set(self.medir('cached_db').values()), {(0, 0)})
+        self.assertEqual(set(self.medir('db').values()), {(1, 0)})
+
+    def test_cached_db_solo_con_cache_compartida(self):
+        from gestor_productos import settings as modulo
+
+        def motor(entorno):
+            with mock.patch.dict(os.environ, entorno):
+                os.environ.pop('SESSION_ALMACENAMIENTO', None)
+                if not entorno:
+                    os.environ.pop('REDIS_URL', None)
+                return importlib.reload(modulo).SESSION_ENGINE
+
+        try:
+            self.assertEqual(motor({}), 'django.contrib.sessions.backends.db')
+            self.assertEqual(motor({'REDIS_URL': 'redis://cache:6379/0'}), 'django.contrib.sessions.backends.cached_db')
+        finally:
+            importlib.reload(modulo)
+
+
+# Benchmark de vistas: presupuestos de consultas
+
+# MD5 solo para que login y registro no dominen el tiempo del test
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkTests(TestCase):
+    """Todas las rutas responden y se mantienen dentro de su presupuesto de consultas"""
+
+    def test_escenarios_dentro_del_presupuesto(self):
+        admin = benchmark.sembrar(productos=60, usuarios=10)
+        resultados = benchmark.ejecutar(admin, iteraciones=2, calentamiento=1)
+        self.assertEqual(set(resultados), {escenario.nombre for escenario in benchmark.ESCENARIOS})
+        self.assertEqual(benchmark.excedidos(resultados), [])
+
+    def test_comparar_con_la_base(self):
+        base = {'productos': {'consultas': 2, 'p95_ms': 10.0}}
+        igual = {'productos': {'consultas': 2, 'p95_ms': 11.0}}
+        peor = {'productos': {'consultas': 3, 'p95_ms': 15.0}}
+        self.assertEqual(benchmark.comparar(igual, base, tolerancia=0.2), [])
+        self.assertEqual(benchmark.comparar(peor, base, tolerancia=0.2), [
+            ('productos', 'consultas', 2, 3),
+            ('productos', 'p95_ms', 10.0, 15.0),
+        ])
+
+
+# Instrumentación: Server-Timing, peticiones lentas y /metricas/
+
+@override_settings(METRICAS_TOKEN='secreto', METRICAS_UMBRAL_LENTO_MS=60_000)
+class MetricasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metricas.registro.limpiar()
+        self.superuser = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.client.force_login(self.superuser)
+
+    def test_server_timing(self):
+        response = self.client.get('/productos/')
+        cabecera = response['Server-Timing']
+        self.assertRegex(cabecera, r'db;dur=[\d.]+;desc="\d+ consultas"')
+        self.assertIn('tpl;dur=', cabecera)
+        self.assertIn('total;dur=', cabecera)
+
+    def test_peticion_lenta_en_el_log(self):
+        with override_settings(METRICAS_UMBRAL_LENTO_MS=0), self.assertLogs('gestor.metricas', 'WARNING') as logs:
+            self.client.get('/productos/')
+        self.assertIn('GET /productos/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_histograma_por_ruta(self):
+        producto = Producto.objects.create(nombre='Medido', descripcion='d', precio=1000, stock=3)
+        self.client.get(f'/productos/editar/{producto.pk}/')
+        self.client.get(f'/productos/editar/{producto.pk}/')
+        texto = self.client.get('/metricas/').content.decode()
+        # Una serie por patrón de URL, no por id
+        self.assertIn(
+            'gestor_peticion_segundos_count{ruta="/productos/editar/<int:pk>/",metodo="GET",estado="200"} 2', texto
+        )
+        self.assertIn('le="+Inf"', texto)
+        self.assertIn('gestor_consultas_sql_total{ruta="/productos/editar/<int:pk>/"', texto)
+
+    def test_acceso_a_las_metricas(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/metricas/').status_code, 403)
+        self.assertEqual(self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        response = self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+# Datos de ejemplo del README (loaddata datos_demo)
+
+class DatosDemoTests(TestCase):
+
+    fixtures = ['datos_demo']
+
+    def test_usuarios_y_grupos_del_readme(self):
+        usuarios = {u.username: u for u in CustomUser.objects.all()}
+        self.assertTrue(usuarios['superuser1'].is_superuser)
+        self.assertTrue(usuarios['admin1'].has_perm('gestor.delete_producto'))
+        self.assertTrue(usuarios['gestor1'].has_perm('gestor.change_producto'))
+        self.assertFalse(usuarios['gestor1'].has_perm('gestor.delete_producto'))
+        self.assertEqual(estadisticas.obtener().total_productos, Producto.objects.count())
+
+
+# Datos sintéticos (generar_datos)
+
+class GeneracionTests(TestCase):
+
+    def test_filas_deterministas(self):
+        referencia = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        primera = list(generacion.filas_productos(50, semilla=3, referencia=referencia))
+        self.assertEqual(primera, list(generacion.filas_productos(50, semilla=3, referencia=referencia)))
+        self.assertNotEqual(primera, list(generacion.filas_productos(50, semilla=4, referencia=referencia)))
+        for nombre, descripcion, precio, stock, creacion, actualizacion, resumen in primera:
+            self.assertEqual(resumen, Producto.generar_resumen(descripcion))
+            self.assertLessEqual(creacion, actualizacion)
+            self.assertLessEqual(actualizacion, referencia)
+
+    def test_generar_productos_con_indices_diferidos(self):
+        Producto.objects.create(nombre='Existente', descripcion='d', precio=1000, stock=1)
+        self.assertEqual(generacion.generar_productos(300, tamano_lote=128, diferir=True), 300)
+
+        nombres = list(Producto.objects.values_list('nombre', flat=True))
+        self.assertEqual(len(nombres), 301)
+        self.assertEqual(len({nombre.lower() for nombre in nombres}), 301)
+        # Índices, restricción única y búsqueda vuelven a estar en su lugar
+        with connection.cursor() as cursor:
+            indices = set(connection.introspection.get_constraints(cursor, 'gestor_producto'))
+        self.assertTrue({'producto_fecha_id_idx', 'producto_stock_idx', 'producto_nombre_ci_unico'} <= indices)
+        self.assertTrue(buscar_ids(nombres[-1].split()[0], 5))
+        self.assertEqual(estadisticas.obtener().total_productos, 301)
+
+    def test_generar_usuarios(self):
+        self.assertEqual(generacion.generar_usuarios(40, prefijo='carga'), 40)
+        usuarios = CustomUser.objects.filter(username__startswith='carga')
+        self.assertEqual(usuarios.count(), 40)
+        self.assertTrue(usuarios.filter(groups__name='Gestores de Productos').exists())
+        self.assertTrue(usuarios.first().check_password('gestor1234'))
+
+    def test_generar_usuarios_tras_borrar_continua_la_numeracion(self):
+        generacion.generar_usuarios(5, prefijo='carga')
+        CustomUser.objects.filter(username__in=['carga000001', 'carga000002']).delete()
+        # Un nombre con el prefijo pero sin número no cuenta
+        CustomUser.objects.create_user('carga_admin', 'admin@ejemplo.com', 'clave')
+        self.assertEqual(generacion.generar_usuarios(3, prefijo='carga'), 3)
+        self.assertEqual(
+            list(CustomUser.objects.filter(username__startswith='carga0').order_by('username').values_list('username', flat=True)),
+            ['carga000000', 'carga000003', 'carga000004', 'carga000005', 'carga000006', 'carga000007'],
+        )
+
+    def test_comando_con_usuarios_duplicados(self):
+        CustomUser.objects.create_user('otro', 'carga000000@ejemplo.test', 'clave')
+        with self.assertRaisesMessage(CommandError, 'Usuarios duplicados'):
+            call_command('generar_datos', productos=0, usuarios=2, prefijo_usuarios='carga', stdout=StringIO())
+        self.assertFalse(CustomUser.objects.filter(username__startswith='carga').exists())
+
+
+# Estadísticas del catálogo (fila mantenida por señales)
+
+class EstadisticasCatalogoTests(TestCase):
+
+    def setUp(self):
+        self.mesa = Producto.objects.create(nombre='Mesa', descripcion='d', precio=Decimal('1500.50'), stock=4)
+        self.silla = Producto.objects.create(nombre='Silla', descripcion='d', precio=800, stock=20)
+
+    def assertEstadisticasConsistentes(self):
+        guardadas = estadisticas.obtener()
+        for campo, valor in estadisticas.agregados(Producto.objects.all()).items():
+            self.assertEqual(getattr(guardadas, campo), valor, campo)
+
+    def version(self):
+        return estadisticas.version_catalogo()[0]
+
+    def test_alta_suma_el_producto(self):
+        guardadas = estadisticas.obtener()
+        self.assertEqual(guardadas.total_productos, 2)
+        self.assertEqual(guardadas.total_unidades, 24)
+        self.assertEqual(guardadas.valor_inventario, Decimal('22002.00'))
+        self.assertEqual((guardadas.productos_stock_bajo, guardadas.productos_disponibles), (1, 1))
+
+    def test_guardar_mueve_el_producto_de_tramo_y_sube_la_version(self):
+        version = self.version()
+        self.silla.stock = 0
+        self.silla.save()
+        self.assertEqual(estadisticas.obtener().productos_sin_stock, 1)
+        self.assertEqual(estadisticas.obtener().productos_disponibles, 0)
+        self.assertEstadisticasConsistentes()
+        self.assertGreater(self.version(), version)
+
+    def test_renombrar_sube_la_version_sin_cambiar_totales(self):
+        version = self.version()
+        antes = estadisticas.agregados(Producto.objects.all())
+        self.mesa.nombre = 'Mesa grande'
+        self.mesa.save()
+        self.assertEqual(estadisticas.agregados(Producto.objects.all()), antes)
+        self.assertEstadisticasConsistentes()
+        self.assertGreater(self.version(), version)
+
+    def test_borrar_resta_el_producto(self):
+        version = self.version()
+        self.mesa.delete()
+        self.assertEqual(estadisticas.obtener().total_productos, 1)
+        self.assertEqual(estadisticas.obtener().productos_stock_bajo, 0)
+        self.assertEstadisticasConsistentes()
+        self.assertGreater(self.version(), version)
+
+    def test_seguimiento_de_operaciones_masivas(self):
+        queryset = Producto.objects.filter(pk__in=[self.mesa.pk, self.silla.pk])
+        with estadisticas.seguimiento(queryset):
+            queryset.update(stock=0)
+        self.assertEqual(estadisticas.obtener().productos_sin_stock, 2)
+        self.assertEstadisticasConsistentes()
+
+    def test_recalcular_corrige_la_deriva(self):
+        # update() no dispara señales: la fila queda desfasada
+        Producto.objects.update(stock=0)
+        self.assertEqual(estadisticas.obtener().total_unidades, 24)
+        version = self.version()
+        self.assertEqual(estadisticas.recalcular()['total_unidades'], 0)
+        self.assertEstadisticasConsistentes()
+        self.assertGreater(self.version(), version)
+
+    def test_reconciliar_estadisticas(self):
+        Producto.objects.filter(pk=self.silla.pk).update(stock=5)
+        salida = StringIO()
+        call_command('reconciliar_estadisticas', '--solo-verificar', stdout=salida)
+        self.assertIn('total_unidades: guardado=24 real=9', salida.getvalue())
+        self.assertEqual(estadisticas.obtener().total_unidades, 24)
+
+        call_command('reconciliar_estadisticas', stdout=StringIO())
+        self.assertEstadisticasConsistentes()
+        salida = StringIO()
+        call_command('reconciliar_estadisticas', stdout=salida)
+        self.assertIn('al día', salida.getvalue())
+
+
+# Panel de inventario: tramos de stock con CASE/WHEN
+
+class InventarioPanelTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Stocks en los bordes de cada tramo (STOCK_BAJO_UMBRAL = 10)
+        for stock in (0, 1, 9, 10, 11):
+            Producto.objects.create(nombre=f'Stock {stock}', descripcion='d', precio=100, stock=stock)
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+
+    def test_tramos_en_los_limites_del_umbral(self):
+        response = self.client.get('/productos/inventario/')
+        self.assertEqual(response.status_code, 200)
+        tramos = {fila['estado']: (fila['productos'], fila['unidades'], fila['valor']) for fila in response.context['resumen']}
+        self.assertEqual(tramos, {
+            ESTADO_SIN_STOCK: (1, 0, Decimal(0)),
+            ESTADO_STOCK_BAJO: (2, 10, Decimal(1000)),
+            ESTADO_DISPONIBLE: (2, 21, Decimal(2100)),
+        })
+        self.assertEqual(response.context['total_productos'], 5)
+        self.assertEqual(response.context['total_unidades'], 31)
+        self.assertEqual(response.context['total_valor'], Decimal(3100))
+
+    def test_coincide_con_los_filtros_por_estado(self):
+        for fila in estadisticas.resumen_por_estado(usar_cache=False):
+            self.assertEqual(fila['productos'], Producto.objects.estado_stock(fila['estado']).count(), fila['etiqueta'])
+
+    def test_tramo_vacio_aparece_con_ceros(self):
+        Producto.objects.filter(stock=0).delete()
+        resumen = estadisticas.resumen_por_estado(usar_cache=False)
+        self.assertEqual(resumen[ESTADO_SIN_STOCK], {
+            'estado': ESTADO_SIN_STOCK, 'etiqueta': ESTADOS_STOCK[ESTADO_SIN_STOCK],
+            'productos': 0, 'unidades': 0, 'valor': Decimal(0),
+        })
+
+
+# Movimientos de stock
+
+class InventarioTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.escaso = Producto.objects.create(nombre='Escaso', descripcion='d', precio=1000, stock=3)
+        self.lleno = Producto.objects.create(nombre='Lleno', descripcion='d', precio=2500, stock=10)
+
+    def assertEstadisticasConsistentes(self):
+        guardadas = estadisticas.obtener()
+        for campo, valor in estadisticas.agregados(Producto.objects.all()).items():
+            self.assertEqual(getattr(guardadas, campo), valor, campo)
+
+    def stock(self):
+        return dict(Producto.objects.values_list('nombre', 'stock'))
+
+    def test_descuento_sin_stock_suficiente(self):
+        resultados = inventario.aplicar_movimientos([(self.escaso.pk, -5), (self.lleno.pk, -1), (0, 1)])
+        self.assertEqual([estado for _, _, estado in resultados], [
+            inventario.STOCK_INSUFICIENTE, inventario.OK, inventario.NO_EXISTE,
+        ])
+        self.assertEqual(self.stock(), {'Escaso': 3, 'Lleno': 9})
+        # Lleno pasa de disponible a stock bajo
+        self.assertEqual(estadisticas.obtener().productos_stock_bajo, 2)
+        self.assertEstadisticasConsistentes()
+
+    def test_todo_o_nada_deshace_todas_las_lineas(self):
+        version = estadisticas.version_catalogo()[0]
+        with self.assertRaises(inventario.StockInsuficiente) as error:
+            inventario.reservar([(self.lleno.pk, 4), (self.escaso.pk, 4)])
+        self.assertEqual(error.exception.resultados, [
+            (self.lleno.pk, -4, inventario.OK), (self.escaso.pk, -4, inventario.STOCK_INSUFICIENTE),
+        ])
+        self.assertEqual(self.stock(), {'Escaso': 3, 'Lleno': 10})
+        self.assertEqual(estadisticas.version_catalogo()[0], version)
+        self.assertEstadisticasConsistentes()
+
+    def test_la_vista_responde_409_si_no_alcanza(self):
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+        datos = {'movimientos': [{'id': self.lleno.pk, 'cantidad': -2}, {'id': self.escaso.pk, 'cantidad': -4}], 'todo_o_nada': True}
+        response = self.client.post('/productos/stock/', json.dumps(datos), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['aplicado'], False)
+        self.assertEqual([r['estado'] for r in response.json()['resultados']], ['ok', 'stock_insuficiente'])
+        self.assertEqual(self.stock(), {'Escaso': 3, 'Lleno': 10})
+
+        datos['movimientos'][1]['cantidad'] = -3
+        response = self.client.post('/productos/stock/', json.dumps(datos), content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['aplicado']), (200, True))
+        self.assertEqual(self.stock(), {'Escaso': 0, 'Lleno': 8})
+        self.assertEstadisticasConsistentes()
+
+
+class OperacionesMasivasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.superuser = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.client.force_login(self.superuser)
+        for i, (precio, stock) in enumerate([(990, 0), (3190, 4), (8190, 25), (15000, 2)]):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='d', precio=precio, stock=stock)
+
+    def assertEstadisticasConsistentes(self):
+        guardadas = estadisticas.obtener()
+        for campo, valor in estadisticas.agregados(Producto.objects.all()).items():
+            self.assertEqual(getattr(guardadas, campo), valor, campo)
+
+    def test_repreciar_con_redondeo(self):
+        afectados = masivo.actualizar(Producto.objects.all(), {
+            'precio': masivo.expresion_precio(porcentaje=Decimal('-12.5'), redondeo=100),
+        })
+        self.assertEqual(afectados, 4)
+        precios = sorted(Producto.objects.values_list('precio', flat=True))
+        self.assertEqual(precios, [900, 2800, 7200, 13100])
+        self.assertEstadisticasConsistentes()
+
+    def test_ajuste_de_stock_no_baja_de_cero(self):
+        masivo.actualizar(Producto.objects.filter(precio__lt=10000), {'stock': masivo.expresion_stock(ajuste=-5)})
+        self.assertEqual(sorted(Producto.objects.values_list('stock', flat=True)), [0, 0, 2, 20])
+        self.assertEstadisticasConsistentes()
+
+    def test_filtro_sobre_la_columna_modificada(self):
+        # Tras el UPDATE el filtro ya no identifica las mismas filas: se recalcula
+        masivo.actualizar(Producto.objects.filter(stock__lt=5), {'stock': masivo.expresion_stock(fijar=10)})
+        self.assertEqual(Producto.objects.filter(stock=10).count(), 3)
+        self.assertEstadisticasConsistentes()
+
+    def test_borrar(self):
+        self.assertEqual(masivo.borrar(Producto.objects.filter(precio__gte=5000)), 2)
+        self.assertEqual(Producto.objects.count(), 2)
+        # Los triggers sacan del índice de búsqueda lo borrado
+        self.assertEqual(len(buscar_ids('Producto', 10)), 2)
+        self.assertEstadisticasConsistentes()
+
+    def test_vista_previa_no_modifica(self):
+        version = estadisticas.version_catalogo()
+        previa = masivo.vista_previa(Producto.objects.all(), {'stock': masivo.expresion_stock(fijar=0)})
+        self.assertEqual(previa['antes']['total_unidades'], 31)
+        self.assertEqual(previa['despues']['total_unidades'], 0)
+        self.assertEqual(previa['despues']['productos_sin_stock'], 4)
+        self.assertEqual(len(previa['muestra']), 4)
+        self.assertEqual(Producto.objects.filter(stock=0).count(), 1)
+        self.assertEqual(estadisticas.version_catalogo(), version)
+
+    def test_vista_previsualizar_y_aplicar(self):
+        datos = {'precio_min': '3000', 'operacion': 'precio_monto', 'valor': '10', 'redondeo': '10'}
+        response = self.client.post('/productos/masivo/', {**datos, 'previsualizar': ''})
+        self.assertContains(response, 'Aplicar a 3 productos')
+        self.assertFalse(Producto.objects.filter(precio=3200).exists())
+
+        response = self.client.post('/productos/masivo/', {**datos, 'aplicar': ''})
+        self.assertRedirects(response, '/productos/', fetch_redirect_response=False)
+        self.assertEqual(sorted(Producto.objects.values_list('precio', flat=True)), [990, 3200, 8200, 15010])
+
+    def test_vista_borrar_requiere_permiso(self):
+        gestor = CustomUser.objects.create_user('gestor', 'gestor@ejemplo.com', 'clave')
+        gestor.user_permissions.add(
+            Permission.objects.get(codename='view_producto'), Permission.objects.get(codename='change_producto'),
+        )
+        self.client.force_login(gestor)
+        response = self.client.post('/productos/masivo/', {'operacion': 'borrar', 'redondeo': '1', 'aplicar': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Producto.objects.count(), 4)
+
+    def test_accion_admin(self):
+        seleccion = list(Producto.objects.filter(stock__gt=0).values_list('pk', flat=True))
+        datos = {
+            'action': 'operacion_masiva', 'index': '0', '_selected_action': seleccion,
+            'operacion': 'stock_ajustar', 'valor': '3', 'redondeo': '1',
+        }
+        response = self.client.post('/admin/gestor/producto/', {**datos, 'previsualizar': ''})
+        self.assertContains(response, 'Aplicar a 3 productos')
+
+        response = self.client.post('/admin/gestor/producto/', {**datos, 'aplicar': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(Producto.objects.values_list('stock', flat=True)), [0, 5, 7, 28])
+        self.assertEstadisticasConsistentes()
+
+    def test_accion_admin_borrar_todo_el_filtro(self):
+        # Con "seleccionar todos" el admin envía también las filas marcadas de la página
+        visibles = list(Producto.objects.filter(stock=0).values_list('pk', flat=True))
+        datos = {'action': 'borrar_masivo', 'index': '0', 'select_across': '1', '_selected_action': visibles}
+        response = self.client.post('/admin/gestor/producto/?estado_stock=0', {**datos, 'aplicar': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Producto.objects.count(), 3)
+        acciones = self.client.get('/admin/gestor/producto/').context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', dict(acciones))
+        self.assertEstadisticasConsistentes()
+
+
+class ArchivoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        hace_un_anio = timezone.now() - timedelta(days=365)
+        for i, stock in enumerate([0, 0, 5, 30]):
+            Producto.objects.create(nombre=f'Lámpara {i}', descripcion='Lámpara de escritorio', precio=1000, stock=stock)
+        Producto.objects.filter(nombre__in=['Lámpara 0', 'Lámpara 2']).update(fecha_actualizacion=hace_un_anio)
+        Producto.objects.filter(nombre='Lámpara 3').update(descontinuado=True)
+
+    def assertEstadisticasConsistentes(self):
+        guardadas = estadisticas.obtener()
+        for campo, valor in estadisticas.agregados(Producto.objects.all()).items():
+            self.assertEqual(getattr(guardadas, campo), valor, campo)
+
+    def test_archivar_por_lotes(self):
+        creado = Producto.objects.get(nombre='Lámpara 0').fecha_creacion
+        self.assertEqual(archivo.archivar_por_lotes(archivo.candidatos('sin_stock', 90), 'sin_stock', tamano_lote=1), 1)
+        self.assertEqual(archivo.archivar_por_lotes(archivo.candidatos('descontinuado'), 'descontinuado'), 1)
+
+        self.assertEqual(sorted(Producto.objects.values_list('nombre', flat=True)), ['Lámpara 1', 'Lámpara 2'])
+        archivado = ProductoArchivado.objects.get(nombre='Lámpara 0')
+        self.assertEqual((archivado.motivo, archivado.fecha_creacion), ('sin_stock', creado))
+        self.assertTrue(ProductoArchivado.objects.get(nombre='Lámpara 3').descontinuado)
+        self.assertEqual(len(buscar_ids('lampara', 10)), 2)
+        self.assertEstadisticasConsistentes()
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_con_replicas_archiva_en_la_primaria(self):
+        # Las lecturas del catálogo van a una réplica (que aquí no existe: usarla falla)
+        def leer_de_replica(router, model, **hints):
+            catalogo = (model._meta.app_label, model._meta.model_name) in routers.MODELOS_CATALOGO
+            return 'replica_1' if catalogo else 'default'
+
+        with mock.patch.object(routers.ReplicaRouter, 'db_for_read', leer_de_replica):
+            self.assertEqual(archivo.candidatos('sin_stock', 90).db, 'replica_1')
+            self.assertEqual(archivo.archivar_por_lotes(archivo.candidatos('sin_stock', 90), 'sin_stock'), 1)
+            restaurados, _ = archivo.restaurar(ProductoArchivado.objects.all())
+            self.assertEqual(restaurados, 1)
+            self.assertEqual(archivo.archivar(archivo.candidatos('descontinuado'), 'descontinuado'), 1)
+
+        self.assertEqual(list(ProductoArchivado.objects.values_list('nombre', flat=True)), ['Lámpara 3'])
+        self.assertEqual(Producto.objects.count(), 3)
+        self.assertEstadisticasConsistentes()
+
+    def test_restaurar_con_conflicto_de_nombre(self):
+        archivo.archivar(Producto.objects.filter(nombre__in=['Lámpara 0', 'Lámpara 3']), 'manual')
+        Producto.objects.create(nombre='lámpara 0', descripcion='Otra', precio=500, stock=1)
+        original = ProductoArchivado.objects.get(nombre='Lámpara 3').pk
+
+        restaurados, conflictos = archivo.restaurar(ProductoArchivado.objects.all())
+        self.assertEqual(restaurados, 1)
+        self.assertEqual(conflictos, {ProductoArchivado.objects.get().pk})
+        producto = Producto.objects.get(pk=original)
+        self.assertFalse(producto.descontinuado)
+        self.assertEqual(producto.resumen, Producto.generar_resumen(producto.descripcion))
+        self.assertIn(original, buscar_ids('escritorio', 10))
+        self.assertEstadisticasConsistentes()
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('archivar_productos', '--dias-sin-cambios', '90', '--simular', stdout=salida)
+        self.assertIn('Total: 3 productos se archivarían', salida.getvalue())
+        self.assertEqual(ProductoArchivado.objects.count(), 0)
+
+        call_command('archivar_productos', '--dias-sin-cambios', '90', stdout=StringIO())
+        self.assertEqual(
+            dict(ProductoArchivado.objects.values_list('nombre', 'motivo')),
+            {'Lámpara 3': 'descontinuado', 'Lámpara 0': 'sin_cambios', 'Lámpara 2': 'sin_cambios'},
+        )
+        self.assertEstadisticasConsistentes()
+
+    def test_admin_buscar_y_restaurar(self):
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave'))
+        archivo.archivar(Producto.objects.all(), 'manual')
+        response = self.client.get('/admin/gestor/productoarchivado/', {'q': '"Lámpara 2"'})
+        self.assertEqual([p.nombre for p in response.context['cl'].result_list], ['Lámpara 2'])
+
+        pk = ProductoArchivado.objects.get(nombre='Lámpara 2').pk
+        response = self.client.post('/admin/gestor/productoarchivado/', {
+            'action': 'restaurar', 'index': '0', '_selected_action': [pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Producto.objects.values_list('pk', flat=True)), [pk])
+        self.assertEstadisticasConsistentes()
+
+
+@override_settings(AUDITORIA_ASINCRONA=False)
+class AuditoriaTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = CustomUser.objects.create_superuser('auditor', 'auditor@ejemplo.com', 'clave')
+        self.client.force_login(self.usuario)
+
+    def publicar(self, url, datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, datos)
+
+    def test_crear_modificar_borrar(self):
+        self.publicar('/productos/crear/', {'nombre': 'Silla', 'descripcion': 'De madera', 'precio': '25000', 'stock': '4'})
+        producto = Producto.objects.get(nombre='Silla')
+        self.publicar(f'/productos/editar/{producto.pk}/', {'nombre': 'Silla', 'descripcion': 'De madera', 'precio': '27000', 'stock': '4'})
+        # Guardar sin cambios no deja registro
+        self.publicar(f'/productos/editar/{producto.pk}/', {'nombre': 'Silla', 'descripcion': 'De madera', 'precio': '27000', 'stock': '4'})
+        self.publicar(f'/productos/borrar/{producto.pk}/', {})
+
+        registros = list(RegistroAuditoria.objects.order_by('id'))
+        self.assertEqual([r.accion for r in registros], ['crear', 'modificar', 'borrar'])
+        self.assertEqual({r.producto_id for r in registros}, {producto.pk})
+        self.assertEqual({(r.usuario_id, r.usuario_nombre, r.origen) for r in registros}, {(self.usuario.pk, 'auditor', 'web')})
+        self.assertEqual(registros[0].cambios['precio'], [None, '25000'])
+        self.assertEqual(registros[1].cambios, {'precio': ['25000.00', '27000']})
+        self.assertEqual(registros[2].cambios['stock'], [4, None])
+
+    def test_admin_y_operaciones_masivas(self):
+        producto = Producto.objects.create(nombre='Mesa', descripcion='d', precio=1000, stock=1)
+        self.assertFalse(RegistroAuditoria.objects.exists())
+        self.publicar(f'/admin/gestor/producto/{producto.pk}/change/', {
+            'nombre': 'Mesa', 'descripcion': 'd', 'precio': '1000', 'stock': '8',
+        })
+        self.publicar('/admin/gestor/producto/', {
+            'action': 'descontinuar', 'index': '0', '_selected_action': [producto.pk],
+        })
+        modificacion, descontinuado, masiva = RegistroAuditoria.objects.order_by('id')
+        self.assertEqual((modificacion.origen, modificacion.cambios), ('admin', {'stock': [1, 8]}))
+        self.assertEqual((descontinuado.accion, descontinuado.cambios), ('modificar', {'descontinuado': [False, True]}))
+        self.assertEqual(masiva.cambios, {'operacion': 'Marcar como descontinuados', 'productos': 1})
+
+        response = self.client.get(f'/admin/gestor/producto/{producto.pk}/history/', follow=True)
+        self.assertEqual(list(response.context['cl'].result_list), [descontinuado, modificacion])
+
+    def test_acciones_masivas_registran_cada_producto(self):
+        productos = [
+            Producto.objects.create(nombre=f'Silla {i}', descripcion='d', precio=precio, stock=i)
+            for i, precio in enumerate([1000, 2000, 3000])
+        ]
+        self.publicar('/admin/gestor/producto/', {
+            'action': 'operacion_masiva', 'index': '0', 'aplicar': '1',
+            '_selected_action': [p.pk for p in productos[:2]],
+            'operacion': 'precio_porcentaje', 'valor': '10', 'redondeo': '1',
+        })
+        self.publicar('/admin/gestor/producto/', {
+            'action': 'borrar_masivo', 'index': '0', 'aplicar': '1',
+            '_selected_action': [productos[0].pk, productos[2].pk],
+        })
+
+        registros = RegistroAuditoria.objects.exclude(accion='masiva')
+        self.assertEqual(
+            sorted((r.accion, r.producto_id, r.cambios.get('precio')) for r in registros),
+            [
+                ('borrar', productos[0].pk, ['1100.00', None]),
+                ('borrar', productos[2].pk, ['3000.00', None]),
+                ('modificar', productos[0].pk, ['1000.00', '1100.00']),
+                ('modificar', productos[1].pk, ['2000.00', '2200.00']),
+            ],
+        )
+        self.assertEqual({r.usuario_id for r in registros}, {self.usuario.pk})
+        self.assertEqual(RegistroAuditoria.objects.filter(accion='masiva').count(), 2)
+
+    def test_rollback_no_registra(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with auditoria.contexto(self.usuario):
+                try:
+                    with transaction.atomic():
+                        Producto.objects.create(nombre='Fallida', descripcion='d', precio=1000, stock=1)
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertFalse(RegistroAuditoria.objects.exists())
+
+
+class EscritorAuditoriaTests(SimpleTestCase):
+
+    def test_lotes_y_vaciado_al_detener(self):
+        escritos = []
+        escritor = auditoria.Escritor(escritos.append, maximo=100, lote=10, intervalo=0.05)
+        with override_settings(AUDITORIA_ASINCRONA=True):
+            for i in range(25):
+                escritor.encolar(i)
+        escritor.detener()
+        self.assertEqual([r for lote in escritos for r in lote], list(range(25)))
+        self.assertTrue(all(len(lote) <= 10 for lote in escritos))
+        self.assertIsNone(escritor.hilo)
+
+    def test_operacion_masiva_mayor_que_la_cola_la_escribe_el_hilo(self):
+        escritos = []
+
+        def escribir(registros):
+            escritos.append((threading.current_thread().name, list(registros)))
+
+        escritor = auditoria.Escritor(escribir, maximo=5, lote=10, intervalo=0.01)
+        with override_settings(AUDITORIA_ASINCRONA=True):
+            escritor.encolar_varios(list(range(45)))
+        escritor.detener()
+        self.assertEqual({nombre for nombre, _ in escritos}, {'gestor-auditoria'})
+        self.assertEqual([r for _, lote in escritos for r in lote], list(range(45)))
+        self.assertTrue(all(len(lote) <= 10 for _, lote in escritos))
+
+    def test_cola_llena_escribe_sincronicamente(self):
+        liberar = threading.Event()
+        escritos = []
+
+        def escribir(registros):
+            # El hilo queda bloqueado en su primer lote; la cola se llena
+            if threading.current_thread().name == 'gestor-auditoria':
+                liberar.wait(5)
+            escritos.append((threading.current_thread().name, list(registros)))
+
+        escritor = auditoria.Escritor(escribir, maximo=1, lote=1, intervalo=0)
+        with override_settings(AUDITORIA_ASINCRONA=True):
+            escritor.encolar('a')
+            while escritor.cola.qsize():
+                time.sleep(0.001)
+            escritor.encolar('b')
+            with self.assertLogs('gestor.auditoria', 'WARNING'):
+                escritor.encolar('c')
+        self.assertEqual(escritos, [(threading.current_thread().name, ['c'])])
+        liberar.set()
+        escritor.detener()
+        self.assertEqual(sorted(r for _, lote in escritos for r in lote), ['a', 'b', 'c'])
+
+
+# Tareas en segundo plano
+
+def tarea_que_falla(ejecucion):
+    raise ValueError('sin conexión al proveedor')
+
+
+@override_settings(AUDITORIA_ASINCRONA=False, TAREAS_REINTENTO_BASE=10)
+class TareasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = CustomUser.objects.create_user('gestor', 'gestor@ejemplo.com', 'clave')
+        self.usuario.user_permissions.add(*Permission.objects.filter(
+            codename__in=['view_producto', 'add_producto', 'change_producto'],
+        ))
+        self.client.force_login(self.usuario)
+        for i, precio in enumerate([1000, 2000, 3000]):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='d', precio=precio, stock=i)
+
+    def trabajar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('trabajador_tareas', procesos=0, una_vez=True, stdout=StringIO())
+
+    def test_encolar_valida_tipo_y_argumentos(self):
+        with self.assertRaises(ValueError):
+            tareas.encolar('no_existe')
+        with self.assertRaises(TypeError):
+            tareas.encolar('reconstruir_indice_busqueda', {'tabla': 'x'})
+        tarea = tareas.encolar('reconciliar_estadisticas', usuario=self.usuario)
+        self.assertEqual((tarea.estado, tarea.max_intentos, tarea.usuario), ('pendiente', 3, self.usuario))
+
+    def test_una_tarea_se_toma_una_sola_vez(self):
+        tarea = tareas.encolar('reconciliar_estadisticas')
+        self.assertEqual(tareas.tomar('a', limite=5), [tarea.pk])
+        self.assertEqual(tareas.tomar('b', limite=5), [])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.trabajador, tarea.intentos), ('en_curso', 'a', 1))
+
+    def test_operacion_masiva_en_el_trabajador(self):
+        tarea = tareas.encolar('operacion_masiva', {
+            'filtro': {'precio_min': '1500'},
+            'operacion': {'operacion': 'precio_porcentaje', 'valor': '10', 'redondeo': '1'},
+        }, usuario=self.usuario)
+        self.trabajar()
+
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.progreso, tarea.intentos), ('terminada', 100, 1))
+        self.assertEqual(tarea.resultado['afectados'], 2)
+        self.assertEqual(sorted(Producto.objects.values_list('precio', flat=True)), [1000, 2200, 3300])
+        registros = RegistroAuditoria.objects.all()
+        self.assertEqual(sorted(r.accion for r in registros), ['masiva', 'modificar', 'modificar'])
+        self.assertEqual({(r.usuario_id, r.origen) for r in registros}, {(self.usuario.pk, 'tarea')})
+
+    def test_borrado_exige_el_permiso_de_quien_encolo(self):
+        tarea = tareas.encolar('operacion_masiva', {
+            'filtro': {}, 'operacion': {'operacion': 'borrar', 'redondeo': '1'},
+        }, usuario=self.usuario)
+        with self.assertLogs('gestor.tareas', 'WARNING'):
+            self.trabajar()
+        tarea.refresh_from_db()
+        # Error permanente: no se reintenta
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 1))
+        self.assertIn('ErrorPermanente', tarea.error)
+        self.assertEqual(Producto.objects.count(), 3)
+
+    def test_archivar_con_argumentos_invalidos_no_se_reintenta(self):
+        invalida = tareas.encolar('archivar_productos', {'dias_sin_stock': 'noventa'})
+        vacia = tareas.encolar('archivar_productos', {'descontinuados': False})
+        valida = tareas.encolar('archivar_productos', {'dias_sin_stock': '30', 'lote': 500})
+        Producto.objects.filter(nombre='Producto 0').update(fecha_actualizacion=timezone.now() - timedelta(days=60))
+        with self.assertLogs('gestor.tareas', 'WARNING'):
+            self.trabajar()
+
+        for tarea in (invalida, vacia):
+            tarea.refresh_from_db()
+            self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 1))
+            self.assertIn('ErrorPermanente', tarea.error)
+        valida.refresh_from_db()
+        self.assertEqual((valida.estado, valida.resultado['archivados']['sin_stock']), ('terminada', 1))
+
+    def test_reintentos_con_espera_creciente(self):
+        with mock.patch.dict(tareas.REGISTRO, {'falla': tareas.TipoTarea('falla', tarea_que_falla, max_intentos=2)}):
+            tarea = tareas.encolar('falla')
+            with self.assertLogs('gestor.tareas', 'WARNING'):
+                tareas.ejecutar(tareas.tomar('t')[0])
+            tarea.refresh_from_db()
+            self.assertEqual(tarea.estado, 'pendiente')
+            self.assertIn('sin conexión al proveedor', tarea.error)
+            espera = (tarea.disponible_desde - timezone.now()).total_seconds()
+            self.assertTrue(5 < espera <= 10, espera)
+            # Todavía no está disponible
+            self.assertEqual(tareas.tomar('t'), [])
+
+            Tarea.objects.filter(pk=tarea.pk).update(disponible_desde=timezone.now())
+            with self.assertLogs('gestor.tareas', 'WARNING'):
+                tareas.ejecutar(tareas.tomar('t')[0])
+            tarea.refresh_from_db()
+            self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+            self.assertIsNotNone(tarea.fecha_fin)
+
+        self.assertTrue(7.5 <= tareas.espera_reintento(1) <= 10)
+        self.assertTrue(30 <= tareas.espera_reintento(3) <= 40)
+        with override_settings(TAREAS_REINTENTO_MAX=60):
+            self.assertLessEqual(tareas.espera_reintento(10), 60)
+
+    def test_reencolar_tareas_sin_latido(self):
+        tarea = tareas.encolar('reconciliar_estadisticas')
+        tareas.tomar('muerto')
+        Tarea.objects.filter(pk=tarea.pk).update(latido=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tareas.reencolar_vencidas(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'pendiente')
+        self.assertIn('muerto', tarea.error)
+
+    def test_api_encolar_y_consultar(self):
+        response = self.client.post('/api/tareas/', {'tipo': 'importar_productos', 'argumentos': {'ruta': '/etc/passwd'}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/tareas/', {'tipo': 'archivar_productos'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/api/tareas/', {'tipo': 'reconstruir_indice_busqueda', 'argumentos': {'x': 1}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/tareas/', {'tipo': 'reconciliar_estadisticas'}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['estado'], 'pendiente')
+        self.trabajar()
+        consulta = self.client.get(response['Location'])
+        self.assertEqual(consulta.json()['estado'], 'terminada')
+        self.assertIn('al día', consulta.json()['resultado']['salida'])
+        self.assertEqual(len(self.client.get('/api/tareas/').json()['resultados']), 1)
+
+        # Otro usuario sin view_tarea no la ve
+        otro = CustomUser.objects.create_user('otro', 'otro@ejemplo.com', 'clave')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(response['Location']).status_code, 404)
+
+    def test_importar_en_segundo_plano(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(TAREAS_DIRECTORIO=Path(directorio)):
+            archivo_csv = SimpleUploadedFile('productos.csv', 'nombre,descripcion,precio,stock\nMesa,d,5000,2\n'.encode())
+            response = self.client.post('/productos/importar/', {'archivo': archivo_csv, 'segundo_plano': 'on'})
+            tarea = response.context['tarea']
+            self.assertFalse(Producto.objects.filter(nombre='Mesa').exists())
+            self.assertEqual(len(os.listdir(directorio)), 1)
+
+            self.trabajar()
+            tarea.refresh_from_db()
+            self.assertEqual(tarea.resultado['creados'], 1)
+            self.assertTrue(Producto.objects.filter(nombre='Mesa').exists())
+            self.assertEqual(os.listdir(directorio), [])
+
+    def test_admin_reintentar(self):
+        superusuario = CustomUser.objects.create_superuser('root', 'root@ejemplo.com', 'clave')
+        self.client.force_login(superusuario)
+        tarea = tareas.encolar('reconciliar_estadisticas')
+        Tarea.objects.filter(pk=tarea.pk).update(estado='fallida', intentos=3, error='x')
+        self.assertContains(self.client.get('/admin/gestor/tarea/'), '<progress value="0"')
+        self.client.post('/admin/gestor/tarea/', {'action': 'reintentar', 'index': '0', '_selected_action': [tarea.pk]})
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.error), ('pendiente', 0, ''))
@@ -0,0 +1,22 @@
+import signal
+
+import django
+
+
+# Punto de entrada de los procesos del comando trabajador_tareas.
+#
+# Los procesos se crean con "spawn" (igual en Linux, macOS y Windows, y sin
+# heredar conexiones abiertas a la base): el hijo importa este módulo antes
+# de que Django esté configurado, por eso aquí no se importan modelos.
+
+
+def inicializar():
+    # Ctrl+C llega a todo el grupo de procesos: decide el proceso principal,
+    # que deja terminar las tareas en curso
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+def ejecutar(tarea_id):
+    from . import tareas
+    tareas.ejecutar(tarea_id)
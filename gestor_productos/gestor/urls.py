@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib import admin
-from .views import IndexView, LoginView, LogoutView, RegisterView, ProductoListView, ProductoAddView, ProductoUpdateView, ProductoDeleteView
+from .views import IndexView, LoginView, LogoutView, RegisterView, ProductoListView, InventarioView, ProductoBuscarView, ProductoAddView, ProductoImportarView, ProductoExportarView, ProductoMasivoView, StockMovimientosView, ProductoUpdateView, ProductoDeleteView, ProductoApiListView, ProductoApiDetailView, TareaApiListView, TareaApiDetailView, MetricasView
 
 
 urlpatterns = [
@@ -15,7 +15,22 @@ urlpatterns = [
     
     # CRUD
     path('productos/', ProductoListView.as_view(), name='productos'),
+    path('productos/inventario/', InventarioView.as_view(), name='inventario'),
+    path('productos/buscar/', ProductoBuscarView.as_view(), name='buscar_productos'),
     path('productos/crear/', ProductoAddView.as_view(), name='crear_producto'),
+    path('productos/importar/', ProductoImportarView.as_view(), name='importar_productos'),
+    path('productos/exportar/', ProductoExportarView.as_view(), name='exportar_productos'),
+    path('productos/masivo/', ProductoMasivoView.as_view(), name='productos_masivo'),
+    path('productos/stock/', StockMovimientosView.as_view(), name='movimientos_stock'),
     path('productos/editar/<int:pk>/', ProductoUpdateView.as_view(), name='editar_producto'),
     path('productos/borrar/<int:pk>/', ProductoDeleteView.as_view(), name='borrar_producto'),
+
+    # API JSON
+    path('api/productos/', ProductoApiListView.as_view(), name='api_productos'),
+    path('api/productos/<int:pk>/', ProductoApiDetailView.as_view(), name='api_producto'),
+    path('api/tareas/', TareaApiListView.as_view(), name='api_tareas'),
+    path('api/tareas/<int:pk>/', TareaApiDetailView.as_view(), name='api_tarea'),
+
+    # Métricas
+    path('metricas/', MetricasView.as_view(), name='metricas'),
 ]
\ No newline at end of file
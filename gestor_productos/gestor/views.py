@@ -1,53 +1,103 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import hashlib
+import hmac
+import json
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import permission_required
 from django.contrib import messages
-from django.views.generic import TemplateView
-from django.contrib.auth.models import Group
-from .models import Producto, CustomUser
-from .forms import ProductoForm, CustomUserCreationForm
-from .mixins import (CustomLoginRequiredMixin, CustomPermissionRequiredMixin, ProtectedTemplateView, PermissionProtectedTemplateView)
+from django.views.generic import TemplateView, View
+from django.views.decorators.http import condition
+from django.utils.cache import quote_etag
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.urls import reverse
+from .models import ESTADOS_STOCK, Producto, CustomUser, Tarea, filtro_estado_stock
+from .forms import ProductoForm, CustomUserCreationForm, ImportarProductosForm, ExportarProductosForm, FiltroProductosForm, OperacionMasivaForm
+from .mixins import (CustomLoginRequiredMixin, CustomPermissionRequiredMixin, ProtectedTemplateView, PermissionProtectedTemplateView, AsyncPermissionProtectedTemplateView, ApiView)
+from . import auditoria, estadisticas, inventario, limites, masivo, metricas, tareas
+from .permisos import opciones_grupos, resolver_grupo
+from .paginacion import apaginar_por_cursor
+from .busqueda import buscar_productos, filtrar_queryset
+from .importacion import ArchivoInvalido, abrir_subida, detectar_formato, importar_productos
+from .exportacion import FORMATOS as FORMATOS_EXPORTACION, aexportar, exportar
 
 # Index
 
 class IndexView(TemplateView):
     template_name = 'index.html'
-    
-    # Contexto adicional
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+
+    # Vista async: bajo ASGI no ocupa un hilo mientras espera a la base de datos
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        context = self.get_context_data(**kwargs)
         # Agregar información útil al contexto
-        if self.request.user.is_authenticated:
-            context['user_groups'] = self.request.user.groups.all()
-            context['productos_count'] = Producto.objects.count()
-        return context
+        if request.user.is_authenticated:
+            # Queryset perezoso: solo se consulta si la plantilla lo usa (render en hilo aparte)
+            context['user_groups'] = request.user.groups.all()
+            # Lectura O(1) de la tabla de agregados en lugar de COUNT(*)
+            context['estadisticas'] = await estadisticas.aobtener()
+            context['productos_count'] = context['estadisticas'].total_productos
+        return self.render_to_response(context)
 
 # Vista del Registro de Usuario
 
 def RegisterView(request):
     
     if request.method == 'POST':
+        # Límite por IP antes de validar y calcular el hash de la contraseña
+        espera = limites.verificar([('registro_ip', limites.ip_cliente(request))])
+        if espera:
+            messages.error(request, f'Demasiados registros desde esta dirección. Intenta nuevamente en {espera} segundos.')
+            response = render(request, 'register.html', {
+                'form': CustomUserCreationForm(),
+                'groups': opciones_grupos(),
+            }, status=429)
+            response['Retry-After'] = str(espera)
+            return response
+
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.save()
-            
-            # Asignar grupo
-            group_name = request.POST.get('group')
-            if group_name:
-                try:
-                    group = Group.objects.get(name=group_name)
-                    user.groups.add(group)
-                    messages.success(
-                        request, 
-                        f'Usuario "{user.username}" creado y agregado al grupo "{group_name}"'
-                    )
-                except Group.DoesNotExist:
-                    messages.warning(
-                        request, 
-                        f'Usuario creado pero el grupo "{group_name}" no existe'
-                    )
+            # Grupo por id (o por nombre) desde las opciones cacheadas, sin consultar Group
+            group_value = request.POST.get('group')
+            grupo = resolver_grupo(group_value) if group_value else None
+
+            try:
+                # Usuario y grupo en la misma transacción: o se crean ambos o ninguno
+                with transaction.atomic():
+                    user = form.save()
+                    if grupo:
+                        user.groups.add(grupo[0])
+            except IntegrityError:
+                # Otro registro tomó el mismo usuario/email tras la validación
+                messages.error(request, 'Ese usuario o correo electrónico ya está registrado')
+                return render(request, 'register.html', {
+                    'form': form,
+                    'groups': opciones_grupos(),
+                })
+
+            if grupo:
+                messages.success(
+                    request, 
+                    f'Usuario "{user.username}" creado y agregado al grupo "{grupo[1]}"'
+                )
+            elif group_value:
+                messages.warning(
+                    request, 
+                    f'Usuario creado pero el grupo "{group_value}" no existe'
+                )
             else:
                 messages.success(request, f'Usuario "{user.username}" creado exitosamente')
             
@@ -62,8 +112,8 @@ def RegisterView(request):
     else:
         form = CustomUserCreationForm()
     
-    # Obtener grupos disponibles con el ORM
-    groups = Group.objects.all()
+    # Grupos disponibles (id, nombre) desde la caché
+    groups = opciones_grupos()
     
     return render(request, 'register.html', {
         'form': form,
@@ -91,11 +141,25 @@ class LoginView(TemplateView):
             messages.error(request, 'Por favor ingresa usuario y contraseña')
             return render(request, self.template_name)
         
+        # Límite de intentos por IP y por usuario, antes de calcular el hash
+        espera = limites.verificar([
+            ('login_ip', limites.ip_cliente(request)),
+            ('login_usuario', username),
+        ])
+        if espera:
+            response = render(request, self.template_name, {
+                'error': f'Demasiados intentos. Intenta nuevamente en {espera} segundos.',
+                'username': username,
+            }, status=429)
+            response['Retry-After'] = str(espera)
+            return response
+
         # Autenticar usuario
         user = authenticate(request, username=username, password=password)
         
         if user is not None:
             # Usuario autenticado correctamente
+            limites.limpiar('login_usuario', username)
             login(request, user)
             
             # Mensaje de bienvenida personalizado
@@ -137,26 +201,127 @@ def LogoutView(request):
 
 # Ver
 
-class ProductoListView(PermissionProtectedTemplateView):
+class ProductoListView(AsyncPermissionProtectedTemplateView):
 
     template_name = 'producto_list.html'
     permission_required = 'gestor.view_producto'
 
-    def get(self, request, *args, **kwargs):
+    fragment_template_name = 'producto_list_items.html'
+
+    def get_limite(self):
+        """Tamaño de página pedido en ?limite=, acotado por la configuración"""
+        por_defecto = settings.PRODUCTOS_POR_PAGINA
+        try:
+            limite = int(self.request.GET.get('limite', por_defecto))
+        except ValueError:
+            limite = por_defecto
+        return max(1, min(limite, settings.PRODUCTOS_POR_PAGINA_MAX))
+
+    def es_fragmento(self):
+        """Scroll infinito: devolver solo los items cuando se pide por JS"""
+        return (
+            self.request.GET.get('fragmento') == '1'
+            or self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        )
+
+    def clave_cache(self, version, permisos):
+        """Clave del HTML de una página: versión del catálogo, permisos y cursor pedido"""
+        consulta = '|'.join(self.request.GET.get(param, '') for param in ('despues', 'antes'))
+        parametros = hashlib.md5(consulta.encode(), usedforsecurity=False).hexdigest()[:16]
+        banderas = ''.join('1' if permiso else '0' for permiso in permisos)
+        return f'productos:listado:{version}:{banderas}:{self.get_limite()}:{parametros}'
+
+    async def render_listado(self, context):
+        """Renderiza los items de la página; solo se ejecuta cuando no está en caché"""
+        # Solo las columnas que muestra el listado, el resumen ya viene precalculado
+        productos = Producto.objects.only('id', 'nombre', 'resumen', 'fecha_creacion', 'fecha_actualizacion')
+        pagina = await apaginar_por_cursor(
+            productos,
+            context['limite'],
+            despues=self.request.GET.get('despues'),
+            antes=self.request.GET.get('antes'),
+        )
+        context = {**context, 'productos': pagina, 'pagina': pagina}
+        # El render usa la caché de fragmentos (E/S): se hace fuera del event loop
+        html = await sync_to_async(render_to_string, thread_sensitive=False)(self.fragment_template_name, context)
+        return {
+            'html': html,
+            'anterior': pagina.anterior,
+            'siguiente': pagina.siguiente,
+        }
+
+    async def get(self, request, *args, **kwargs):
 
-        # Obtener todos los productos ordenados por fecha
-        productos = Producto.objects.all().order_by('-fecha_creacion')
-        
         # Verificar permisos del usuario para mostrar botones
-        can_add = request.user.has_perm('gestor.add_producto')
-        can_change = request.user.has_perm('gestor.change_producto')
-        can_delete = request.user.has_perm('gestor.delete_producto')
-        
-        return render(request, self.template_name, {
-            'productos': productos,
+        can_add = await request.user.ahas_perm('gestor.add_producto')
+        can_change = await request.user.ahas_perm('gestor.change_producto')
+        can_delete = await request.user.ahas_perm('gestor.delete_producto')
+
+        context = {
+            'limite': self.get_limite(),
             'can_add': can_add,
             'can_change': can_change,
             'can_delete': can_delete,
+            'cache_ttl': settings.PRODUCTOS_CACHE_TTL,
+        }
+
+        # Caché de la página completa: la versión del catálogo sube con cada
+        # guardado, borrado u operación masiva, así que una clave nunca queda obsoleta
+        version, _ = await estadisticas.aversion_catalogo()
+        clave = self.clave_cache(version, (can_add, can_change, can_delete))
+        listado = await cache.aget(clave)
+        if listado is None:
+            listado = await self.render_listado(context)
+            await cache.aset(clave, listado, settings.PRODUCTOS_CACHE_TTL)
+
+        if self.es_fragmento():
+            return HttpResponse(listado['html'])
+        context['listado'] = listado
+        return render(request, self.template_name, context)
+
+# Panel de inventario
+
+class InventarioView(PermissionProtectedTemplateView):
+
+    template_name = 'inventario.html'
+    permission_required = 'gestor.view_producto'
+
+    def get(self, request, *args, **kwargs):
+        resumen = estadisticas.resumen_por_estado()
+        return render(request, self.template_name, {
+            'resumen': resumen,
+            'total_productos': sum(fila['productos'] for fila in resumen),
+            'total_unidades': sum(fila['unidades'] for fila in resumen),
+            'total_valor': sum(fila['valor'] for fila in resumen),
+        })
+
+# Buscar
+
+class ProductoBuscarView(PermissionProtectedTemplateView):
+
+    template_name = 'producto_search.html'
+    permission_required = 'gestor.view_producto'
+
+    def get(self, request, *args, **kwargs):
+        termino = request.GET.get('q', '').strip()
+        limite = settings.PRODUCTOS_POR_PAGINA
+        try:
+            numero = max(1, int(request.GET.get('pagina', 1)))
+        except ValueError:
+            numero = 1
+
+        # Se pide un resultado extra para saber si hay página siguiente
+        resultados = buscar_productos(termino, limite + 1, offset=(numero - 1) * limite)
+
+        return render(request, self.template_name, {
+            'q': termino,
+            'productos': resultados[:limite],
+            'numero': numero,
+            'pagina_anterior': numero - 1 if numero > 1 else None,
+            'pagina_siguiente': numero + 1 if len(resultados) > limite else None,
+            'can_change': request.user.has_perm('gestor.change_producto'),
+            'can_delete': request.user.has_perm('gestor.delete_producto'),
+            'cache_ttl': settings.PRODUCTOS_CACHE_TTL,
         })
 
 # Agregar
@@ -174,8 +339,8 @@ class ProductoAddView(PermissionProtectedTemplateView):
 
     def post(self, request, *args, **kwargs):
         form = ProductoForm(request.POST)
-        if form.is_valid():
-            producto = form.save()
+        producto = form.save() if form.is_valid() else None
+        if producto is not None:
             messages.success(
                 request, 
                 f'✅ Producto "{producto.nombre}" creado exitosamente'
@@ -193,6 +358,166 @@ class ProductoAddView(PermissionProtectedTemplateView):
         })
 
 
+# Importar
+
+class ProductoImportarView(PermissionProtectedTemplateView):
+
+    template_name = 'producto_import.html'
+    permission_required = 'gestor.add_producto'
+
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, {'form': ImportarProductosForm()})
+
+    def post(self, request, *args, **kwargs):
+        form = ImportarProductosForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form})
+
+        actualizar = form.cleaned_data['actualizar']
+        if actualizar and not request.user.has_perm('gestor.change_producto'):
+            raise PermissionDenied
+
+        archivo = form.cleaned_data['archivo']
+        formato = form.cleaned_data['formato'] or detectar_formato(archivo.name)
+        if form.cleaned_data['segundo_plano']:
+            return self.encolar(request, archivo, formato, actualizar)
+        try:
+            resultado = importar_productos(abrir_subida(archivo), formato, actualizar=actualizar)
+        except ArchivoInvalido as error:
+            form.add_error('archivo', str(error))
+            return render(request, self.template_name, {'form': form, 'resultado': error.resultado})
+
+        messages.success(
+            request,
+            f'Importación terminada: {resultado.creados} creados, '
+            f'{resultado.actualizados} actualizados, {resultado.rechazados} rechazados'
+        )
+        return render(request, self.template_name, {
+            'form': ImportarProductosForm(),
+            'resultado': resultado,
+        })
+
+    def encolar(self, request, archivo, formato, actualizar):
+        """Guarda el archivo para el trabajador y responde sin esperar la importación"""
+        settings.TAREAS_DIRECTORIO.mkdir(parents=True, exist_ok=True)
+        ruta = settings.TAREAS_DIRECTORIO / f'importacion-{uuid.uuid4().hex}.{formato}'
+        with open(ruta, 'wb') as destino:
+            for trozo in archivo.chunks():
+                destino.write(trozo)
+        tarea = tareas.encolar('importar_productos', {
+            'ruta': str(ruta), 'formato': formato, 'actualizar': actualizar, 'temporal': True,
+        }, usuario=request.user)
+        messages.info(request, f'Importación en cola (tarea #{tarea.pk}); esta página muestra su avance')
+        return render(request, self.template_name, {
+            'form': ImportarProductosForm(),
+            'tarea': tarea,
+        })
+
+
+# Exportar
+
+class ProductoExportarView(PermissionProtectedTemplateView):
+
+    permission_required = 'gestor.view_producto'
+
+    def get(self, request, *args, **kwargs):
+        form = ExportarProductosForm(request.GET)
+        if not form.is_valid():
+            errores = '; '.join(e for lista in form.errors.values() for e in lista)
+            return HttpResponseBadRequest(errores)
+
+        formato = form.cleaned_data['formato'] or 'csv'
+        gzip = form.cleaned_data['gzip']
+        content_type, extension = FORMATOS_EXPORTACION[formato]
+
+        # Bajo ASGI el contenido tiene que ser asíncrono o Django lo junta entero antes de enviarlo
+        generador = aexportar if isinstance(request, ASGIRequest) else exportar
+        response = StreamingHttpResponse(
+            generador(formato, gzip, form.cleaned_data['desde'], form.cleaned_data['hasta']),
+            content_type='application/gzip' if gzip else content_type,
+        )
+        nombre = f'productos.{extension}' + ('.gz' if gzip else '')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+
+# Operaciones masivas
+
+class ProductoMasivoView(PermissionProtectedTemplateView):
+    """
+    Repreciar, ajustar stock o borrar todos los productos que cumplen un
+    filtro, con un solo UPDATE/DELETE. "Previsualizar" muestra los totales
+    antes y después sin modificar nada; "Aplicar" ejecuta la operación.
+    """
+
+    template_name = 'producto_masivo.html'
+    permission_required = 'gestor.change_producto'
+
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, {
+            'filtro': FiltroProductosForm(request.GET or None),
+            'form': OperacionMasivaForm(permitir_borrar=request.user.has_perm('gestor.delete_producto')),
+        })
+
+    def post(self, request, *args, **kwargs):
+        puede_borrar = request.user.has_perm('gestor.delete_producto')
+        filtro = FiltroProductosForm(request.POST)
+        form = OperacionMasivaForm(request.POST, permitir_borrar=puede_borrar)
+        if not (filtro.is_valid() and form.is_valid()):
+            return render(request, self.template_name, {'filtro': filtro, 'form': form})
+
+        productos = filtro.filtrar(Producto.objects.all())
+        if 'aplicar' in request.POST:
+            with auditoria.operacion(productos, form.descripcion()):
+                afectados = masivo.aplicar(productos, form.cambios())
+            accion = 'borrados' if form.es_borrado else 'actualizados'
+            messages.success(request, f'{form.descripcion()}: {afectados} productos {accion}')
+            return redirect('productos')
+
+        return render(request, self.template_name, {
+            'filtro': filtro,
+            'form': form,
+            'previa': masivo.vista_previa(productos, form.cambios()),
+        })
+
+
+# Movimientos de stock
+
+class StockMovimientosView(PermissionProtectedTemplateView):
+    """
+    POST JSON {"movimientos": [{"id": 1, "cantidad": -2}, ...], "todo_o_nada": true}
+    Cantidades positivas suman stock y negativas lo descuentan solo si alcanza.
+    """
+
+    permission_required = 'gestor.change_producto'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            datos = json.loads(request.body)
+            movimientos = [(int(m['id']), int(m['cantidad'])) for m in datos['movimientos']]
+            todo_o_nada = bool(datos.get('todo_o_nada', False))
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Formato inválido: se espera {"movimientos": [{"id", "cantidad"}]}'}, status=400)
+        if not movimientos or len(movimientos) > settings.STOCK_MOVIMIENTOS_MAX:
+            return JsonResponse({'error': f'Se aceptan entre 1 y {settings.STOCK_MOVIMIENTOS_MAX} movimientos'}, status=400)
+
+        try:
+            resultados = inventario.aplicar_movimientos(movimientos, todo_o_nada=todo_o_nada)
+            aplicado = True
+        except inventario.StockInsuficiente as error:
+            resultados = error.resultados
+            aplicado = False
+
+        ok = all(estado == inventario.OK for _, _, estado in resultados)
+        return JsonResponse({
+            'ok': ok,
+            'aplicado': aplicado,
+            'resultados': [
+                {'id': pk, 'cantidad': cantidad, 'estado': estado} for pk, cantidad, estado in resultados
+            ],
+        }, status=200 if ok else 409)
+
+
 # Actualizar
 
 class ProductoUpdateView(PermissionProtectedTemplateView):
@@ -213,8 +538,7 @@ class ProductoUpdateView(PermissionProtectedTemplateView):
         producto = get_object_or_404(Producto, pk=pk)
         form = ProductoForm(request.POST, instance=producto)
         
-        if form.is_valid():
-            producto = form.save()
+        if form.is_valid() and form.save() is not None:
             messages.success(
                 request, 
                 f'✅ Producto "{producto.nombre}" actualizado exitosamente'
@@ -257,6 +581,265 @@ class ProductoDeleteView(PermissionProtectedTemplateView):
         return redirect('productos')
 
 
+# API JSON
+#
+# Las respuestas llevan ETag fuerte y Last-Modified: el listado usa la versión
+# del catálogo (EstadisticaCatalogo.version, que sube con cada cambio) y el
+# detalle la fecha_actualizacion de la fila. Un cliente que consulta con
+# If-None-Match recibe 304 tras una única consulta por clave primaria.
+
+def serializar_producto(producto):
+    return {
+        'id': producto.pk,
+        'nombre': producto.nombre,
+        'descripcion': producto.descripcion,
+        'precio': str(producto.precio),
+        'stock': producto.stock,
+        'fecha_creacion': producto.fecha_creacion.isoformat(),
+        'fecha_actualizacion': producto.fecha_actualizacion.isoformat(),
+    }
+
+
+# @condition llama a estas funciones de forma síncrona: los valores se cargan
+# antes en ApiView.precargar (async) y se dejan en el request
+
+def etag_listado(request, *args, **kwargs):
+    version, _ = request._version_catalogo
+    # El orden de los parámetros no cambia la respuesta
+    consulta = '&'.join(sorted(request.GET.urlencode().split('&')))
+    return f'productos-{version}-{hashlib.md5(consulta.encode(), usedforsecurity=False).hexdigest()[:16]}'
+
+
+def ultima_modificacion_listado(request, *args, **kwargs):
+    return request._version_catalogo[1]
+
+
+def version_producto(pk, fecha):
+    return f'producto-{pk}-{fecha.timestamp():.6f}'
+
+
+def etag_producto(request, pk, *args, **kwargs):
+    fecha = request._fecha_producto
+    return version_producto(pk, fecha) if fecha else None
+
+
+def ultima_modificacion_producto(request, pk, *args, **kwargs):
+    return request._fecha_producto
+
+
+def leer_json(request):
+    """Cuerpo JSON de la petición como dict, o None si no es válido"""
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+def respuesta_producto(producto, status=200):
+    response = JsonResponse(serializar_producto(producto), status=status)
+    response['ETag'] = quote_etag(version_producto(producto.pk, producto.fecha_actualizacion))
+    response['Last-Modified'] = http_date(producto.fecha_actualizacion.timestamp())
+    return response
+
+
+def errores_formulario(form):
+    return JsonResponse({'errores': form.errors.get_json_data()}, status=400)
+
+
+class ProductoApiListView(ApiView):
+    """
+    GET: listado con filtros ?q=, ?estado_stock=, ?precio_min=, ?precio_max=
+    y paginación por cursor (?limite=, ?despues=, ?antes=).
+    POST: crea un producto con las validaciones de ProductoForm.
+    """
+
+    campos = ('id', 'nombre', 'descripcion', 'precio', 'stock', 'fecha_creacion', 'fecha_actualizacion')
+
+    def get_limite(self):
+        por_defecto = settings.PRODUCTOS_POR_PAGINA
+        try:
+            limite = int(self.request.GET.get('limite', por_defecto))
+        except ValueError:
+            limite = por_defecto
+        return max(1, min(limite, settings.PRODUCTOS_POR_PAGINA_MAX))
+
+    def filtrar(self, productos):
+        """Aplica los filtros de la query string; lanza ValueError si alguno es inválido"""
+        params = self.request.GET
+        termino = params.get('q', '').strip()
+        if termino:
+            productos = filtrar_queryset(productos, termino)
+        if params.get('estado_stock', '') != '':
+            estado = int(params['estado_stock'])
+            if estado not in ESTADOS_STOCK:
+                raise ValueError('estado_stock')
+            productos = productos.filter(filtro_estado_stock(estado))
+        if params.get('precio_min'):
+            productos = productos.filter(precio__gte=Decimal(params['precio_min']))
+        if params.get('precio_max'):
+            productos = productos.filter(precio__lte=Decimal(params['precio_max']))
+        return productos
+
+    async def precargar(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            request._version_catalogo = await estadisticas.aversion_catalogo()
+
+    @method_decorator(condition(etag_func=etag_listado, last_modified_func=ultima_modificacion_listado))
+    async def get(self, request, *args, **kwargs):
+        try:
+            productos = self.filtrar(Producto.objects.only(*self.campos))
+        except (ValueError, ArithmeticError):
+            return JsonResponse({'error': 'Filtros inválidos'}, status=400)
+
+        pagina = await apaginar_por_cursor(
+            productos,
+            self.get_limite(),
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+        )
+        return JsonResponse({
+            'resultados': [serializar_producto(producto) for producto in pagina],
+            'siguiente': pagina.siguiente,
+            'anterior': pagina.anterior,
+        })
+
+    def crear(self, request):
+        datos = leer_json(request)
+        if datos is None:
+            return JsonResponse({'error': 'Se espera un objeto JSON'}, status=400)
+        form = ProductoForm(datos)
+        if not form.is_valid():
+            return errores_formulario(form)
+        producto = form.save()
+        if producto is None:
+            return errores_formulario(form)
+        response = respuesta_producto(producto, status=201)
+        response['Location'] = reverse('api_producto', args=[producto.pk])
+        return response
+
+    async def post(self, request, *args, **kwargs):
+        # Validación y guardado (transacción, señales) en el hilo de la base de datos
+        return await sync_to_async(self.crear)(request)
+
+
+class ProductoApiDetailView(ApiView):
+    """
+    GET / PUT / PATCH / DELETE de un producto. PUT, PATCH y DELETE aceptan
+    If-Match con el ETag leído para no pisar cambios ajenos (412 si cambió).
+    """
+
+    async def precargar(self, request, pk, *args, **kwargs):
+        request._fecha_producto = (
+            await Producto.objects.filter(pk=pk).values_list('fecha_actualizacion', flat=True).afirst()
+        )
+
+    @method_decorator(condition(etag_func=etag_producto, last_modified_func=ultima_modificacion_producto))
+    async def get(self, request, pk, *args, **kwargs):
+        return respuesta_producto(await aget_object_or_404(Producto, pk=pk))
+
+    def actualizar(self, request, pk, parcial):
+        producto = get_object_or_404(Producto, pk=pk)
+        datos = leer_json(request)
+        if datos is None:
+            return JsonResponse({'error': 'Se espera un objeto JSON'}, status=400)
+        if parcial:
+            # PATCH: los campos omitidos conservan su valor actual
+            datos = {**{campo: getattr(producto, campo) for campo in ProductoForm.Meta.fields}, **datos}
+        form = ProductoForm(datos, instance=producto)
+        if not form.is_valid() or form.save() is None:
+            return errores_formulario(form)
+        return respuesta_producto(producto)
+
+    def borrar(self, pk):
+        get_object_or_404(Producto, pk=pk).delete()
+        return HttpResponse(status=204)
+
+    @method_decorator(condition(etag_func=etag_producto))
+    async def put(self, request, pk, *args, **kwargs):
+        return await sync_to_async(self.actualizar)(request, pk, parcial=False)
+
+    @method_decorator(condition(etag_func=etag_producto))
+    async def patch(self, request, pk, *args, **kwargs):
+        return await sync_to_async(self.actualizar)(request, pk, parcial=True)
+
+    @method_decorator(condition(etag_func=etag_producto))
+    async def delete(self, request, pk, *args, **kwargs):
+        return await sync_to_async(self.borrar)(pk)
+
+
+# Tareas en segundo plano
+
+class TareaApiListView(ApiView):
+    """
+    GET: últimas tareas del usuario.
+    POST {"tipo": ..., "argumentos": {...}}: encola una tarea (202) si el
+    usuario tiene el permiso de ese tipo; el estado se sondea en Location.
+    """
+
+    # El permiso depende del tipo de tarea
+    permisos_por_metodo = {}
+    limite = 20
+
+    async def get(self, request, *args, **kwargs):
+        recientes = Tarea.objects.filter(usuario=request.user).order_by('-fecha_creacion', '-id')[:self.limite]
+        return JsonResponse({'resultados': [tareas.estado(tarea) async for tarea in recientes]})
+
+    def crear(self, request):
+        datos = leer_json(request)
+        if datos is None or not isinstance(datos.get('argumentos', {}), dict):
+            return JsonResponse({'error': 'Se espera {"tipo": ..., "argumentos": {...}}'}, status=400)
+        tipo = tareas.REGISTRO.get(datos.get('tipo'))
+        if tipo is None or tipo.permiso is None:
+            return JsonResponse({'error': 'Tipo de tarea desconocido'}, status=400)
+        if not request.user.has_perm(tipo.permiso):
+            return JsonResponse({'error': 'No tienes permiso para esta operación'}, status=403)
+        try:
+            tarea = tareas.encolar(tipo.nombre, datos.get('argumentos'), usuario=request.user)
+        except TypeError as error:
+            return JsonResponse({'error': f'Argumentos inválidos: {error}'}, status=400)
+        response = JsonResponse(tareas.estado(tarea), status=202)
+        response['Location'] = reverse('api_tarea', args=[tarea.pk])
+        return response
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.crear)(request)
+
+
+class TareaApiDetailView(ApiView):
+    """Estado, progreso y resultado de una tarea: la ve quien la encoló o quien tiene view_tarea"""
+
+    permisos_por_metodo = {}
+
+    async def get(self, request, pk, *args, **kwargs):
+        tarea = await aget_object_or_404(Tarea, pk=pk)
+        if tarea.usuario_id != request.user.pk and not await request.user.ahas_perm('gestor.view_tarea'):
+            # Igual que si no existiera: no revela tareas ajenas
+            return JsonResponse({'error': 'No encontrada'}, status=404)
+        return JsonResponse(tareas.estado(tarea))
+
+
+# Métricas (formato de texto de Prometheus)
+
+class MetricasView(View):
+    """
+    Histogramas por ruta de MetricasMiddleware. Acceso para superusuarios o
+    para el recolector con "Authorization: Bearer <METRICAS_TOKEN>".
+    """
+
+    def autorizado(self, request):
+        token = settings.METRICAS_TOKEN
+        cabecera = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(cabecera.encode(), f'Bearer {token}'.encode()):
+            return True
+        return request.user.is_authenticated and request.user.is_superuser
+
+    def get(self, request, *args, **kwargs):
+        if not self.autorizado(request):
+            raise PermissionDenied
+        return HttpResponse(metricas.registro.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # Manejo de Errores
 
 def handler403(request, exception=None):
@@ -2,6 +2,8 @@ from pathlib import Path
 from django.contrib.messages import constants as messages
 import os
 
+from . import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,11 +40,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gestor.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestor.middleware.AuditoriaMiddleware',
+    'gestor.middleware.PrimariaTrasEscrituraMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -51,7 +56,8 @@ ROOT_URLCONF = 'gestor_productos.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates con medición del tiempo de render (gestor/metricas.py)
+        'BACKEND': 'gestor.metricas.DjangoTemplatesMedidas',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,11 +76,144 @@ WSGI_APPLICATION = 'gestor_productos.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Configuración desde el entorno (DATABASE_URL o DB_*), ver gestor_productos/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': database.configuracion_por_defecto(BASE_DIR),
+}
+
+# Réplicas de lectura (DATABASE_REPLICAS). Las lecturas del catálogo van a las
+# réplicas y todo lo demás a 'default'; ver gestor/routers.py
+DATABASE_REPLICAS_CONFIG = database.configuracion_replicas(BASE_DIR)
+DATABASES.update(DATABASE_REPLICAS_CONFIG)
+DATABASE_REPLICAS = list(DATABASE_REPLICAS_CONFIG)
+DATABASE_ROUTERS = ['gestor.routers.ReplicaRouter']
+
+# Segundos que un usuario lee de la primaria después de escribir (lee sus propias escrituras)
+REPLICA_PIN_SEGUNDOS = int(os.environ.get('REPLICA_PIN_SEGUNDOS', 5))
+
+# PRAGMA aplicados a cada conexión SQLite nueva (WAL, busy_timeout, synchronous, mmap, caché)
+SQLITE_PRAGMAS = database.pragmas_sqlite()
+
+
+# Cache
+# En producción REDIS_URL apunta a un servidor compartido por todos los procesos
+# (requiere el paquete redis); sin ella se usa una caché local en memoria.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+# Backend que guarda los permisos resueltos en la caché compartida. Con la
+# caché local cada proceso tendría su propia copia y una revocación solo se
+# vería en el proceso que la hizo: sin REDIS_URL se usa el ModelBackend de Django.
+if os.environ.get('REDIS_URL'):
+    AUTHENTICATION_BACKENDS = ['gestor.backends.CachedModelBackend']
+else:
+    AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+
+# Segundos que se conservan los permisos resueltos de cada usuario
+PERMISOS_CACHE_TIMEOUT = 60 * 60
+
+# Límite de intentos de login/registro (gestor/limites.py): (intentos, segundos de la ventana)
+LIMITES_INTENTOS = {
+    'login_ip': (20, 60),
+    'login_usuario': (5, 300),
+    'registro_ip': (5, 3600),
+}
+# Bloqueo al superar el límite: BASE segundos, luego el doble cada vez, hasta MAX
+LIMITES_BLOQUEO_BASE = 30
+LIMITES_BLOQUEO_MAX = 60 * 60
+# Detrás de un proxy: cabecera con la IP del cliente (p. ej. 'HTTP_X_FORWARDED_FOR')
+LIMITES_CABECERA_IP = os.environ.get('LIMITES_CABECERA_IP') or None
+# Proxies propios que agregan una entrada a esa cabecera (la IP se toma desde la derecha)
+LIMITES_PROXIES_CONFIABLES = int(os.environ.get('LIMITES_PROXIES_CONFIABLES', 1))
+
+# Sesiones
+# SESSION_ALMACENAMIENTO elige dónde se guardan:
+#   cached_db      - caché con respaldo en la base (por defecto con REDIS_URL): las
+#                    lecturas no tocan django_session, solo las escrituras
+#   db             - solo base de datos (una consulta por request autenticado; por
+#                    defecto sin REDIS_URL: con la caché local de cada proceso, un
+#                    logout en un proceso no se vería en los demás hasta que venza)
+#   signed_cookies - sin estado en el servidor: el contenido viaja firmado (no cifrado)
+#                    en la cookie y cerrar sesión no invalida copias anteriores
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[
+    os.environ.get('SESSION_ALMACENAMIENTO', 'cached_db' if os.environ.get('REDIS_URL') else 'db')
+]
+# La sesión solo se escribe cuando cambia (login, logout), nunca en cada request
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Mensajes en cookie; solo si no caben pasan a la sesión
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+
+# Instrumentación por petición (gestor/metricas.py, MetricasMiddleware)
+# METRICAS=0 la desactiva por completo.
+METRICAS_ACTIVAS = os.environ.get('METRICAS', '1').lower() not in ('0', 'false', 'no', 'off')
+# Cabecera Server-Timing con db/plantillas/total (visible en las herramientas del navegador)
+METRICAS_SERVER_TIMING = True
+# Peticiones que tardan al menos esto se registran en el log "gestor.metricas"
+METRICAS_UMBRAL_LENTO_MS = int(os.environ.get('METRICAS_UMBRAL_LENTO_MS', 500))
+# Consultas más lentas que se incluyen en ese log
+METRICAS_CONSULTAS_LENTAS = 3
+# Límites (segundos) de los histogramas por ruta
+METRICAS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# /metricas/ lo pueden leer superusuarios o quien envíe "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN') or None
+
+# Auditoría de cambios en productos (gestor/auditoria.py, AuditoriaMiddleware)
+# AUDITORIA=0 la desactiva por completo.
+AUDITORIA_ACTIVA = os.environ.get('AUDITORIA', '1').lower() not in ('0', 'false', 'no', 'off')
+# False: cada registro se escribe en la misma petición, al confirmarse la transacción
+AUDITORIA_ASINCRONA = True
+# Registros que esperan en memoria; si se llena, se escribe en la petición
+AUDITORIA_COLA_MAX = 10_000
+# Registros por INSERT y segundos máximos que espera el hilo para juntar un lote
+AUDITORIA_LOTE = 500
+AUDITORIA_INTERVALO = 1.0
+
+# Tareas en segundo plano (gestor/tareas.py, comando trabajador_tareas)
+# Procesos del trabajador que ejecutan tareas en paralelo
+TAREAS_PROCESOS = int(os.environ.get('TAREAS_PROCESOS', 2))
+# Segundos entre consultas a la cola cuando no hay tareas pendientes
+TAREAS_INTERVALO = 1.0
+# Intentos por tarea (salvo que el tipo indique otro) y espera entre ellos:
+# base * 2^(intento - 1) segundos, con un tope
+TAREAS_MAX_INTENTOS = 3
+TAREAS_REINTENTO_BASE = 10
+TAREAS_REINTENTO_MAX = 600
+# Una tarea en curso sin latido en este tiempo se da por abandonada y se reencola
+TAREAS_LATIDO_VENCIDO = 300
+# Archivos subidos que esperan a ser procesados por una tarea
+TAREAS_DIRECTORIO = BASE_DIR / 'tareas'
+
+# Logs de la aplicación (peticiones lentas, etc.) a la consola
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'gestor': {'handlers': ['consola'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 
@@ -131,6 +270,27 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# Listado de productos (paginación por cursor)
+PRODUCTOS_POR_PAGINA = 20
+PRODUCTOS_POR_PAGINA_MAX = 100
+
+# Segundos que se conserva el HTML cacheado del listado y de cada producto.
+# Las claves llevan la versión del catálogo / de la fila: un cambio genera
+# claves nuevas y las antiguas simplemente expiran.
+PRODUCTOS_CACHE_TTL = 600
+
+# Importación masiva: filas por lote (una transacción y una consulta de nombres por lote)
+IMPORTACION_TAMANO_LOTE = 1000
+
+# Exportación del catálogo: filas leídas por viaje a la base de datos
+EXPORTACION_CHUNK_SIZE = 2000
+
+# Segundos que se cachea el resumen por estado de stock del panel de inventario
+INVENTARIO_CACHE_TTL = 30
+
+# Máximo de líneas por solicitud de movimientos de stock
+STOCK_MOVIMIENTOS_MAX = 500
+
 # Configuración del admin
 ADMIN_SITE_HEADER = "Gestión de Productos"
 ADMIN_SITE_TITLE = "Panel de Administración"